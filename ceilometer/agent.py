@@ -17,17 +17,49 @@
 # under the License.
 
 import abc
-import itertools
+import fractions
+import hashlib
+import random
 
+from eventlet import semaphore
 from oslo.config import cfg
 from stevedore import dispatch
 
 from ceilometer.openstack.common import context
 from ceilometer.openstack.common import log
 from ceilometer import pipeline
+from ceilometer import service  # For cfg.CONF.host
 
 LOG = log.getLogger(__name__)
 
+OPTS = [
+    cfg.BoolOpt('polling_phase_offset',
+                default=True,
+                help='Delay the first run of each polling task by an '
+                'offset derived from the host name, so that the agents '
+                'of different hosts do not poll at the same time.'),
+    cfg.IntOpt('polling_jitter',
+               default=0,
+               help='Maximum number of seconds added at random to the '
+               'delay before the first run of each polling task.'),
+    cfg.IntOpt('polling_max_parallel_tasks',
+               default=4,
+               help='Maximum number of polling tasks run concurrently by '
+               'an agent, 0 for no limit.'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+
+def phase_offset(host, interval):
+    """Return the offset of the polling at interval on host.
+
+    The offset is spread between 0 and interval seconds and is the same
+    every time the agent of the host is started.
+    """
+    digest = hashlib.md5('%s-%d' % (host, interval)).hexdigest()
+    return int(digest, 16) % interval
+
 
 class PollingTask(object):
     """Polling task for polling counters and inject into pipeline
@@ -36,13 +68,48 @@ class PollingTask(object):
     def __init__(self, agent_manager):
         self.manager = agent_manager
         self.pollsters = set()
+        self.pipelines = set()
+        # Names of the counters requested from each pollster.
+        self.counter_names = {}
         self.publish_context = pipeline.PublishContext(
             agent_manager.context,
             cfg.CONF.counter_source)
+        # Seconds between the runs of the task, when run periodically.
+        self.interval = None
+        self.cycle = 0
+
+    @staticmethod
+    def _counter_names(pollster, pipelines):
+        return set(name for name in pollster.obj.get_counter_names()
+                   if any(p.support_counter(name) for p in pipelines))
 
     def add(self, pollster, pipelines):
         self.publish_context.add_pipelines(pipelines)
+        self.pipelines.update(pipelines)
         self.pollsters.update([pollster])
+        self.counter_names.setdefault(pollster, set()).update(
+            self._counter_names(pollster, pipelines))
+
+    def start_cycle(self):
+        """Select the pipelines the counters of this run are published to.
+
+        The interval of the task divides the intervals of its pipelines,
+        and each pipeline only receives the counters of the runs falling
+        on its own interval, and the pollsters are only asked for the
+        counters of the selected pipelines. Return the selected pipelines.
+        """
+        due = [p for p in self.pipelines
+               if not self.interval
+               or self.cycle % (p.get_interval() // self.interval) == 0]
+        self.cycle += 1
+        self.counter_names = dict((pollster,
+                                   self._counter_names(pollster, due))
+                                  for pollster in self.pollsters)
+        self.publish_context = pipeline.PublishContext(
+            self.manager.context,
+            cfg.CONF.counter_source,
+            due)
+        return due
 
     @abc.abstractmethod
     def poll_and_publish(self):
@@ -64,32 +131,65 @@ class AgentManager(object):
 
         self.context = context.RequestContext('admin', 'admin', is_admin=True)
 
+        self.polling_semaphore = (
+            semaphore.Semaphore(cfg.CONF.polling_max_parallel_tasks)
+            if cfg.CONF.polling_max_parallel_tasks > 0 else None)
+
     @abc.abstractmethod
     def create_polling_task(self):
         """Create an empty polling task."""
 
     def setup_polling_tasks(self):
+        """Group the pollsters into tasks by polling interval.
+
+        Each pollster is polled at the greatest common divisor of the
+        intervals of the pipelines it feeds, and the pollsters sharing
+        an interval share a task.
+        """
         polling_tasks = {}
-        for pipeline, pollster in itertools.product(
-                self.pipeline_manager.pipelines,
-                self.pollster_manager.extensions):
-            for counter in pollster.obj.get_counter_names():
-                if pipeline.support_counter(counter):
-                    polling_task = polling_tasks.get(pipeline.interval, None)
-                    if not polling_task:
-                        polling_task = self.create_polling_task()
-                        polling_tasks[pipeline.interval] = polling_task
-                    polling_task.add(pollster, [pipeline])
-                    break
+        for pollster in self.pollster_manager.extensions:
+            pipelines = [p for p in self.pipeline_manager.pipelines
+                         if any(p.support_counter(counter) for counter
+                                in pollster.obj.get_counter_names())]
+            if not pipelines:
+                continue
+            interval = reduce(fractions.gcd,
+                              [p.get_interval() for p in pipelines])
+            polling_task = polling_tasks.get(interval)
+            if not polling_task:
+                polling_task = self.create_polling_task()
+                polling_task.interval = interval
+                polling_tasks[interval] = polling_task
+            polling_task.add(pollster, pipelines)
 
         return polling_tasks
 
+    @staticmethod
+    def initial_delay(interval):
+        """Return the delay before the first run of a polling task."""
+        delay = 0
+        if cfg.CONF.polling_phase_offset:
+            delay += phase_offset(cfg.CONF.host, interval)
+        if cfg.CONF.polling_jitter > 0:
+            delay += random.uniform(0, cfg.CONF.polling_jitter)
+        return delay
+
     def initialize_service_hook(self, service):
         self.service = service
         for interval, task in self.setup_polling_tasks().iteritems():
+            delay = self.initial_delay(interval)
+            LOG.info('Polling every %d seconds, starting in %d seconds',
+                     interval, delay)
             self.service.tg.add_timer(interval,
                                       self.interval_task,
+                                      initial_delay=delay,
                                       task=task)
 
     def interval_task(self, task):
-        task.poll_and_publish()
+        if not task.start_cycle():
+            return
+        if self.polling_semaphore is None:
+            task.poll_and_publish()
+        else:
+            with self.polling_semaphore:
+                task.poll_and_publish()
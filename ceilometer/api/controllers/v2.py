@@ -28,6 +28,7 @@
 # [GET   ] /meters/<meter> -- list the samples for this meter
 # [PUT   ] /meters/<meter> -- update the meter (not the samples)
 # [DELETE] /meters/<meter> -- delete the meter and samples
+# [GET   ] /statistics -- statistics of several meters at once
 #
 import datetime
 import inspect
@@ -197,6 +198,33 @@ def _get_query_timestamps(args={}):
             }
 
 
+def _get_clamp_timestamps(query):
+    """Find the original timestamps in the query to use for clamping
+    the duration returned in the statistics.
+    """
+    start = end = None
+    for i in query:
+        if i.field == 'timestamp' and i.op in ('lt', 'le'):
+            end = timeutils.parse_isotime(i.value).replace(tzinfo=None)
+        elif i.field == 'timestamp' and i.op in ('gt', 'ge'):
+            start = timeutils.parse_isotime(i.value).replace(tzinfo=None)
+    return start, end
+
+
+def _validate_groupby(groupby):
+    """Return the list of fields to group statistics by, without
+    duplicates, or raise an error if one of them is not supported.
+    """
+    fields = []
+    for field in groupby:
+        if field not in storage.GROUPBY_FIELDS:
+            raise wsme.exc.InvalidInput('groupby', field,
+                                        'unsupported field')
+        if field not in fields:
+            fields.append(field)
+    return fields
+
+
 def _flatten_metadata(metadata):
     """Return flattened resource metadata without nested structures
     and with all values converted to unicode strings.
@@ -310,6 +338,15 @@ class Statistics(_Base):
     period_end = datetime.datetime
     "UTC date and time of the period end"
 
+    groupby = {wtypes.text: wtypes.text}
+    "The values of the fields the statistics are grouped by, if any"
+
+    delta = float
+    "The increase of a cumulative meter, counter resets accounted for"
+
+    rate = float
+    "The increase of a cumulative meter per second"
+
     def __init__(self, start_timestamp=None, end_timestamp=None, **kwds):
         super(Statistics, self).__init__(**kwds)
         self._update_duration(start_timestamp, end_timestamp)
@@ -385,29 +422,48 @@ class MeterController(rest.RestController):
                 for e in pecan.request.storage_conn.get_samples(f)
                 ]
 
-    @wsme_pecan.wsexpose([Statistics], [Query], int)
-    def statistics(self, q=[], period=None):
+    @staticmethod
+    def _compute_statistics(event_filter, period, groupby, deltas):
+        computed = None
+        cache = getattr(pecan.request, 'sample_cache', None)
+        if cache is not None and not groupby and not deltas:
+            computed = cache.get_meter_statistics(
+                pecan.request.storage_conn, event_filter, period)
+            if computed is not None:
+                LOG.debug('computed value coming from the sample cache')
+        if computed is None:
+            computed = list(pecan.request.storage_conn.get_meter_statistics(
+                event_filter, period, groupby, deltas=deltas))
+            LOG.debug('computed value coming from %r',
+                      pecan.request.storage_conn)
+        return computed
+
+    @wsme_pecan.wsexpose([Statistics], [Query], int, [unicode], bool)
+    def statistics(self, q=[], period=None, groupby=[], deltas=False):
         """Computes the statistics of the samples in the time range given.
 
         :param q: Filter rules for the data to be returned.
         :param period: Returned result will be an array of statistics for a
                        period long of that number of seconds.
+        :param groupby: Fields the statistics are grouped by, among
+                        resource_id, project_id and user_id.
+        :param deltas: Also compute the delta and rate of a cumulative
+                       meter.
 
         """
+        groupby = _validate_groupby(groupby)
         kwargs = _query_to_kwargs(q, storage.EventFilter.__init__)
         kwargs['meter'] = self._id
         f = storage.EventFilter(**kwargs)
-        computed = pecan.request.storage_conn.get_meter_statistics(f, period)
-        LOG.debug('computed value coming from %r', pecan.request.storage_conn)
-        # Find the original timestamp in the query to use for clamping
-        # the duration returned in the statistics.
-        start = end = None
-        for i in q:
-            if i.field == 'timestamp' and i.op in ('lt', 'le'):
-                end = timeutils.parse_isotime(i.value).replace(tzinfo=None)
-            elif i.field == 'timestamp' and i.op in ('gt', 'ge'):
-                start = timeutils.parse_isotime(i.value).replace(tzinfo=None)
-
+        results = getattr(pecan.request, 'result_cache', None)
+        if results is None:
+            computed = self._compute_statistics(f, period, groupby, deltas)
+        else:
+            computed = results.get_meter_statistics(
+                lambda event_filter, period: self._compute_statistics(
+                    event_filter, period, groupby, deltas),
+                f, period, groupby, deltas)
+        start, end = _get_clamp_timestamps(q)
         return [Statistics(start_timestamp=start,
                            end_timestamp=end,
                            **c.as_dict())
@@ -526,8 +582,49 @@ class ResourcesController(rest.RestController):
         return resources
 
 
+class StatisticsController(rest.RestController):
+    """Computes the statistics of several meters at once.
+    """
+
+    @wsme_pecan.wsexpose([Statistics], [unicode], [Query], [unicode], int,
+                         bool)
+    def get_all(self, meter=[], q=[], groupby=[], period=None,
+                deltas=False):
+        """Computes the statistics of the samples of several meters in the
+        time range given, in a single pass over the samples.
+
+        The statistics are always grouped by meter, their groupby
+        attribute holding the meter name as counter_name.
+
+        :param meter: The names of the meters.
+        :param q: Filter rules for the data to be returned.
+        :param groupby: Fields the statistics are grouped by, among
+                        resource_id, project_id and user_id.
+        :param period: Returned result will be an array of statistics for a
+                       period long of that number of seconds.
+        :param deltas: Also compute the delta and rate of the cumulative
+                       meters.
+
+        """
+        if not meter:
+            raise wsme.exc.MissingArgument('meter')
+        groupby = ['counter_name'] + [g for g in _validate_groupby(groupby)
+                                      if g != 'counter_name']
+        kwargs = _query_to_kwargs(q, storage.EventFilter.__init__)
+        kwargs['meter'] = list(meter)
+        f = storage.EventFilter(**kwargs)
+        computed = pecan.request.storage_conn.get_meter_statistics(
+            f, period, groupby, deltas=deltas)
+        start, end = _get_clamp_timestamps(q)
+        return [Statistics(start_timestamp=start,
+                           end_timestamp=end,
+                           **c.as_dict())
+                for c in computed]
+
+
 class V2Controller(object):
     """Version 2 API controller root."""
 
     resources = ResourcesController()
     meters = MetersController()
+    statistics = StatisticsController()
@@ -19,6 +19,8 @@
 from oslo.config import cfg
 from pecan import hooks
 
+from ceilometer.api import result_cache
+from ceilometer.api import sample_cache
 from ceilometer import storage
 
 
@@ -42,3 +44,33 @@ class DBHook(hooks.PecanHook):
     # def after(self, state):
     #     print 'method:', state.request.method
     #     print 'response:', state.response.status
+
+
+class CacheHook(hooks.PecanHook):
+    """Attach the API caches, if enabled, to the request.
+
+    The caches are built on the first request and shared by all the
+    following ones.
+    """
+
+    def __init__(self):
+        self.sample_cache = None
+        self.result_cache = None
+        self.configured = False
+
+    def before(self, state):
+        if not self.configured:
+            conf = state.request.cfg
+            self.sample_cache = sample_cache.get_sample_cache(conf)
+            self.result_cache = result_cache.get_result_cache(conf)
+            self.configured = True
+        state.request.sample_cache = self.sample_cache
+        state.request.result_cache = self.result_cache
+
+    def after(self, state):
+        # Let the monitoring read the counters of the result cache from
+        # any response.
+        if self.result_cache is not None:
+            for name, value in sorted(self.result_cache.stats().items()):
+                state.response.headers['X-Result-Cache-%s'
+                                       % name.capitalize()] = str(value)
@@ -0,0 +1,314 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Cache of the statistics computed by the API.
+
+The results of statistics queries are cached under a key built from
+the normalised query, so that identical queries issued by many clients
+only reach the storage once. The statistics over periods are split on
+the period grid: the closed periods between the bounds of the query are
+cached together under their aligned bounds, so that queries for a
+sliding window keep hitting the same key until a period closes, while
+the partial periods at both ends and the period still open are computed
+by the storage with the exact bounds of the query. Results only covering
+closed periods are kept for ``api_result_cache_history_ttl`` seconds,
+the other ones for ``api_result_cache_ttl`` seconds at most.
+
+The backend is loaded from the ``ceilometer.api.result_cache`` entry
+point namespace, using the scheme of ``api_result_cache_url``.
+"""
+
+import abc
+import collections
+import copy
+import datetime
+import hashlib
+import threading
+import urlparse
+
+from oslo.config import cfg
+from stevedore import driver
+
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+
+
+LOG = log.getLogger(__name__)
+
+RESULT_CACHE_NAMESPACE = 'ceilometer.api.result_cache'
+
+OPTS = [
+    cfg.StrOpt('api_result_cache_url',
+               default='',
+               help='Backend of the API statistics cache, '
+               'e.g. memory://?size=1000 or '
+               'memcached://host1:11211,host2:11211. '
+               'Empty to disable the cache.'),
+    cfg.IntOpt('api_result_cache_ttl',
+               default=60,
+               help='Maximum number of seconds statistics covering the '
+               'currently open period are cached.'),
+    cfg.IntOpt('api_result_cache_history_ttl',
+               default=3600,
+               help='Number of seconds statistics only covering closed '
+               'periods are cached.'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def align(timestamp, period, up=False):
+    """Align a timestamp on a multiple of period seconds since the epoch.
+
+    :param timestamp: The timestamp to align.
+    :param period: The period, in seconds.
+    :param up: Round to the next period boundary instead of the previous.
+    """
+    seconds = timeutils.delta_seconds(EPOCH, timestamp)
+    offset = seconds % period
+    if up and offset:
+        offset -= period
+    return timestamp - datetime.timedelta(seconds=offset)
+
+
+class Backend(object):
+    """Base class for result cache backends."""
+
+    __metaclass__ = abc.ABCMeta
+
+    def __init__(self, url):
+        pass
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Return the value stored under key, or None."""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl):
+        """Store value under key for ttl seconds."""
+
+
+class MemoryBackend(Backend):
+    """Least recently used cache local to the process.
+
+    The maximum number of entries is given by the ``size`` parameter of
+    the URL.
+    """
+
+    DEFAULT_SIZE = 1000
+
+    def __init__(self, url):
+        super(MemoryBackend, self).__init__(url)
+        params = urlparse.parse_qs(urlparse.urlparse(url).query)
+        self.size = int(params.get('size', [self.DEFAULT_SIZE])[-1])
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        now = timeutils.utcnow_ts()
+        with self.lock:
+            entry = self.entries.pop(key, None)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires <= now:
+                return None
+            self.entries[key] = entry
+            return value
+
+    def set(self, key, value, ttl):
+        with self.lock:
+            self.entries.pop(key, None)
+            self.entries[key] = (timeutils.utcnow_ts() + ttl, value)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+
+class MemcachedBackend(Backend):
+    """Cache shared by the API servers through memcached.
+
+    The servers are listed, comma separated, in the URL network location.
+    """
+
+    def __init__(self, url):
+        super(MemcachedBackend, self).__init__(url)
+        # NOTE: python-memcached is only required when this backend
+        # is configured.
+        import memcache
+        servers = urlparse.urlparse(url).netloc.split(',')
+        self.client = memcache.Client(servers)
+
+    def get(self, key):
+        return self.client.get(key)
+
+    def set(self, key, value, ttl):
+        self.client.set(key, value, time=ttl)
+
+
+class ResultCache(object):
+    """Statistics cache, counting its hits and misses."""
+
+    # Grid the bounds of the queries without a period have to be on to be
+    # cached, the other ones would hardly ever be asked for again.
+    GRID = 60
+
+    def __init__(self, backend, ttl, history_ttl):
+        self.backend = backend
+        self.ttl = ttl
+        self.history_ttl = history_ttl
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+
+    def stats(self):
+        """Return the counters of the cache, as a dict."""
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'bypassed': self.bypassed}
+
+    @staticmethod
+    def on_grid(event_filter, grid):
+        """Return whether the time range of a filter is on the grid."""
+        return all(t is None or align(t, grid) == t
+                   for t in (event_filter.start, event_filter.end))
+
+    @staticmethod
+    def _bounded(event_filter, start, end):
+        bounded = copy.copy(event_filter)
+        bounded.start = start
+        bounded.end = end
+        return bounded
+
+    @staticmethod
+    def key(event_filter, period, groupby=None, deltas=False):
+        """Return the cache key of a statistics query."""
+        normalised = (event_filter.meter,
+                      event_filter.resource,
+                      event_filter.user,
+                      event_filter.project,
+                      event_filter.source,
+                      event_filter.start,
+                      event_filter.end,
+                      sorted(event_filter.metaquery.items()),
+                      period or 0,
+                      sorted(groupby or []),
+                      bool(deltas))
+        return 'statistics-' + hashlib.sha1(repr(normalised)).hexdigest()
+
+    def ttl_for(self, event_filter, period):
+        """Return how long the statistics of a query can be cached."""
+        now = timeutils.utcnow()
+        if event_filter.end and event_filter.end <= now:
+            return self.history_ttl
+        if period:
+            # Expire at the latest when the open period closes.
+            start = event_filter.start or EPOCH
+            remaining = period - (timeutils.delta_seconds(start, now)
+                                  % period)
+            return max(1, int(min(self.ttl, remaining)))
+        return self.ttl
+
+    def get(self, event_filter, period, groupby=None, deltas=False):
+        """Return the cached statistics of a query, or None."""
+        value = self.backend.get(self.key(event_filter, period, groupby,
+                                          deltas))
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        LOG.debug('result cache %s: %d hits, %d misses',
+                  'hit' if value is not None else 'miss',
+                  self.hits, self.misses)
+        return value
+
+    def set(self, event_filter, period, statistics, groupby=None,
+            deltas=False):
+        """Store the statistics of a query."""
+        self.backend.set(self.key(event_filter, period, groupby, deltas),
+                         statistics,
+                         self.ttl_for(event_filter, period))
+
+    def _get_or_compute(self, compute, event_filter, period, groupby,
+                        deltas):
+        statistics = self.get(event_filter, period, groupby, deltas)
+        if statistics is None:
+            statistics = list(compute(event_filter, period))
+            self.set(event_filter, period, statistics, groupby, deltas)
+        return statistics
+
+    def get_meter_statistics(self, compute, event_filter, period,
+                             groupby=None, deltas=False):
+        """Return the statistics of a query, cached where possible.
+
+        Queries which cannot be split on the period grid, because they have
+        no period, no start or no closed period, are cached as a whole
+        when their bounds are on the grid and computed by the storage
+        otherwise.
+
+        :param compute: Callable computing the statistics of a filter and a
+                        period from the storage.
+        :param event_filter: The filter of the statistics query.
+        :param period: The period of the statistics, in seconds.
+        :param groupby: The fields the statistics are grouped by.
+        :param deltas: Whether the deltas are computed.
+        """
+        now = timeutils.utcnow()
+        start = event_filter.start
+        end = event_filter.end
+        if period and start is not None:
+            first = align(start, period, up=True)
+            last = align(min(end, now) if end else now, period)
+        if not period or start is None or last <= first:
+            if not self.on_grid(event_filter, period or self.GRID):
+                self.bypassed += 1
+                return list(compute(event_filter, period))
+            return self._get_or_compute(compute, event_filter, period,
+                                        groupby, deltas)
+
+        statistics = []
+        if start < first:
+            for s in compute(self._bounded(event_filter, start, first),
+                             period):
+                # The partial period stops at the grid.
+                s.period = int(timeutils.delta_seconds(start, first))
+                s.period_end = first
+                statistics.append(s)
+        statistics.extend(self._get_or_compute(
+            compute, self._bounded(event_filter, first, last), period,
+            groupby, deltas))
+        if end is None or end > last:
+            statistics.extend(compute(self._bounded(event_filter, last, end),
+                                      period))
+        return statistics
+
+
+def get_result_cache(conf):
+    """Build the result cache described by the configuration.
+
+    Return None when the cache is disabled.
+    """
+    url = conf.api_result_cache_url
+    if not url:
+        return None
+    name = urlparse.urlparse(url).scheme
+    LOG.debug('looking for %r result cache in %r',
+              name, RESULT_CACHE_NAMESPACE)
+    mgr = driver.DriverManager(RESULT_CACHE_NAMESPACE,
+                               name,
+                               invoke_on_load=True,
+                               invoke_args=(url,))
+    return ResultCache(mgr.driver,
+                       conf.api_result_cache_ttl,
+                       conf.api_result_cache_history_ttl)
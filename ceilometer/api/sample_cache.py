@@ -0,0 +1,300 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""In-process cache of recent samples for hot meters.
+
+The cache keeps, for each (meter, resource) pair that is asked for
+statistics, the samples of the last ``api_sample_cache_window`` seconds
+in a fixed size ring buffer whose timestamps and volumes are stored in
+contiguous NumPy arrays. Buffers are filled by reading through the
+storage driver ``get_samples`` method and refilled once they are older
+than ``api_sample_cache_ttl`` seconds. Statistics over a time range
+fully covered by a buffer are then computed with vectorised operations
+instead of a storage aggregate.
+
+NumPy is an optional dependency: without it the cache stays disabled.
+"""
+
+import collections
+import datetime
+import threading
+
+from oslo.config import cfg
+
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import storage
+from ceilometer.storage import models
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+LOG = log.getLogger(__name__)
+
+OPTS = [
+    cfg.IntOpt('api_sample_cache_size',
+               default=0,
+               help='Number of samples kept per (meter, resource) in the '
+               'API sample cache, 0 disables the cache. '
+               'Requires NumPy.'),
+    cfg.IntOpt('api_sample_cache_series',
+               default=1000,
+               help='Maximum number of (meter, resource) series kept in '
+               'the API sample cache.'),
+    cfg.IntOpt('api_sample_cache_window',
+               default=3600,
+               help='Number of seconds of samples loaded in the API '
+               'sample cache.'),
+    cfg.IntOpt('api_sample_cache_ttl',
+               default=60,
+               help='Number of seconds after which a cached series is '
+               'reloaded from the storage.'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
+EPOCH = datetime.datetime(1970, 1, 1)
+
+
+def _to_usec(timestamp):
+    delta = timestamp - EPOCH
+    return ((delta.days * 86400 + delta.seconds) * 1000000
+            + delta.microseconds)
+
+
+def _from_usec(usec):
+    return EPOCH + datetime.timedelta(microseconds=int(usec))
+
+
+class RingBuffer(object):
+    """Fixed size buffer of (timestamp, volume) pairs.
+
+    Timestamps are stored as microseconds since the epoch. Once the
+    buffer is full, appending a sample overwrites the oldest one.
+    """
+
+    def __init__(self, size):
+        self.timestamps = numpy.zeros(size, dtype=numpy.int64)
+        self.volumes = numpy.zeros(size, dtype=numpy.float64)
+        self.size = size
+        self.count = 0
+        self.head = 0
+
+    def clear(self):
+        self.count = 0
+        self.head = 0
+
+    def append(self, timestamp, volume):
+        self.timestamps[self.head] = timestamp
+        self.volumes[self.head] = volume
+        self.head = (self.head + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    @property
+    def full(self):
+        return self.count == self.size
+
+    def arrays(self):
+        """Return the timestamps and volumes, oldest first."""
+        if self.full and self.head:
+            return (numpy.concatenate((self.timestamps[self.head:],
+                                       self.timestamps[:self.head])),
+                    numpy.concatenate((self.volumes[self.head:],
+                                       self.volumes[:self.head])))
+        return (self.timestamps[:self.count],
+                self.volumes[:self.count])
+
+
+class Series(object):
+    """Cached samples of one meter for one resource."""
+
+    def __init__(self, size):
+        self.buffer = RingBuffer(size)
+        self.start = None
+        self.loaded_at = None
+        # Held while the series is filled or read, so that concurrent
+        # misses only load it once and never see it half filled.
+        self.lock = threading.Lock()
+
+    def fill(self, samples, start, now):
+        """Replace the content of the series.
+
+        :param samples: Samples in any order.
+        :param start: Beginning of the time range the samples cover.
+        :param now: Time of the load.
+        """
+        self.buffer.clear()
+        for s in sorted(samples, key=lambda s: s.timestamp):
+            self.buffer.append(_to_usec(s.timestamp), s.counter_volume)
+        self.start = _to_usec(start)
+        if self.buffer.full:
+            # Older samples have been overwritten, only the range
+            # strictly after the oldest kept one is complete.
+            self.start = max(self.start, self.buffer.arrays()[0][0] + 1)
+        self.loaded_at = now
+
+    def covers(self, start):
+        return start is not None and _to_usec(start) >= self.start
+
+    def statistics(self, start, end, period):
+        """Compute the statistics of the samples in [start, end).
+
+        Return None if no sample is in the range.
+        """
+        timestamps, volumes = self.buffer.arrays()
+        lo = _to_usec(start)
+        first = numpy.searchsorted(timestamps, lo, side='left')
+        if end is not None:
+            last = numpy.searchsorted(timestamps, _to_usec(end),
+                                      side='left')
+        else:
+            last = len(timestamps)
+        timestamps = timestamps[first:last]
+        volumes = volumes[first:last]
+        if not len(timestamps):
+            return None
+
+        if period:
+            step = period * 1000000
+            buckets = (timestamps - lo) // step
+            bounds = numpy.concatenate(
+                ([0], numpy.flatnonzero(numpy.diff(buckets)) + 1))
+        else:
+            step = None
+            buckets = numpy.zeros(1, dtype=numpy.int64)
+            bounds = numpy.zeros(1, dtype=numpy.intp)
+
+        counts = numpy.diff(numpy.append(bounds, len(timestamps)))
+        sums = numpy.add.reduceat(volumes, bounds)
+        mins = numpy.minimum.reduceat(volumes, bounds)
+        maxs = numpy.maximum.reduceat(volumes, bounds)
+        tsmins = timestamps[bounds]
+        tsmaxs = timestamps[bounds + counts - 1]
+
+        results = []
+        for i, b in enumerate(bounds):
+            duration_start = _from_usec(tsmins[i])
+            duration_end = _from_usec(tsmaxs[i])
+            if step:
+                period_start = _from_usec(lo + buckets[b] * step)
+                period_end = period_start + datetime.timedelta(
+                    seconds=period)
+            else:
+                period_start = duration_start
+                period_end = duration_end
+            results.append(models.Statistics(
+                min=float(mins[i]),
+                max=float(maxs[i]),
+                avg=float(sums[i]) / int(counts[i]),
+                sum=float(sums[i]),
+                count=int(counts[i]),
+                period=period or 0,
+                period_start=period_start,
+                period_end=period_end,
+                duration=timeutils.delta_seconds(duration_start,
+                                                 duration_end),
+                duration_start=duration_start,
+                duration_end=duration_end,
+            ))
+        return results
+
+
+class SampleCache(object):
+    """Cache of recent samples, per (meter, resource)."""
+
+    def __init__(self, size, max_series, window, ttl):
+        self.size = size
+        self.max_series = max_series
+        self.window = window
+        self.ttl = ttl
+        self.series = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def cacheable(event_filter):
+        """Tell whether a filter only selects one meter of one resource."""
+        return (event_filter.meter is not None
+                and event_filter.resource is not None
+                and event_filter.start is not None
+                and event_filter.user is None
+                and event_filter.project is None
+                and event_filter.source is None
+                and not event_filter.metaquery)
+
+    def _get_series(self, conn, meter, resource):
+        key = (meter, resource)
+        now = timeutils.utcnow()
+        with self.lock:
+            series = self.series.pop(key, None)
+            if series is None:
+                series = Series(self.size)
+            # Keep the most recently used series last.
+            self.series[key] = series
+            while len(self.series) > self.max_series:
+                self.series.popitem(last=False)
+        with series.lock:
+            # Another request may have loaded the series meanwhile.
+            if (series.loaded_at is None
+                    or timeutils.delta_seconds(series.loaded_at,
+                                               now) >= self.ttl):
+                start = now - datetime.timedelta(seconds=self.window)
+                LOG.debug('loading samples of %s for %s in the sample '
+                          'cache', meter, resource)
+                series.fill(conn.get_samples(storage.EventFilter(
+                    meter=meter,
+                    resource=resource,
+                    start=start)), start, now)
+        return series
+
+    def get_meter_statistics(self, conn, event_filter, period=None):
+        """Return the statistics for a filter, or None on a cache miss.
+
+        :param conn: Storage connection to read the samples through.
+        :param event_filter: The filter of the statistics query.
+        :param period: The period of the statistics, in seconds.
+        """
+        if not self.cacheable(event_filter):
+            return None
+        # The series could not cover a range starting before the window,
+        # do not load it for nothing.
+        if event_filter.start < timeutils.utcnow() - datetime.timedelta(
+                seconds=self.window):
+            return None
+        series = self._get_series(conn,
+                                  event_filter.meter,
+                                  event_filter.resource)
+        with series.lock:
+            if not series.covers(event_filter.start):
+                return None
+            return series.statistics(event_filter.start,
+                                     event_filter.end,
+                                     period)
+
+
+def get_sample_cache(conf):
+    """Build the sample cache described by the configuration.
+
+    Return None when the cache is disabled.
+    """
+    if conf.api_sample_cache_size <= 0:
+        return None
+    if numpy is None:
+        LOG.warning('NumPy is not available, disabling the sample cache')
+        return None
+    return SampleCache(conf.api_sample_cache_size,
+                       conf.api_sample_cache_series,
+                       conf.api_sample_cache_window,
+                       conf.api_sample_cache_ttl)
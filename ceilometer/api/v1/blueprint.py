@@ -321,13 +321,19 @@ def _list_users(source=None):
     if acl.get_limited_to_project(flask.request.headers):
         users = [flask.request.headers.get('X-User-id')]
     else:
-        users = flask.request.storage_conn.get_users(source=source)
+        users = flask.request.storage_conn.get_users(
+            source=source,
+            limit=flask.request.args.get('limit', type=int),
+            marker=flask.request.args.get('marker'))
     return flask.jsonify(users=list(users))
 
 
 @blueprint.route('/users')
 def list_all_users():
     """Return a list of all known user names.
+
+    :param limit: Maximum number of users to return. (optional)
+    :param marker: Only return the users after this one. (optional)
     """
     return _list_users()
 
@@ -338,6 +344,8 @@ def list_users_by_source(source):
     data.
 
     :param source: The ID of the source.
+    :param limit: Maximum number of users to return. (optional)
+    :param marker: Only return the users after this one. (optional)
     """
     return _list_users(source=source)
 
@@ -359,13 +367,19 @@ def _list_projects(source=None):
         else:
             projects = [project]
     else:
-        projects = flask.request.storage_conn.get_projects(source=source)
+        projects = flask.request.storage_conn.get_projects(
+            source=source,
+            limit=flask.request.args.get('limit', type=int),
+            marker=flask.request.args.get('marker'))
     return flask.jsonify(projects=list(projects))
 
 
 @blueprint.route('/projects')
 def list_all_projects():
     """Return a list of all known project names.
+
+    :param limit: Maximum number of projects to return. (optional)
+    :param marker: Only return the projects after this one. (optional)
     """
     return _list_projects()
 
@@ -376,6 +390,8 @@ def list_projects_by_source(source):
     data.
 
     :param source: The ID of the source.
+    :param limit: Maximum number of projects to return. (optional)
+    :param marker: Only return the projects after this one. (optional)
     """
     return _list_projects(source=source)
 
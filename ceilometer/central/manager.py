@@ -41,13 +41,15 @@ class PollingTask(agent.PollingTask):
     def poll_and_publish(self):
         """Tasks to be run at a periodic interval."""
         with self.publish_context as publisher:
-            # TODO(yjiang5) passing counters into get_counters to avoid
-            # polling all counters one by one
             for pollster in self.pollsters:
+                counter_names = self.counter_names.get(pollster)
+                if not counter_names:
+                    continue
                 try:
                     LOG.info("Polling pollster %s", pollster.name)
                     publisher(list(pollster.obj.get_counters(
-                        self.manager)))
+                        self.manager,
+                        counter_names=counter_names)))
                 except Exception as err:
                     LOG.warning('Continue after error from %s: %s',
                                 pollster.name, err)
@@ -58,6 +58,16 @@ class CollectorService(service.PeriodicService):
         self.storage_engine = storage.get_engine(cfg.CONF)
         self.storage_conn = self.storage_engine.get_connection(cfg.CONF)
 
+    def stop(self):
+        # Do not lose the samples buffered by the storage.
+        try:
+            self.storage_conn.flush()
+        except Exception as err:
+            LOG.error('Failed to record the buffered metering data: %s',
+                      err)
+            LOG.exception(err)
+        super(CollectorService, self).stop()
+
     def initialize_service_hook(self, service):
         '''Consumers must be declared before consume_thread start.'''
         LOG.debug('initialize_service_hooks')
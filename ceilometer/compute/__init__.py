@@ -23,6 +23,23 @@ OPTS = [
                 default=[],
                 help='list of compute agent pollsters to disable',
                 ),
+    cfg.IntOpt('compute_polling_workers',
+               default=16,
+               help='number of instances polled concurrently by the '
+               'compute agent',
+               ),
+    cfg.IntOpt('compute_discovery_ttl',
+               default=600,
+               help='number of seconds the instances known by Nova on this '
+               'host are cached, the running instances being listed from '
+               'the hypervisor in between, 0 to always ask Nova',
+               ),
+    cfg.IntOpt('compute_polling_deadline',
+               default=0,
+               help='number of seconds after which the statistics and '
+               'the counters of the instances not polled yet are not '
+               'waited for anymore in a polling cycle, 0 to always wait',
+               ),
 ]
 
 cfg.CONF.register_opts(OPTS)
@@ -0,0 +1,80 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Discovery of the instances running on the compute node.
+
+The instances are listed from the hypervisor, and their description is
+taken from a cache of the instances Nova knows on this host. Nova is
+only asked again when the hypervisor runs an instance missing from the
+cache, or once the cache is older than compute_discovery_ttl seconds.
+"""
+
+from oslo.config import cfg
+
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+
+LOG = log.getLogger(__name__)
+
+
+class InstanceDiscovery(object):
+
+    def __init__(self, inspector, nv):
+        self.inspector = inspector
+        self.nv = nv
+        # Instance UUID -> Nova instance
+        self.instances = None
+        # UUIDs of the local domains Nova does not know
+        self.unknown = set()
+        self.refreshed_at = None
+
+    def _refresh(self, now):
+        LOG.debug('Listing the instances of %s from Nova', cfg.CONF.host)
+        instances = self.nv.instance_get_all_by_host(cfg.CONF.host)
+        self.instances = dict((i.id, i) for i in instances)
+        self.unknown = set()
+        self.refreshed_at = now
+        return instances
+
+    def _local_uuids(self):
+        try:
+            return set(i.UUID for i in self.inspector.inspect_instances())
+        except NotImplementedError:
+            return None
+        except Exception as err:
+            LOG.warning('Unable to list the local instances: %s', err)
+            LOG.exception(err)
+            return None
+
+    def discover(self):
+        """Return the Nova instances running on this node."""
+        now = timeutils.utcnow_ts()
+        local = self._local_uuids()
+        if local is None:
+            # Without the hypervisor listing, every instance Nova knows on
+            # this host is polled.
+            return self._refresh(now)
+
+        if (self.instances is None
+                or now - self.refreshed_at >= cfg.CONF.compute_discovery_ttl):
+            self._refresh(now)
+            self.unknown = local - set(self.instances)
+        else:
+            new = local - set(self.instances) - self.unknown
+            if new:
+                LOG.debug('New local instances %s', ', '.join(sorted(new)))
+                self._refresh(now)
+                # Do not ask Nova again for domains it does not know.
+                self.unknown = local - set(self.instances)
+        return [self.instances[uuid] for uuid in sorted(local)
+                if uuid in self.instances]
@@ -18,6 +18,9 @@
 """Common code for working with instances
 """
 
+from ceilometer.openstack.common import timeutils
+from ceilometer import utils
+
 INSTANCE_PROPERTIES = [
     # Identity properties
     'reservation_id',
@@ -58,3 +61,37 @@ def get_metadata_from_object(instance):
     for name in INSTANCE_PROPERTIES:
         metadata[name] = getattr(instance, name, u'')
     return metadata
+
+
+class MetadataCache(object):
+    """Metadata of the instances polled during a cycle.
+
+    Between refresh() and clear() the metadata of each instance is built
+    once and shared, frozen, by all its counters, which also share the
+    timestamp of the cycle. Outside a cycle nothing is cached.
+    """
+
+    def __init__(self):
+        self.cycle_timestamp = None
+        self.metadata = {}
+
+    def refresh(self):
+        self.cycle_timestamp = timeutils.isotime()
+        self.metadata = {}
+
+    def clear(self):
+        self.cycle_timestamp = None
+        self.metadata = {}
+
+    @property
+    def timestamp(self):
+        return self.cycle_timestamp or timeutils.isotime()
+
+    def get(self, instance):
+        """Return the metadata of the instance."""
+        metadata = self.metadata.get(instance.id)
+        if metadata is None:
+            metadata = utils.FrozenDict(get_metadata_from_object(instance))
+            if self.cycle_timestamp is not None:
+                self.metadata[instance.id] = metadata
+        return metadata
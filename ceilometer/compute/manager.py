@@ -16,9 +16,14 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import eventlet
+from eventlet import event
+from eventlet import queue
 from oslo.config import cfg
 
 from ceilometer import agent
+from ceilometer.compute import discovery
+from ceilometer.compute import instance as compute_instance
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer import extension_manager
 from ceilometer import nova_client
@@ -29,26 +34,125 @@ LOG = log.getLogger(__name__)
 
 
 class PollingTask(agent.PollingTask):
-    def poll_and_publish_instances(self, instances):
-        with self.publish_context as publisher:
+
+    def __init__(self, agent_manager):
+        super(PollingTask, self).__init__(agent_manager)
+        self.pool = eventlet.GreenPool(cfg.CONF.compute_polling_workers)
+        # Ids of the instances whose polling has not finished yet,
+        # possibly started by a previous cycle: a native libvirt call
+        # cannot be interrupted once the deadline is reached.
+        self.in_flight = set()
+        # Green thread taking the statistics snapshot, possibly started
+        # by a previous cycle.
+        self.refreshing = None
+
+    def _poll_instance(self, instance, counter_names, cancelled):
+        counters = []
+        for pollster in self.pollsters:
+            if cancelled.ready():
+                # The deadline of the cycle has been reached, the cycle
+                # is over and its caches are cleared.
+                break
+            names = counter_names.get(pollster)
+            if not names:
+                continue
+            try:
+                LOG.info("Polling pollster %s", pollster.name)
+                counters.extend(list(pollster.obj.get_counters(
+                    self.manager,
+                    instance,
+                    counter_names=names)))
+            except Exception as err:
+                LOG.warning('Continue after error from %s: %s',
+                            pollster.name, err)
+                LOG.exception(err)
+        return counters
+
+    def _poll_instance_into(self, instance, counter_names, cancelled,
+                            results):
+        try:
+            results.put(self._poll_instance(instance, counter_names,
+                                            cancelled))
+        except Exception as err:
+            LOG.exception(err)
+            results.put([])
+        finally:
+            self.in_flight.discard(instance.id)
+
+    def _refresh(self):
+        """Take the statistics snapshot of the cycle.
+
+        Return False if the snapshot of a previous cycle is still being
+        taken, libvirt being most likely stuck.
+        """
+        if self.refreshing is not None and not self.refreshing.dead:
+            LOG.warning('Skipping the polling cycle, the previous '
+                        'inspection of the instances is not finished')
+            return False
+        self.refreshing = eventlet.spawn(self.manager.inspector.refresh)
+        self.refreshing.wait()
+        return True
+
+    def poll_and_publish_instances(self, instances, refresh=False):
+        """Poll the instances concurrently and publish their counters.
+
+        Instances whose polling started in a previous cycle and has not
+        finished yet are skipped. Once compute_polling_deadline seconds
+        have elapsed, the counters of the instances whose polling has
+        not finished are not waited for anymore, and their polling stops
+        as soon as the current call returns.
+
+        :param instances: The instances to poll.
+        :param refresh: Take the statistics snapshot of the cycle first,
+                        within the deadline.
+        """
+        results = queue.LightQueue()
+        cancelled = event.Event()
+        counter_names = self.counter_names
+        started = False
+        pending = 0
+        counters = []
+        with eventlet.Timeout(cfg.CONF.compute_polling_deadline or None,
+                              False):
+            if refresh and not self._refresh():
+                instances = []
+            started = True
             for instance in instances:
-                if getattr(instance, 'OS-EXT-STS:vm_state', None) != 'error':
-                    # TODO(yjiang5) passing counters to get_counters to avoid
-                    # polling all counters one by one
-                    for pollster in self.pollsters:
-                        try:
-                            LOG.info("Polling pollster %s", pollster.name)
-                            publisher(list(pollster.obj.get_counters(
-                                self.manager,
-                                instance)))
-                        except Exception as err:
-                            LOG.warning('Continue after error from %s: %s',
-                                        pollster.name, err)
-                            LOG.exception(err)
+                if getattr(instance, 'OS-EXT-STS:vm_state', None) == 'error':
+                    continue
+                if instance.id in self.in_flight:
+                    LOG.warning('Skipping instance %s, still being polled',
+                                instance.id)
+                    continue
+                self.in_flight.add(instance.id)
+                self.pool.spawn_n(self._poll_instance_into, instance,
+                                  counter_names, cancelled, results)
+                pending += 1
+            while pending:
+                counters.extend(results.get())
+                pending -= 1
+        if not started:
+            LOG.warning('Polling deadline reached while inspecting the '
+                        'instances')
+        elif pending:
+            LOG.warning('Polling deadline reached, %d instances not polled',
+                        pending)
+        cancelled.send()
+
+        with self.publish_context as publisher:
+            publisher(counters)
 
     def poll_and_publish(self):
-        self.poll_and_publish_instances(
-            self.manager.nv.instance_get_all_by_host(cfg.CONF.host))
+        instances = self.manager.discovery.discover()
+        # The statistics of all the instances are taken at once for the
+        # pollsters of this cycle, and the counters of an instance share
+        # its metadata and the timestamp of the cycle.
+        self.manager.metadata_cache.refresh()
+        try:
+            self.poll_and_publish_instances(instances, refresh=True)
+        finally:
+            self.manager.inspector.clear()
+            self.manager.metadata_cache.clear()
 
 
 class AgentManager(agent.AgentManager):
@@ -60,8 +164,11 @@ class AgentManager(agent.AgentManager):
                 disabled_names=cfg.CONF.disabled_compute_pollsters,
             ),
         )
-        self._inspector = virt_inspector.get_hypervisor_inspector()
+        self._inspector = virt_inspector.SnapshotInspector(
+            virt_inspector.get_hypervisor_inspector())
         self.nv = nova_client.Client()
+        self.discovery = discovery.InstanceDiscovery(self._inspector, self.nv)
+        self.metadata_cache = compute_instance.MetadataCache()
 
     def create_polling_task(self):
         return PollingTask(self)
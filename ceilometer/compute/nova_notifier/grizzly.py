@@ -43,6 +43,7 @@ from nova.conductor import api
 from oslo.config import cfg
 
 from ceilometer import extension_manager
+from ceilometer.compute import instance as compute_instance
 from ceilometer.compute.virt import inspector
 from ceilometer.openstack.common.gettextutils import _
 
@@ -63,15 +64,20 @@ class DeletedInstanceStatsGatherer(object):
     def __init__(self, extensions):
         self.mgr = extensions
         self.inspector = inspector.get_hypervisor_inspector()
+        self.metadata_cache = compute_instance.MetadataCache()
 
     def _get_counters_from_plugin(self, ext, instance, *args, **kwds):
         """Used with the extenaion manager map() method."""
         return ext.obj.get_counters(self, instance)
 
     def __call__(self, instance):
-        counters = self.mgr.map(self._get_counters_from_plugin,
-                                instance=instance,
-                                )
+        self.metadata_cache.refresh()
+        try:
+            counters = self.mgr.map(self._get_counters_from_plugin,
+                                    instance=instance,
+                                    )
+        finally:
+            self.metadata_cache.clear()
         # counters is a list of lists, so flatten it before returning
         # the results
         results = []
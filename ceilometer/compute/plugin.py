@@ -30,6 +30,10 @@ class ComputePollster(plugin.PollsterBase):
     __metaclass__ = abc.ABCMeta
 
     @abc.abstractmethod
-    def get_counters(self, manager, context):
+    def get_counters(self, manager, instance, counter_names=None):
         """Return a sequence of Counter instances from polling the
-        resources."""
+        resources of the instance.
+
+        :param counter_names: Names of the counters to return, or None
+                              for all of them.
+        """
@@ -18,14 +18,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
-import copy
 import datetime
+import functools
 
 from ceilometer.compute import instance as compute_instance
 from ceilometer.compute import plugin
 from ceilometer import counter
 from ceilometer.openstack.common import log
 from ceilometer.openstack.common import timeutils
+from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
@@ -35,7 +36,10 @@ def _instance_name(instance):
     return getattr(instance, 'OS-EXT-SRV-ATTR:instance_name', None)
 
 
-def make_counter_from_instance(instance, name, type, unit, volume):
+def make_counter_from_instance(instance, name, type, unit, volume,
+                               metadata=None, timestamp=None):
+    if metadata is None:
+        metadata = compute_instance.get_metadata_from_object(instance)
     return counter.Counter(
         name=name,
         type=type,
@@ -44,11 +48,23 @@ def make_counter_from_instance(instance, name, type, unit, volume):
         user_id=instance.user_id,
         project_id=instance.tenant_id,
         resource_id=instance.id,
-        timestamp=timeutils.isotime(),
-        resource_metadata=compute_instance.get_metadata_from_object(instance),
+        timestamp=timestamp or timeutils.isotime(),
+        resource_metadata=metadata,
     )
 
 
+def _counter_maker(manager, instance):
+    """Return a function making the counters of an instance.
+
+    The counters share the metadata and timestamp cached by the manager
+    for the current polling cycle.
+    """
+    return functools.partial(make_counter_from_instance,
+                             instance,
+                             metadata=manager.metadata_cache.get(instance),
+                             timestamp=manager.metadata_cache.timestamp)
+
+
 class InstancePollster(plugin.ComputePollster):
 
     @staticmethod
@@ -57,18 +73,18 @@ class InstancePollster(plugin.ComputePollster):
         # variable. We don't need such format in future
         return ['instance', 'instance:*']
 
-    def get_counters(self, manager, instance):
-        yield make_counter_from_instance(instance,
-                                         name='instance',
-                                         type=counter.TYPE_GAUGE,
-                                         unit='instance',
-                                         volume=1)
-        yield make_counter_from_instance(instance,
-                                         name='instance:%s' %
-                                         instance.flavor['name'],
-                                         type=counter.TYPE_GAUGE,
-                                         unit='instance',
-                                         volume=1)
+    def get_counters(self, manager, instance, counter_names=None):
+        make_counter = _counter_maker(manager, instance)
+        if self.requested(counter_names, 'instance'):
+            yield make_counter(name='instance',
+                               type=counter.TYPE_GAUGE,
+                               unit='instance',
+                               volume=1)
+        if self.requested(counter_names, 'instance:*'):
+            yield make_counter(name='instance:%s' % instance.flavor['name'],
+                               type=counter.TYPE_GAUGE,
+                               unit='instance',
+                               volume=1)
 
 
 class DiskIOPollster(plugin.ComputePollster):
@@ -91,9 +107,10 @@ class DiskIOPollster(plugin.ComputePollster):
                 'disk.write.requests',
                 'disk.write.bytes']
 
-    def get_counters(self, manager, instance):
+    def get_counters(self, manager, instance, counter_names=None):
         instance_name = _instance_name(instance)
         try:
+            make_counter = _counter_maker(manager, instance)
             r_bytes = 0
             r_requests = 0
             w_bytes = 0
@@ -107,30 +124,30 @@ class DiskIOPollster(plugin.ComputePollster):
                 r_requests += info.read_requests
                 w_bytes += info.write_bytes
                 w_requests += info.write_requests
-            yield make_counter_from_instance(instance,
-                                             name='disk.read.requests',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='request',
-                                             volume=r_requests,
-                                             )
-            yield make_counter_from_instance(instance,
-                                             name='disk.read.bytes',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='B',
-                                             volume=r_bytes,
-                                             )
-            yield make_counter_from_instance(instance,
-                                             name='disk.write.requests',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='request',
-                                             volume=w_requests,
-                                             )
-            yield make_counter_from_instance(instance,
-                                             name='disk.write.bytes',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='B',
-                                             volume=w_bytes,
-                                             )
+            if self.requested(counter_names, 'disk.read.requests'):
+                yield make_counter(name='disk.read.requests',
+                                   type=counter.TYPE_CUMULATIVE,
+                                   unit='request',
+                                   volume=r_requests,
+                                   )
+            if self.requested(counter_names, 'disk.read.bytes'):
+                yield make_counter(name='disk.read.bytes',
+                                   type=counter.TYPE_CUMULATIVE,
+                                   unit='B',
+                                   volume=r_bytes,
+                                   )
+            if self.requested(counter_names, 'disk.write.requests'):
+                yield make_counter(name='disk.write.requests',
+                                   type=counter.TYPE_CUMULATIVE,
+                                   unit='request',
+                                   volume=w_requests,
+                                   )
+            if self.requested(counter_names, 'disk.write.bytes'):
+                yield make_counter(name='disk.write.bytes',
+                                   type=counter.TYPE_CUMULATIVE,
+                                   unit='B',
+                                   volume=w_bytes,
+                                   )
         except Exception as err:
             self.LOG.warning('Ignoring instance %s: %s',
                              instance_name, err)
@@ -164,33 +181,34 @@ class CPUPollster(plugin.ComputePollster):
     def get_counter_names():
         return ['cpu', 'cpu_util']
 
-    def get_counters(self, manager, instance):
+    def get_counters(self, manager, instance, counter_names=None):
         self.LOG.info('checking instance %s', instance.id)
         instance_name = _instance_name(instance)
         try:
             cpu_info = manager.inspector.inspect_cpus(instance_name)
             self.LOG.info("CPUTIME USAGE: %s %d",
                           instance.__dict__, cpu_info.time)
-            cpu_util = self.get_cpu_util(instance, cpu_info)
-            self.LOG.info("CPU UTILIZATION %%: %s %0.2f",
-                          instance.__dict__, cpu_util)
+            make_counter = _counter_maker(manager, instance)
             # FIXME(eglynn): once we have a way of configuring which measures
             #                are published to each sink, we should by default
             #                disable publishing this derived measure to the
             #                metering store, only publishing to those sinks
             #                that specifically need it
-            yield make_counter_from_instance(instance,
-                                             name='cpu_util',
-                                             type=counter.TYPE_GAUGE,
-                                             unit='%',
-                                             volume=cpu_util,
-                                             )
-            yield make_counter_from_instance(instance,
-                                             name='cpu',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='ns',
-                                             volume=cpu_info.time,
-                                             )
+            if self.requested(counter_names, 'cpu_util'):
+                cpu_util = self.get_cpu_util(instance, cpu_info)
+                self.LOG.info("CPU UTILIZATION %%: %s %0.2f",
+                              instance.__dict__, cpu_util)
+                yield make_counter(name='cpu_util',
+                                   type=counter.TYPE_GAUGE,
+                                   unit='%',
+                                   volume=cpu_util,
+                                   )
+            if self.requested(counter_names, 'cpu'):
+                yield make_counter(name='cpu',
+                                   type=counter.TYPE_CUMULATIVE,
+                                   unit='ns',
+                                   volume=cpu_info.time,
+                                   )
         except Exception as err:
             self.LOG.error('could not get CPU time for %s: %s',
                            instance.id, err)
@@ -205,13 +223,16 @@ class NetPollster(plugin.ComputePollster):
                                   "write-bytes=%d"])
 
     @staticmethod
-    def make_vnic_counter(instance, name, type, unit, volume, vnic_data):
-        metadata = copy.copy(vnic_data)
-        resource_metadata = dict(zip(metadata._fields, metadata))
+    def make_vnic_metadata(instance, vnic_data):
+        resource_metadata = dict(zip(vnic_data._fields, vnic_data))
         resource_metadata['instance_id'] = instance.id
         resource_metadata['instance_type'] = \
             instance.flavor['id'] if instance.flavor else None
+        return utils.FrozenDict(resource_metadata)
 
+    @staticmethod
+    def make_vnic_counter(instance, name, type, unit, volume, vnic_data,
+                          resource_metadata, timestamp):
         return counter.Counter(
             name=name,
             type=type,
@@ -220,7 +241,7 @@ class NetPollster(plugin.ComputePollster):
             user_id=instance.user_id,
             project_id=instance.tenant_id,
             resource_id=vnic_data.fref,
-            timestamp=timeutils.isotime(),
+            timestamp=timestamp,
             resource_metadata=resource_metadata
         )
 
@@ -231,41 +252,33 @@ class NetPollster(plugin.ComputePollster):
                 'network.outgoing.bytes',
                 'network.outgoing.packets']
 
-    def get_counters(self, manager, instance):
+    def get_counters(self, manager, instance, counter_names=None):
         instance_name = _instance_name(instance)
         self.LOG.info('checking instance %s', instance.id)
         try:
+            timestamp = manager.metadata_cache.timestamp
             for vnic, info in manager.inspector.inspect_vnics(instance_name):
                 self.LOG.info(self.NET_USAGE_MESSAGE, instance_name,
                               vnic.name, info.rx_bytes, info.tx_bytes)
-                yield self.make_vnic_counter(instance,
-                                             name='network.incoming.bytes',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='B',
-                                             volume=info.rx_bytes,
-                                             vnic_data=vnic,
-                                             )
-                yield self.make_vnic_counter(instance,
-                                             name='network.outgoing.bytes',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='B',
-                                             volume=info.tx_bytes,
-                                             vnic_data=vnic,
-                                             )
-                yield self.make_vnic_counter(instance,
-                                             name='network.incoming.packets',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='packet',
-                                             volume=info.rx_packets,
-                                             vnic_data=vnic,
-                                             )
-                yield self.make_vnic_counter(instance,
-                                             name='network.outgoing.packets',
-                                             type=counter.TYPE_CUMULATIVE,
-                                             unit='packet',
-                                             volume=info.tx_packets,
-                                             vnic_data=vnic,
-                                             )
+                metadata = self.make_vnic_metadata(instance, vnic)
+                for name, unit, volume in (
+                        ('network.incoming.bytes', 'B', info.rx_bytes),
+                        ('network.outgoing.bytes', 'B', info.tx_bytes),
+                        ('network.incoming.packets', 'packet',
+                         info.rx_packets),
+                        ('network.outgoing.packets', 'packet',
+                         info.tx_packets)):
+                    if self.requested(counter_names, name):
+                        yield self.make_vnic_counter(
+                            instance,
+                            name=name,
+                            type=counter.TYPE_CUMULATIVE,
+                            unit=unit,
+                            volume=volume,
+                            vnic_data=vnic,
+                            resource_metadata=metadata,
+                            timestamp=timestamp,
+                        )
         except Exception as err:
             self.LOG.warning('Ignoring instance %s: %s',
                              instance_name, err)
@@ -97,6 +97,16 @@ DiskStats = collections.namedtuple('DiskStats',
                                     'errors'])
 
 
+# Named tuple representing the statistics of an instance.
+#
+# cpu: the CPUStats of the instance
+# vnics: list of (Interface, InterfaceStats) pairs
+# disks: list of (Disk, DiskStats) pairs
+#
+InstanceStats = collections.namedtuple('InstanceStats',
+                                       ['cpu', 'vnics', 'disks'])
+
+
 # Exception types
 #
 class InspectorException(Exception):
@@ -147,6 +157,71 @@ class Inspector(object):
         """
         raise NotImplementedError()
 
+    def inspect_all(self):
+        """
+        Inspect the statistics of all the instances at once.
+
+        :return: a dict mapping the instance names to their InstanceStats
+        """
+        raise NotImplementedError()
+
+    def clear_cache(self):
+        """
+        Forget the state kept for the current polling cycle.
+        """
+
+
+class SnapshotInspector(Inspector):
+    """Inspector answering from a snapshot of all the instances.
+
+    The statistics of all the instances are taken in one go by
+    refresh(), and the instances missing from the snapshot, or every
+    instance once the snapshot is cleared, are inspected one by one by
+    the wrapped inspector.
+    """
+
+    def __init__(self, inspector):
+        self.inspector = inspector
+        self.snapshot = {}
+
+    def refresh(self):
+        try:
+            self.snapshot = self.inspector.inspect_all()
+        except NotImplementedError:
+            self.snapshot = {}
+        except Exception as err:
+            LOG.warning('Unable to inspect all the instances: %s', err)
+            LOG.exception(err)
+            self.snapshot = {}
+
+    def clear(self):
+        self.snapshot = {}
+        self.inspector.clear_cache()
+
+    def inspect_instances(self):
+        return self.inspector.inspect_instances()
+
+    def inspect_cpus(self, instance_name):
+        stats = self.snapshot.get(instance_name)
+        if stats is None:
+            return self.inspector.inspect_cpus(instance_name)
+        return stats.cpu
+
+    def inspect_vnics(self, instance_name):
+        stats = self.snapshot.get(instance_name)
+        if stats is None:
+            return self.inspector.inspect_vnics(instance_name)
+        return stats.vnics
+
+    def inspect_disks(self, instance_name):
+        stats = self.snapshot.get(instance_name)
+        if stats is None:
+            return self.inspector.inspect_disks(instance_name)
+        return stats.disks
+
+    def inspect_all(self):
+        return self.inspector.inspect_all()
+
 
 def get_hypervisor_inspector():
     try:
@@ -17,11 +17,15 @@
 # under the License.
 """Implementation of Inspector abstraction for libvirt."""
 
+import collections
+
+from eventlet import tpool
 from lxml import etree
 from oslo.config import cfg
 
 from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.openstack.common import log as logging
+from ceilometer.openstack.common import timeutils
 
 libvirt = None
 
@@ -36,12 +40,40 @@ libvirt_opts = [
                default='',
                help='Override the default libvirt URI '
                     '(which is dependent on libvirt_type)'),
+    cfg.BoolOpt('libvirt_nonblocking',
+                default=True,
+                help='Run the libvirt calls in native threads, so that '
+                     'instances can be polled concurrently'),
+    cfg.IntOpt('libvirt_connection_check_interval',
+               default=60,
+               help='Minimum number of seconds between two checks of the '
+                    'connection to libvirt'),
+    cfg.IntOpt('libvirt_device_cache_ttl',
+               default=300,
+               help='Number of seconds the devices parsed from the XML '
+                    'description of a domain are reused'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(libvirt_opts)
 
 
+# Devices of a domain, parsed from its XML description.
+#
+# domain_id: the ID of the domain when it was described, which changes
+#            when the domain is restarted
+# interfaces: list of Interface
+# disks: list of disk device names
+# names: frozenset of the device names the description was parsed for,
+#        as given by the statistics of the domain or else by the
+#        description itself
+# loaded_at: when the description was parsed, as a UNIX timestamp
+#
+DomainDevices = collections.namedtuple('DomainDevices',
+                                       ['domain_id', 'interfaces', 'disks',
+                                        'names', 'loaded_at'])
+
+
 class LibvirtInspector(virt_inspector.Inspector):
 
     per_type_uris = dict(uml='uml:///system', xen='xen:///', lxc='lxc:///')
@@ -49,20 +81,43 @@ class LibvirtInspector(virt_inspector.Inspector):
     def __init__(self):
         self.uri = self._get_uri()
         self.connection = None
+        self.connection_checked_at = 0
+        # Domain name -> domain, during a polling cycle only
+        self.domains = None
+        # Domain UUID -> DomainDevices
+        self.devices = {}
 
     def _get_uri(self):
         return CONF.libvirt_uri or self.per_type_uris.get(CONF.libvirt_type,
                                                           'qemu:///system')
 
     def _get_connection(self):
+        now = timeutils.utcnow_ts()
+        if (self.connection and
+                now - self.connection_checked_at <
+                CONF.libvirt_connection_check_interval):
+            return self.connection
+
         if not self.connection or not self._test_connection():
             global libvirt
             if libvirt is None:
                 libvirt = __import__('libvirt')
 
             LOG.debug('Connecting to libvirt: %s', self.uri)
-            self.connection = libvirt.openReadOnly(self.uri)
+            if CONF.libvirt_nonblocking:
+                # The calls to the connection and to the domains it
+                # returns are run in native threads not to block the
+                # green threads polling the other instances.
+                self.connection = tpool.proxy_call(
+                    (libvirt.virDomain, libvirt.virConnect),
+                    libvirt.openReadOnly, self.uri)
+            else:
+                self.connection = libvirt.openReadOnly(self.uri)
+            if self.domains is not None:
+                # The domains of the previous connection are unusable.
+                self.domains = {}
 
+        self.connection_checked_at = now
         return self.connection
 
     def _test_connection(self):
@@ -78,13 +133,24 @@ class LibvirtInspector(virt_inspector.Inspector):
             raise
 
     def _lookup_by_name(self, instance_name):
+        if self.domains is not None and instance_name in self.domains:
+            return self.domains[instance_name]
         try:
-            return self._get_connection().lookupByName(instance_name)
+            domain = self._get_connection().lookupByName(instance_name)
         except Exception as ex:
+            # Check the connection at the next call, it may be broken.
+            self.connection_checked_at = 0
             error_code = ex.get_error_code() if libvirt else 'unknown'
             msg = ("Error from libvirt while looking up %(instance_name)s: "
                    "[Error Code %(error_code)s] %(ex)s" % locals())
             raise virt_inspector.InstanceNotFoundException(msg)
+        if self.domains is not None:
+            self.domains[instance_name] = domain
+        return domain
+
+    def clear_cache(self):
+        """End the polling cycle, forgetting the domains looked up."""
+        self.domains = None
 
     def inspect_instances(self):
         if self._get_connection().numOfDomains() > 0:
@@ -94,47 +160,233 @@ class LibvirtInspector(virt_inspector.Inspector):
                     if domain_id != 0:
                         domain = self._get_connection().lookupByID(domain_id)
                         yield virt_inspector.Instance(name=domain.name(),
-                                                      uuid=domain.UUIDString())
+                                                      UUID=domain.UUIDString())
                 except libvirt.libvirtError:
                     # Instance was deleted while listing... ignore it
                     pass
 
-    def inspect_cpus(self, instance_name):
-        domain = self._lookup_by_name(instance_name)
+    def _get_devices(self, domain, names=None):
+        """Return the DomainDevices of a domain.
+
+        The XML description of the domain is only fetched and parsed
+        again when the domain has been restarted, when the cached
+        devices are older than libvirt_device_cache_ttl, or when the
+        names of the devices known from its statistics changed.
+
+        :param domain: The domain.
+        :param names: Optional set of the device names of the domain.
+        """
+        uuid = domain.UUIDString()
+        domain_id = domain.ID()
+        now = timeutils.utcnow_ts()
+        devices = self.devices.get(uuid)
+        if (devices is None
+                or devices.domain_id != domain_id
+                or now - devices.loaded_at >= CONF.libvirt_device_cache_ttl
+                or (names is not None and names != devices.names)):
+            tree = etree.fromstring(domain.XMLDesc(0))
+            interfaces = list(self._interfaces(tree))
+            disks = self._disk_devices(tree)
+            devices = DomainDevices(
+                domain_id=domain_id,
+                interfaces=interfaces,
+                disks=disks,
+                names=(names if names is not None
+                       else frozenset([i.name for i in interfaces] + disks)),
+                loaded_at=now)
+            self.devices[uuid] = devices
+        return devices
+
+    def invalidate(self, uuid=None):
+        """Forget the devices of a domain, or of all of them."""
+        if uuid is None:
+            self.devices.clear()
+        else:
+            self.devices.pop(uuid, None)
+
+    def _forget_vanished(self, uuids):
+        for uuid in set(self.devices) - set(uuids):
+            del self.devices[uuid]
+
+    @staticmethod
+    def _cpu_stats(domain):
         (_, _, _, num_cpu, cpu_time) = domain.info()
         return virt_inspector.CPUStats(number=num_cpu, time=cpu_time)
 
-    def inspect_vnics(self, instance_name):
-        domain = self._lookup_by_name(instance_name)
-        tree = etree.fromstring(domain.XMLDesc(0))
+    @staticmethod
+    def _interfaces(tree):
         for iface in tree.findall('devices/interface'):
             name = iface.find('target').get('dev')
             mac = iface.find('mac').get('address')
             fref = iface.find('filterref').get('filter')
             params = dict((p.get('name').lower(), p.get('value'))
                           for p in iface.findall('filterref/parameter'))
-            interface = virt_inspector.Interface(name=name, mac=mac,
-                                                 fref=fref, parameters=params)
-            rx_bytes, rx_packets, _, _, \
-                tx_bytes, tx_packets, _, _ = domain.interfaceStats(name)
-            stats = virt_inspector.InterfaceStats(rx_bytes=rx_bytes,
-                                                  rx_packets=rx_packets,
-                                                  tx_bytes=tx_bytes,
-                                                  tx_packets=tx_packets)
-            yield (interface, stats)
+            yield virt_inspector.Interface(name=name, mac=mac,
+                                           fref=fref, parameters=params)
+
+    @staticmethod
+    def _disk_devices(tree):
+        return filter(bool,
+                      [target.get("dev")
+                       for target in tree.findall('devices/disk/target')])
+
+    def _vnic_stats(self, domain, devices):
+        vnics = []
+        try:
+            for interface in devices.interfaces:
+                rx_bytes, rx_packets, _, _, \
+                    tx_bytes, tx_packets, _, _ = domain.interfaceStats(
+                        interface.name)
+                stats = virt_inspector.InterfaceStats(rx_bytes=rx_bytes,
+                                                      rx_packets=rx_packets,
+                                                      tx_bytes=tx_bytes,
+                                                      tx_packets=tx_packets)
+                vnics.append((interface, stats))
+        except Exception:
+            # The device may have been unplugged.
+            self.invalidate(domain.UUIDString())
+            raise
+        return vnics
+
+    def _disk_stats(self, domain, devices):
+        disks = []
+        try:
+            for device in devices.disks:
+                disk = virt_inspector.Disk(device=device)
+                block_stats = domain.blockStats(device)
+                stats = virt_inspector.DiskStats(
+                    read_requests=block_stats[0],
+                    read_bytes=block_stats[1],
+                    write_requests=block_stats[2],
+                    write_bytes=block_stats[3],
+                    errors=block_stats[4])
+                disks.append((disk, stats))
+        except Exception:
+            # The device may have been unplugged.
+            self.invalidate(domain.UUIDString())
+            raise
+        return disks
+
+    def inspect_cpus(self, instance_name):
+        domain = self._lookup_by_name(instance_name)
+        return self._cpu_stats(domain)
+
+    def inspect_vnics(self, instance_name):
+        domain = self._lookup_by_name(instance_name)
+        return self._vnic_stats(domain, self._get_devices(domain))
 
     def inspect_disks(self, instance_name):
         domain = self._lookup_by_name(instance_name)
-        tree = etree.fromstring(domain.XMLDesc(0))
-        for device in filter(
-                bool,
-                [target.get("dev")
-                 for target in tree.findall('devices/disk/target')]):
-            disk = virt_inspector.Disk(device=device)
-            block_stats = domain.blockStats(device)
-            stats = virt_inspector.DiskStats(read_requests=block_stats[0],
-                                             read_bytes=block_stats[1],
-                                             write_requests=block_stats[2],
-                                             write_bytes=block_stats[3],
-                                             errors=block_stats[4])
-            yield (disk, stats)
+        return self._disk_stats(domain, self._get_devices(domain))
+
+    def _bulk_instance_stats(self, domain, record):
+        """Build the statistics of a domain from its bulk stats record."""
+        cpu = virt_inspector.CPUStats(number=record['vcpu.current'],
+                                      time=record['cpu.time'])
+
+        net = dict((record['net.%d.name' % i], i)
+                   for i in range(record.get('net.count', 0)))
+        block = dict((record['block.%d.name' % i], i)
+                     for i in range(record.get('block.count', 0)))
+        devices = self._get_devices(domain,
+                                    frozenset(net.keys() + block.keys()))
+
+        vnics = []
+        for interface in devices.interfaces:
+            i = net[interface.name]
+            vnics.append((interface, virt_inspector.InterfaceStats(
+                rx_bytes=record['net.%d.rx.bytes' % i],
+                rx_packets=record['net.%d.rx.pkts' % i],
+                tx_bytes=record['net.%d.tx.bytes' % i],
+                tx_packets=record['net.%d.tx.pkts' % i])))
+
+        disks = []
+        for device in devices.disks:
+            i = block[device]
+            disks.append((virt_inspector.Disk(device=device),
+                          virt_inspector.DiskStats(
+                              read_requests=record['block.%d.rd.reqs' % i],
+                              read_bytes=record['block.%d.rd.bytes' % i],
+                              write_requests=record['block.%d.wr.reqs' % i],
+                              write_bytes=record['block.%d.wr.bytes' % i],
+                              # Not part of the bulk statistics.
+                              errors=record.get('block.%d.errors' % i, -1))))
+        return virt_inspector.InstanceStats(cpu=cpu, vnics=vnics,
+                                            disks=disks)
+
+    @staticmethod
+    def _nonblocking_domain(domain):
+        """Run the calls to a domain in native threads, like the calls to
+        the connection.
+
+        The domains nested in the results of the connection, such as those
+        of getAllDomainStats(), are not wrapped by the connection proxy.
+        """
+        if (CONF.libvirt_nonblocking
+                and not isinstance(domain, tpool.Proxy)):
+            return tpool.Proxy(domain, autowrap=(libvirt.virDomain,))
+        return domain
+
+    def _inspect_all_bulk(self, conn):
+        stats = {}
+        uuids = []
+        for domain, record in conn.getAllDomainStats(
+                libvirt.VIR_DOMAIN_STATS_CPU_TOTAL |
+                libvirt.VIR_DOMAIN_STATS_VCPU |
+                libvirt.VIR_DOMAIN_STATS_INTERFACE |
+                libvirt.VIR_DOMAIN_STATS_BLOCK,
+                libvirt.VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE):
+            domain = self._nonblocking_domain(domain)
+            uuids.append(domain.UUIDString())
+            self.domains[domain.name()] = domain
+            try:
+                stats[domain.name()] = self._bulk_instance_stats(domain,
+                                                                 record)
+            except (KeyError, libvirt.libvirtError) as err:
+                # Leave the domain to the per-domain calls.
+                LOG.debug('No bulk statistics for %s: %s',
+                          domain.name(), err)
+        self._forget_vanished(uuids)
+        return stats
+
+    def _inspect_all_per_domain(self, conn):
+        stats = {}
+        uuids = []
+        for domain_id in conn.listDomainsID():
+            # We skip domains with ID 0 (hypervisors).
+            if domain_id == 0:
+                continue
+            try:
+                domain = conn.lookupByID(domain_id)
+                uuids.append(domain.UUIDString())
+                self.domains[domain.name()] = domain
+                devices = self._get_devices(domain)
+                stats[domain.name()] = virt_inspector.InstanceStats(
+                    cpu=self._cpu_stats(domain),
+                    vnics=self._vnic_stats(domain, devices),
+                    disks=self._disk_stats(domain, devices))
+            except libvirt.libvirtError as err:
+                # Instance was deleted while listing... ignore it
+                LOG.debug('No statistics for domain %s: %s',
+                          domain_id, err)
+        self._forget_vanished(uuids)
+        return stats
+
+    def inspect_all(self):
+        """Inspect all the domains, starting a polling cycle.
+
+        Until clear_cache() is called, the domains are not looked up by
+        name again.
+        """
+        conn = self._get_connection()
+        self.domains = {}
+        if hasattr(conn, 'getAllDomainStats'):
+            try:
+                return self._inspect_all_bulk(conn)
+            except libvirt.libvirtError as err:
+                if (err.get_error_code() !=
+                        libvirt.VIR_ERR_NO_SUPPORT):
+                    raise
+                LOG.debug('Bulk domain statistics not supported by %s',
+                          self.uri)
+        return self._inspect_all_per_domain(conn)
@@ -50,19 +50,68 @@ cfg.CONF.register_opts(OPTS)
 # Resource ID: the resource ID
 # Timestamp: when the counter has been read
 # Resource metadata: various metadata
-Counter = collections.namedtuple('Counter',
-                                 ' '.join([
-                                     'name',
-                                     'type',
-                                     'unit',
-                                     'volume',
-                                     'user_id',
-                                     'project_id',
-                                     'resource_id',
-                                     'timestamp',
-                                     'resource_metadata',
-                                 ]))
+_Counter = collections.namedtuple('Counter',
+                                  ' '.join([
+                                      'name',
+                                      'type',
+                                      'unit',
+                                      'volume',
+                                      'user_id',
+                                      'project_id',
+                                      'resource_id',
+                                      'timestamp',
+                                      'resource_metadata',
+                                  ]))
 
+# Maximum number of distinct strings interned by intern_string().
+MAX_INTERNED = 10000
+
+_interned = {}
+
+
+def intern_string(value):
+    """Return the shared copy of a string equal to value.
+
+    Meter names, types and units take few distinct values, so counters
+    and samples share a single copy of each instead of one per sample.
+    str and unicode values are kept apart so that the type of the value
+    is preserved.
+    """
+    if not isinstance(value, basestring):
+        return value
+    key = (type(value), value)
+    shared = _interned.get(key)
+    if shared is None:
+        if len(_interned) >= MAX_INTERNED:
+            return value
+        shared = _interned[key] = value
+    return shared
+
+
+class Counter(_Counter):
+    """Counter without per instance dictionary.
+
+    The name, type and unit are interned.
+    """
+
+    __slots__ = ()
+
+    def __new__(cls, name, type, unit, volume, user_id, project_id,
+                resource_id, timestamp, resource_metadata):
+        return _Counter.__new__(cls,
+                                intern_string(name),
+                                intern_string(type),
+                                intern_string(unit),
+                                volume,
+                                user_id,
+                                project_id,
+                                resource_id,
+                                timestamp,
+                                resource_metadata)
+
+    @classmethod
+    def _make(cls, iterable):
+        return cls(*iterable)
 
 TYPE_GAUGE = 'gauge'
 TYPE_DELTA = 'delta'
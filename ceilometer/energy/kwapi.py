@@ -77,30 +77,32 @@ class KwapiPollster(_Base):
     def get_counter_names():
         return ['energy', 'power']
 
-    def get_counters(self, manager):
+    def get_counters(self, manager, counter_names=None):
         """Returns all counters."""
         for probe in self.iter_probes(manager.keystone):
-            yield counter.Counter(
-                name='energy',
-                type=counter.TYPE_CUMULATIVE,
-                unit='kWh',
-                volume=probe['kwh'],
-                user_id=None,
-                project_id=None,
-                resource_id=probe['id'],
-                timestamp=datetime.datetime.fromtimestamp(
-                    probe['timestamp']).isoformat(),
-                resource_metadata={}
-            )
-            yield counter.Counter(
-                name='power',
-                type=counter.TYPE_GAUGE,
-                unit='W',
-                volume=probe['w'],
-                user_id=None,
-                project_id=None,
-                resource_id=probe['id'],
-                timestamp=datetime.datetime.fromtimestamp(
-                    probe['timestamp']).isoformat(),
-                resource_metadata={}
-            )
+            if self.requested(counter_names, 'energy'):
+                yield counter.Counter(
+                    name='energy',
+                    type=counter.TYPE_CUMULATIVE,
+                    unit='kWh',
+                    volume=probe['kwh'],
+                    user_id=None,
+                    project_id=None,
+                    resource_id=probe['id'],
+                    timestamp=datetime.datetime.fromtimestamp(
+                        probe['timestamp']).isoformat(),
+                    resource_metadata={}
+                )
+            if self.requested(counter_names, 'power'):
+                yield counter.Counter(
+                    name='power',
+                    type=counter.TYPE_GAUGE,
+                    unit='W',
+                    volume=probe['w'],
+                    user_id=None,
+                    project_id=None,
+                    resource_id=probe['id'],
+                    timestamp=datetime.datetime.fromtimestamp(
+                        probe['timestamp']).isoformat(),
+                    resource_metadata={}
+                )
@@ -80,27 +80,30 @@ class ImagePollster(_Base):
     def get_counter_names():
         return ['image', 'image.size']
 
-    def get_counters(self, manager):
+    def get_counters(self, manager, counter_names=None):
         for image in self.iter_images(manager.keystone):
-            yield counter.Counter(
-                name='image',
-                type=counter.TYPE_GAUGE,
-                unit='image',
-                volume=1,
-                user_id=None,
-                project_id=image.owner,
-                resource_id=image.id,
-                timestamp=timeutils.isotime(),
-                resource_metadata=self.extract_image_metadata(image),
-            )
-            yield counter.Counter(
-                name='image.size',
-                type=counter.TYPE_GAUGE,
-                unit='B',
-                volume=image.size,
-                user_id=None,
-                project_id=image.owner,
-                resource_id=image.id,
-                timestamp=timeutils.isotime(),
-                resource_metadata=self.extract_image_metadata(image),
-            )
+            metadata = self.extract_image_metadata(image)
+            if self.requested(counter_names, 'image'):
+                yield counter.Counter(
+                    name='image',
+                    type=counter.TYPE_GAUGE,
+                    unit='image',
+                    volume=1,
+                    user_id=None,
+                    project_id=image.owner,
+                    resource_id=image.id,
+                    timestamp=timeutils.isotime(),
+                    resource_metadata=metadata,
+                )
+            if self.requested(counter_names, 'image.size'):
+                yield counter.Counter(
+                    name='image.size',
+                    type=counter.TYPE_GAUGE,
+                    unit='B',
+                    volume=image.size,
+                    user_id=None,
+                    project_id=image.owner,
+                    resource_id=image.id,
+                    timestamp=timeutils.isotime(),
+                    resource_metadata=metadata,
+                )
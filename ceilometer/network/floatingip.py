@@ -32,9 +32,19 @@ class FloatingIPPollster(plugin.CentralPollster):
     def get_counter_names():
         return ['ip.floating']
 
-    def get_counters(self, manager):
-        nv = nova_client.Client()
-        for ip in nv.floating_ip_get_all():
+    def __init__(self):
+        super(FloatingIPPollster, self).__init__()
+        self._nv = None
+
+    @property
+    def nv(self):
+        # Authenticate once, not at every polling cycle.
+        if self._nv is None:
+            self._nv = nova_client.Client()
+        return self._nv
+
+    def get_counters(self, manager, counter_names=None):
+        for ip in self.nv.floating_ip_get_all():
             self.LOG.info("FLOATING IP USAGE: %s" % ip.address)
             yield counter.Counter(
                 name='ip.floating',
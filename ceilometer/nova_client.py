@@ -16,14 +16,25 @@
 
 import functools
 
+from novaclient import exceptions as nova_exceptions
 from novaclient.v1_1 import client as nova_client
 from oslo.config import cfg
 
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
 from ceilometer import service  # For cfg.CONF.os_*
 
 LOG = log.getLogger(__name__)
 
+OPTS = [
+    cfg.IntOpt('nova_flavor_cache_ttl',
+               default=3600,
+               help='Number of seconds the names of the Nova flavors are '
+               'cached'),
+]
+
+cfg.CONF.register_opts(OPTS)
+
 
 def logged(func):
 
@@ -38,8 +49,44 @@ def logged(func):
     return with_logging
 
 
+class FlavorCache(object):
+    """Cache of the flavor names, counting its hits and misses."""
+
+    def __init__(self):
+        # Flavor id -> (fetched at, flavor name)
+        self.names = {}
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return float(self.hits) / total if total else 0.0
+
+    def get(self, fid, fetch):
+        """Return the name of a flavor.
+
+        :param fid: The id of the flavor.
+        :param fetch: Called with the flavor id on a cache miss, returns
+                      the flavor name.
+        """
+        now = timeutils.utcnow_ts()
+        entry = self.names.get(fid)
+        if (entry is not None
+                and now - entry[0] < cfg.CONF.nova_flavor_cache_ttl):
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        name = fetch(fid)
+        self.names[fid] = (now, name)
+        return name
+
+
 class Client(object):
 
+    # Shared by all the clients of the process.
+    flavor_cache = FlavorCache()
+
     def __init__(self):
         """Returns a nova Client object."""
         conf = cfg.CONF
@@ -50,14 +97,19 @@ class Client(object):
                                               auth_url=cfg.CONF.os_auth_url,
                                               no_cache=True)
 
+    def _fetch_flavor_name(self, fid):
+        try:
+            return self.nova_client.flavors.get(fid).name
+        except nova_exceptions.NotFound:
+            return 'unknown-id-%s' % fid
+
     def _with_flavor(self, instances):
-        flavors = dict((f.id, f) for f in self.nova_client.flavors.list())
         for instance in instances:
-            fid = instance.flavor['id']
-            try:
-                instance.flavor['name'] = flavors[fid].name
-            except KeyError:
-                instance.flavor['name'] = 'unknown-id-%s' % fid
+            instance.flavor['name'] = self.flavor_cache.get(
+                instance.flavor['id'], self._fetch_flavor_name)
+        LOG.debug('flavor cache: %d hits, %d misses, %.0f%% hit rate',
+                  self.flavor_cache.hits, self.flavor_cache.misses,
+                  self.flavor_cache.hit_rate * 100)
         return instances
 
     @logged
@@ -53,41 +53,44 @@ class _Base(plugin.PollsterBase):
     def iter_accounts(ksclient):
         """Iterate over all accounts, yielding (tenant_id, stats) tuples."""
 
-    def get_counters(self, manager):
+    def get_counters(self, manager, counter_names=None):
         for tenant, account in self.iter_accounts(manager.keystone):
-            yield counter.Counter(
-                name='storage.objects',
-                type=counter.TYPE_GAUGE,
-                volume=int(account['x-account-object-count']),
-                unit='object',
-                user_id=None,
-                project_id=tenant,
-                resource_id=tenant,
-                timestamp=timeutils.isotime(),
-                resource_metadata=None,
-            )
-            yield counter.Counter(
-                name='storage.objects.size',
-                type=counter.TYPE_GAUGE,
-                volume=int(account['x-account-bytes-used']),
-                unit='B',
-                user_id=None,
-                project_id=tenant,
-                resource_id=tenant,
-                timestamp=timeutils.isotime(),
-                resource_metadata=None,
-            )
-            yield counter.Counter(
-                name='storage.objects.containers',
-                type=counter.TYPE_GAUGE,
-                volume=int(account['x-account-container-count']),
-                unit='container',
-                user_id=None,
-                project_id=tenant,
-                resource_id=tenant,
-                timestamp=timeutils.isotime(),
-                resource_metadata=None,
-            )
+            if self.requested(counter_names, 'storage.objects'):
+                yield counter.Counter(
+                    name='storage.objects',
+                    type=counter.TYPE_GAUGE,
+                    volume=int(account['x-account-object-count']),
+                    unit='object',
+                    user_id=None,
+                    project_id=tenant,
+                    resource_id=tenant,
+                    timestamp=timeutils.isotime(),
+                    resource_metadata=None,
+                )
+            if self.requested(counter_names, 'storage.objects.size'):
+                yield counter.Counter(
+                    name='storage.objects.size',
+                    type=counter.TYPE_GAUGE,
+                    volume=int(account['x-account-bytes-used']),
+                    unit='B',
+                    user_id=None,
+                    project_id=tenant,
+                    resource_id=tenant,
+                    timestamp=timeutils.isotime(),
+                    resource_metadata=None,
+                )
+            if self.requested(counter_names, 'storage.objects.containers'):
+                yield counter.Counter(
+                    name='storage.objects.containers',
+                    type=counter.TYPE_GAUGE,
+                    volume=int(account['x-account-container-count']),
+                    unit='container',
+                    user_id=None,
+                    project_id=tenant,
+                    resource_id=tenant,
+                    timestamp=timeutils.isotime(),
+                    resource_metadata=None,
+                )
 
 
 class SwiftPollster(_Base):
@@ -83,9 +83,19 @@ class PollsterBase(PluginBase):
         """Return a sequence of Counter names supported by the pollster."""
 
     @abc.abstractmethod
-    def get_counters(self, manager, instance):
+    def get_counters(self, manager, instance, counter_names=None):
         """Return a sequence of Counter instances from polling the
-        resources."""
+        resources.
+
+        :param counter_names: Names, as returned by get_counter_names(),
+                              of the counters the pipelines need, or None
+                              for all of them.
+        """
+
+    @staticmethod
+    def requested(counter_names, name):
+        """Tell whether the counter name is among the requested ones."""
+        return counter_names is None or name in counter_names
 
 
 class PublisherBase(PluginBase):
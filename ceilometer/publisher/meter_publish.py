@@ -68,7 +68,7 @@ class MeterPublisher(plugin.PublisherBase):
             'version': '1.0',
             'args': {'data': meters},
         }
-        LOG.debug('PUBLISH: %s', str(msg))
+        LOG.debug('PUBLISH: %s', msg)
         rpc.cast(context, topic, msg)
 
         for meter_name, meter_list in itertools.groupby(
@@ -43,6 +43,9 @@ STORAGE_OPTS = [
 
 cfg.CONF.register_opts(STORAGE_OPTS)
 
+# Sample fields the statistics can be grouped by.
+GROUPBY_FIELDS = ('counter_name', 'user_id', 'project_id', 'resource_id')
+
 
 def register_opts(conf):
     """Register any options for the storage system."""
@@ -77,7 +80,8 @@ class EventFilter(object):
     :param start: Earliest timestamp to include.
     :param end: Only include events with timestamp less than this.
     :param resource: Optional filter for resource id.
-    :param meter: Optional filter for meter type using the meter name.
+    :param meter: Optional filter for meter type using the meter name,
+                  or a list of meter names.
     :param source: Optional source filter.
     :param metaquery: Optional filter on the metadata
     """
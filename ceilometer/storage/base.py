@@ -19,6 +19,7 @@
 """
 
 import abc
+import bisect
 import datetime
 import math
 
@@ -45,6 +46,57 @@ def iter_period(start, end, period):
         period_start = next_start
 
 
+def counter_increment(previous, current):
+    """Return the increase of a cumulative counter between two samples.
+
+    A counter going backwards is assumed to have been reset in between,
+    e.g. the CPU time of a restarted instance, so it increased by its
+    current value.
+    """
+    return current - previous if previous <= current else current
+
+
+def add_deltas(statistics, samples):
+    """Set the delta and rate of statistics of cumulative counters.
+
+    The increase between two consecutive samples of a series is
+    accounted to the statistics of the later one. The rate is the delta
+    per second of the period, or of the duration if there is no period.
+
+    :param statistics: List of models.Statistics, all of them computed
+                       with the same period and grouping.
+    :param samples: Iterable of (series, timestamp, volume, groupby)
+                    tuples ordered by series then timestamp, series
+                    identifying the counter of the sample, e.g. its
+                    meter and resource, and groupby being the values of
+                    the fields the statistics are grouped by, or None.
+    """
+    buckets = {}
+    for s in statistics:
+        s.delta = 0
+        buckets.setdefault(tuple(sorted((s.groupby or {}).items())),
+                           []).append(s)
+    starts = {}
+    for key, bucket in buckets.iteritems():
+        bucket.sort(key=lambda s: s.period_start)
+        starts[key] = [s.period_start for s in bucket]
+
+    previous_series = previous_volume = None
+    for series, timestamp, volume, groupby in samples:
+        if series == previous_series:
+            key = tuple(sorted((groupby or {}).items()))
+            if key in buckets:
+                # Without period there is one statistics per group.
+                i = max(bisect.bisect_right(starts[key], timestamp) - 1, 0)
+                buckets[key][i].delta += counter_increment(previous_volume,
+                                                           volume)
+        previous_series, previous_volume = series, volume
+
+    for s in statistics:
+        elapsed = s.period or s.duration
+        s.rate = s.delta / float(elapsed) if elapsed else None
+
+
 class StorageEngine(object):
     """Base class for storage engines."""
 
@@ -72,6 +124,9 @@ class Connection(object):
     def upgrade(self, version=None):
         """Migrate the database to `version` or the most recent version."""
 
+    def flush(self):
+        """Send the data buffered by the connection, if any."""
+
     @abc.abstractmethod
     def record_metering_data(self, data):
         """Write the data to the backend storage system.
@@ -83,17 +138,23 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def get_users(self, source=None):
-        """Return an iterable of user id strings.
+    def get_users(self, source=None, limit=None, marker=None):
+        """Return an iterable of user id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of users to return.
+        :param marker: Optional user id, only the users after it are
+                       returned.
         """
 
     @abc.abstractmethod
-    def get_projects(self, source=None):
-        """Return an iterable of project id strings.
+    def get_projects(self, source=None, limit=None, marker=None):
+        """Return an iterable of project id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of projects to return.
+        :param marker: Optional project id, only the projects after it are
+                       returned.
         """
 
     @abc.abstractmethod
@@ -131,10 +192,23 @@ class Connection(object):
         """
 
     @abc.abstractmethod
-    def get_meter_statistics(self, event_filter, period=None):
+    def get_meter_statistics(self, event_filter, period=None, groupby=None,
+                             deltas=False):
         """Return an iterable of model.Statistics instances
 
-        The filter must have a meter value set.
+        The filter must have a meter value set, which may be a list of
+        meter names. The statistics of all of them are computed in a
+        single pass over the samples.
+
+        :param event_filter: EventFilter instance
+        :param period: Optional length, in seconds, of the periods the
+                       statistics are computed over.
+        :param groupby: Optional list of fields from
+                        storage.GROUPBY_FIELDS the statistics are computed
+                        per value of.
+        :param deltas: If true, the meters are cumulative counters and the
+                       delta and rate of the statistics are computed too,
+                       see add_deltas().
         """
 
     @abc.abstractmethod
@@ -34,11 +34,13 @@
   improved if co-processors were used, however at the moment the co-processor
   support is not exposed through Thrift API.
 
-  The following four tables are expected to exist in HBase:
+  The following tables are expected to exist in HBase:
     create 'project', {NAME=>'f'}
     create 'user', {NAME=>'f'}
     create 'resource', {NAME=>'f'}
     create 'meter', {NAME=>'f'}
+    create 'meter_resource_idx', {NAME=>'f'}
+    create 'meter_project_idx', {NAME=>'f'}
 
   The driver is using HappyBase which is a wrapper library used to interact
   with HBase via Thrift protocol:
@@ -49,21 +51,57 @@
 from urlparse import urlparse
 import json
 import hashlib
+import contextlib
 import copy
 import datetime
 import happybase
 import os
 import re
+import struct
 from collections import defaultdict
 
+import eventlet
+from eventlet import pools
 from oslo.config import cfg
 
 from ceilometer.openstack.common import log, timeutils
 from ceilometer.storage import base
 from ceilometer.storage import models
+from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
+EPOCH = datetime.datetime(1970, 1, 1)
+
+# Column of the meter rows holding the encoded sample, see
+# _encode_sample(). Rows written before it was introduced hold the sample
+# as JSON in 'f:message' instead.
+SAMPLE_COLUMN = 'f:sample'
+SAMPLE_FORMAT_VERSION = 1
+
+# Columns of the meter rows which are not copied to the index rows, as
+# nothing filters on them.
+INDEX_EXCLUDED_COLUMNS = frozenset([SAMPLE_COLUMN])
+
+# The string fields of an encoded sample, in encoding order
+SAMPLE_STRING_FIELDS = ('source',
+                        'counter_name',
+                        'counter_type',
+                        'counter_unit',
+                        'user_id',
+                        'project_id',
+                        'resource_id',
+                        'message_id',
+                        'message_signature',
+                        )
+
+# Version, timestamp, volume type and value, then the lengths of the string
+# fields, the resource metadata and the JSON volume.
+_SAMPLE_HEADER = struct.Struct('>Bqc8s%di' % (len(SAMPLE_STRING_FIELDS) + 2))
+_SAMPLE_VERSION_BYTE = chr(SAMPLE_FORMAT_VERSION)
+_INT64 = struct.Struct('>q')
+_DOUBLE = struct.Struct('>d')
+
 
 class HBaseStorage(base.StorageEngine):
     """Put the data into a HBase database
@@ -79,7 +117,17 @@ class HBaseStorage(base.StorageEngine):
           source: [ array of source ids reporting for the project ]
           }
     - meter
-      - the raw incoming data
+      - the raw incoming data, keyed by
+        <counter_name>_<reversed timestamp>_<md5(user+resource+project)>
+      - { sample: the sample in a versioned binary encoding
+          the columns filtered on
+        }
+    - meter_resource_idx, meter_project_idx
+      - secondary indexes of the meter table, keyed by
+        <resource or project id>_<reversed timestamp>_<counter_name>_<md5>
+      - { row: key of the indexed row in the meter table
+          the filterable columns of the indexed row
+        }
     - resource
       - the metadata for resources
       - { _id: uuid of resource,
@@ -89,6 +137,9 @@ class HBaseStorage(base.StorageEngine):
           project_id: uuid
           meter: [ array of {counter_name: string, counter_type: string} ]
         }
+
+    Both meter and resource rows also carry the flattened resource metadata
+    as 'f:r_<dotted key>' column qualifiers, used to filter metaqueries.
     """
 
     OPTIONS = [
@@ -96,6 +147,22 @@ class HBaseStorage(base.StorageEngine):
                    default='',
                    help='Database table prefix',
                    ),
+        cfg.IntOpt('hbase_pool_size',
+                   default=10,
+                   help='Maximum number of Thrift connections opened to '
+                   'HBase',
+                   ),
+        cfg.IntOpt('hbase_batch_size',
+                   default=1,
+                   help='Number of samples buffered before their writes '
+                   'are sent to HBase',
+                   ),
+        cfg.IntOpt('hbase_flush_interval',
+                   default=5,
+                   help='Maximum number of seconds the writes of a sample '
+                   'are buffered before being sent to HBase, 0 to only '
+                   'send them once hbase_batch_size samples are buffered',
+                   ),
     ]
 
     def register_opts(self, conf):
@@ -110,6 +177,55 @@ class HBaseStorage(base.StorageEngine):
         return Connection(conf)
 
 
+class ConnectionPool(pools.Pool):
+    """Pool of HBase Thrift connections.
+
+    A happybase connection wraps a single Thrift socket which can't be
+    shared by several green threads, each of them checks a connection out
+    of the pool for the duration of an operation.
+    """
+    def __init__(self, opts, *args, **kwargs):
+        self.opts = opts
+        kwargs.setdefault("order_as_stack", True)
+        super(ConnectionPool, self).__init__(*args, **kwargs)
+
+    def create(self):
+        LOG.debug('Pool creating new HBase connection')
+        conn = Connection._get_connection(self.opts)
+        conn.open()
+        return conn
+
+    @contextlib.contextmanager
+    def item(self):
+        """Check a connection out of the pool for an operation.
+
+        The Thrift transport of a connection may be broken once an
+        operation failed, such a connection is closed rather than given
+        back to the pool.
+        """
+        conn = self.get()
+        try:
+            yield conn
+        except Exception:
+            LOG.debug('Discarding HBase connection after an error')
+            self.current_size -= 1
+            try:
+                conn.close()
+            except Exception:
+                pass
+            if self.waiting():
+                # Replace the connection for the green threads waiting
+                # for one.
+                self.current_size += 1
+                try:
+                    self.put(self.create())
+                except Exception:
+                    self.current_size -= 1
+            raise
+        else:
+            self.put(conn)
+
+
 class Connection(base.Connection):
     """HBase connection.
     """
@@ -121,52 +237,117 @@ class Connection(base.Connection):
         opts = self._parse_connection_url(conf.database_connection)
         opts['table_prefix'] = conf.table_prefix
 
+        # Writes are buffered as {table name: {rowkey: {column: value}}}
+        # until hbase_batch_size samples are pending.
+        self._pending = defaultdict(dict)
+        self._pending_samples = 0
+        self.batch_size = conf.hbase_batch_size
+        # Sends the buffered writes once they are hbase_flush_interval
+        # seconds old.
+        self.flush_interval = conf.hbase_flush_interval
+        self._flush_timer = None
+
         if opts['host'] == '__test__':
             url = os.environ.get('CEILOMETER_TEST_HBASE_URL')
             if url:
                 # Reparse URL, but from the env variable now
                 opts = self._parse_connection_url(url)
+                opts['table_prefix'] = conf.table_prefix
             else:
                 # This is a in-memory usage for unit tests
-                self.conn = MConnection()
-                self.project = self.conn.table(self.PROJECT_TABLE)
-                self.user = self.conn.table(self.USER_TABLE)
-                self.resource = self.conn.table(self.RESOURCE_TABLE)
-                self.meter = self.conn.table(self.METER_TABLE)
+                self.conn_pool = MConnectionPool()
                 return
 
-        self.conn = self._get_connection(opts)
-        self.conn.open()
-        self.project = self.conn.table(self.PROJECT_TABLE)
-        self.user = self.conn.table(self.USER_TABLE)
-        self.resource = self.conn.table(self.RESOURCE_TABLE)
-        self.meter = self.conn.table(self.METER_TABLE)
+        self.conn_pool = ConnectionPool(opts,
+                                        max_size=conf.hbase_pool_size)
 
     PROJECT_TABLE = "project"
     USER_TABLE = "user"
     RESOURCE_TABLE = "resource"
     METER_TABLE = "meter"
+    RESOURCE_INDEX_TABLE = "meter_resource_idx"
+    PROJECT_INDEX_TABLE = "meter_project_idx"
+
+    # Row of the resource index table recording that the meter rows have
+    # been indexed; no resource index scan can reach it.
+    BACKFILL_MARKER_ROW = "\x00backfilled"
+
+    # Number of meter rows fetched per Thrift call when resolving the rows
+    # found in a secondary index.
+    FETCH_CHUNK_SIZE = 1000
+
+    # Maximum number of mutations sent per Thrift call when flushing the
+    # buffered writes.
+    BATCH_MUTATIONS = 1000
 
     def upgrade(self, version=None):
-        self.conn.create_table(self.PROJECT_TABLE, {'f': dict()})
-        self.conn.create_table(self.USER_TABLE, {'f': dict()})
-        self.conn.create_table(self.RESOURCE_TABLE, {'f': dict()})
-        self.conn.create_table(self.METER_TABLE, {'f': dict()})
+        with self.conn_pool.item() as conn:
+            conn.create_table(self.PROJECT_TABLE, {'f': dict()})
+            conn.create_table(self.USER_TABLE, {'f': dict()})
+            conn.create_table(self.RESOURCE_TABLE, {'f': dict()})
+            conn.create_table(self.METER_TABLE, {'f': dict()})
+            conn.create_table(self.RESOURCE_INDEX_TABLE, {'f': dict()})
+            conn.create_table(self.PROJECT_INDEX_TABLE, {'f': dict()})
+            if not conn.table(self.RESOURCE_INDEX_TABLE).row(
+                    self.BACKFILL_MARKER_ROW):
+                self._backfill_indexes(conn)
+
+    def _backfill_indexes(self, conn):
+        """Index the meter rows written before the secondary indexes.
+
+        The resource and project index rows, and the resource columns of
+        the project rows, are rebuilt from the meter table. The writes are
+        idempotent, so the rows already indexed are simply written again.
+        Once done, a marker row is written so that later upgrades don't
+        scan the meter table again.
+        """
+        resource_idx = conn.table(self.RESOURCE_INDEX_TABLE).batch(
+            batch_size=self.BATCH_MUTATIONS)
+        project_idx = conn.table(self.PROJECT_INDEX_TABLE).batch(
+            batch_size=self.BATCH_MUTATIONS)
+        project_table = conn.table(self.PROJECT_TABLE).batch(
+            batch_size=self.BATCH_MUTATIONS)
+        for row, data in conn.table(self.METER_TABLE).scan():
+            counter_name, rts, digest = row.rsplit('_', 2)
+            index_record = dict((k, v) for k, v in data.iteritems()
+                                if k not in INDEX_EXCLUDED_COLUMNS
+                                and k != 'f:message')
+            index_record['f:row'] = row
+            index_suffix = "%s_%s_%s" % (rts, counter_name, digest)
+            resource_id = data['f:resource_id']
+            project_id = data.get('f:project_id')
+            resource_idx.put("%s_%s" % (resource_id, index_suffix),
+                             index_record)
+            if project_id:
+                project_idx.put("%s_%s" % (project_id, index_suffix),
+                                index_record)
+                project_table.put(project_id,
+                                  {'f:res_%s' % resource_id: "1"})
+        for batch in (resource_idx, project_idx, project_table):
+            batch.send()
+        conn.table(self.RESOURCE_INDEX_TABLE).put(
+            self.BACKFILL_MARKER_ROW,
+            {'f:at': timeutils.isotime(timeutils.utcnow())})
 
     def clear(self):
         LOG.debug('Dropping HBase schema...')
-        for table in [self.PROJECT_TABLE,
-                      self.USER_TABLE,
-                      self.RESOURCE_TABLE,
-                      self.METER_TABLE]:
-            try:
-                self.conn.disable_table(table)
-            except:
-                LOG.debug('Cannot disable table but ignoring error')
-            try:
-                self.conn.delete_table(table)
-            except:
-                LOG.debug('Cannot delete table but ignoring error')
+        self._pending = defaultdict(dict)
+        self._pending_samples = 0
+        with self.conn_pool.item() as conn:
+            for table in [self.PROJECT_TABLE,
+                          self.USER_TABLE,
+                          self.RESOURCE_TABLE,
+                          self.METER_TABLE,
+                          self.RESOURCE_INDEX_TABLE,
+                          self.PROJECT_INDEX_TABLE]:
+                try:
+                    conn.disable_table(table)
+                except:
+                    LOG.debug('Cannot disable table but ignoring error')
+                try:
+                    conn.delete_table(table)
+                except:
+                    LOG.debug('Cannot delete table but ignoring error')
 
     @staticmethod
     def _get_connection(conf):
@@ -201,32 +382,91 @@ class Connection(base.Connection):
         opts['port'] = port and int(port) or 9090
         return opts
 
+    def _put(self, table, row, data):
+        """Buffer the columns to write to a row.
+
+        Columns written to the same row before a flush are merged, so that
+        the user, project and resource rows shared by the samples are only
+        sent once per batch.
+        """
+        self._pending[table].setdefault(row, {}).update(data)
+
+    def _schedule_flush(self):
+        if self._flush_timer is None and self.flush_interval > 0:
+            self._flush_timer = eventlet.spawn_after(self.flush_interval,
+                                                     self._timed_flush)
+
+    def _timed_flush(self):
+        self._flush_timer = None
+        try:
+            self._flush()
+        except Exception as err:
+            LOG.warning('Unable to send the buffered writes to HBase: %s',
+                        err)
+            LOG.exception(err)
+
+    def _flush(self):
+        """Send the buffered writes, one batch per table.
+
+        If they can't be sent, the writes are buffered again.
+        """
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        # Swap the buffer before anything can yield to another green
+        # thread, the writes buffered meanwhile go to the next batch.
+        pending, self._pending = self._pending, defaultdict(dict)
+        samples, self._pending_samples = self._pending_samples, 0
+        if not pending:
+            return
+        try:
+            with self.conn_pool.item() as conn:
+                for table, rows in pending.iteritems():
+                    batch = conn.table(table).batch(
+                        batch_size=self.BATCH_MUTATIONS)
+                    for row, data in rows.iteritems():
+                        batch.put(row, data)
+                    batch.send()
+        except Exception:
+            # The writes buffered meanwhile are newer. The writes are
+            # idempotent, those which have been sent can be sent again.
+            for table, rows in pending.iteritems():
+                for row, data in rows.iteritems():
+                    data.update(self._pending[table].get(row, {}))
+                    self._pending[table][row] = data
+            self._pending_samples += samples
+            self._schedule_flush()
+            raise
+
+    def flush(self):
+        """Send the buffered writes.
+        """
+        self._flush()
+
     def record_metering_data(self, data):
         """Write the data to the backend storage system.
 
+        The user, project and resource rows are updated by blind writes of
+        idempotent columns rather than read first, the writes are sent
+        once hbase_batch_size samples are buffered, or once the oldest is
+        hbase_flush_interval seconds old.
+
         :param data: a dictionary such as returned by
                      ceilometer.meter.meter_message_from_counter
         """
         # Make sure we know about the user and project
         if data['user_id']:
-            user = self.user.row(data['user_id'])
-            sources = _load_hbase_list(user, 's')
-            # Update if source is new
-            if data['source'] not in sources:
-                user['f:s_%s' % data['source']] = "1"
-                self.user.put(data['user_id'], user)
-
-        project = self.project.row(data['project_id'])
-        sources = _load_hbase_list(project, 's')
-        # Update if source is new
-        if data['source'] not in sources:
-            project['f:s_%s' % data['source']] = "1"
-            self.project.put(data['project_id'], project)
-
-        # Record the updated resource metadata.
-        received_timestamp = timeutils.utcnow()
-
-        resource = self.resource.row(data['resource_id'])
+            self._put(self.USER_TABLE, data['user_id'],
+                      {'f:s_%s' % data['source']: "1"})
+
+        # The project row also lists the resources of the project for
+        # get_meters()
+        self._put(self.PROJECT_TABLE, data['project_id'],
+                  {'f:s_%s' % data['source']: "1",
+                   'f:res_%s' % data['resource_id']: "1"})
+
+        # Record the updated resource metadata, the meter column is added
+        # to the ones of the previous samples.
         new_meter = "%s!%s!%s" % (
             data['counter_name'], data['counter_type'], data['counter_unit'])
         new_resource = {'f:resource_id': data['resource_id'],
@@ -236,13 +476,11 @@ class Connection(base.Connection):
                         'f:source': data["source"],
                         'f:m_%s' % new_meter: "1",
                         }
-        # Update if resource has new information
-        if new_resource != resource:
-            meters = _load_hbase_list(resource, 'm')
-            if new_meter not in meters:
-                new_resource['f:m_%s' % new_meter] = "1"
-
-            self.resource.put(data['resource_id'], new_resource)
+        # Keep the flattened metadata as column qualifiers so that
+        # metaqueries can be filtered on the server side.
+        metadata_columns = _metadata_columns(data['resource_metadata'])
+        new_resource.update(metadata_columns)
+        self._put(self.RESOURCE_TABLE, data['resource_id'], new_resource)
 
         # Rowkey consists of reversed timestamp, meter and an md5 of
         # user+resource+project for purposes of uniqueness
@@ -255,14 +493,7 @@ class Connection(base.Connection):
         rts = reverse_timestamp(data['timestamp'])
         row = "%s_%d_%s" % (data['counter_name'], rts, m.hexdigest())
 
-        # Convert timestamp to string as json.dumps won't
-        ts = timeutils.strtime(data['timestamp'])
-
-        record = {'f:timestamp': ts,
-                  'f:counter_name': data['counter_name'],
-                  'f:counter_type': data['counter_type'],
-                  'f:counter_volume': str(data['counter_volume']),
-                  'f:counter_unit': data['counter_unit'],
+        record = {'f:counter_name': data['counter_name'],
                   # TODO(shengjie) consider using QualifierFilter
                   # keep dimensions as column qualifier for quicker look up
                   # TODO(shengjie) extra dimensions need to be added as CQ
@@ -271,40 +502,162 @@ class Connection(base.Connection):
                   'f:resource_id': data['resource_id'],
                   'f:source': data['source'],
                   # add in reversed_ts here for time range scan
-                  'f:rts': str(rts)
+                  'f:rts': str(rts),
+                  # the sample itself, only the columns above are
+                  # filtered on
+                  SAMPLE_COLUMN: _encode_sample(data),
                   }
-        # Don't want to be changing the original data object
-        data = copy.copy(data)
-        data['timestamp'] = ts
-        # Save original event
-        record['f:message'] = json.dumps(data)
-        self.meter.put(row, record)
-
-    def get_users(self, source=None):
-        """Return an iterable of user id strings.
-
-        :param source: Optional source filter.
+        record.update(metadata_columns)
+
+        # The index rows carry the filterable columns of the sample, so
+        # that the filters can be applied on the index itself, and the key
+        # of the meter row to fetch.
+        index_record = dict((k, v) for k, v in record.iteritems()
+                            if k not in INDEX_EXCLUDED_COLUMNS)
+        index_record['f:row'] = row
+        index_suffix = "%d_%s_%s" % (rts, data['counter_name'],
+                                     m.hexdigest())
+
+        self._put(self.METER_TABLE, row, record)
+        self._put(self.RESOURCE_INDEX_TABLE,
+                  "%s_%s" % (data['resource_id'], index_suffix),
+                  index_record)
+        if data['project_id']:
+            self._put(self.PROJECT_INDEX_TABLE,
+                      "%s_%s" % (data['project_id'], index_suffix),
+                      index_record)
+
+        self._pending_samples += 1
+        if self._pending_samples >= self.batch_size:
+            self._flush()
+        else:
+            self._schedule_flush()
+
+    def _scan_meter(self, conn, user=None, project=None, meter=None,
+                    resource=None, source=None, start=None, end=None,
+                    metaquery={}, require_meter=True, fetch_samples=True):
+        """Return the (rowkey, data) of the meter rows matching the
+        parameters, scanning the narrowest table available.
+
+        A single resource is covered by the resource index, then a project
+        by the project index; otherwise the meter table is scanned, by
+        rowkey range if a meter is given.
+
+        :param conn: The pooled connection to read through.
+        :param fetch_samples: If false, rows found in an index are returned
+                              as is rather than the meter rows they
+                              point to. Only the filterable columns are
+                              available then.
+        """
+        if resource:
+            table, key = conn.table(self.RESOURCE_INDEX_TABLE), resource
+        elif project:
+            table, key = conn.table(self.PROJECT_INDEX_TABLE), project
+        else:
+            q, start_row, stop_row = make_query(user, project, meter,
+                                                resource, source, start,
+                                                end, require_meter,
+                                                metaquery=metaquery)
+            LOG.debug("q: %s" % q)
+            return conn.table(self.METER_TABLE).scan(filter=q,
+                                                     row_start=start_row,
+                                                     row_stop=stop_row)
+
+        if require_meter and not meter:
+            raise RuntimeError('Missing required meter specifier')
+        q, start_row, stop_row = make_index_query(key, user, project, meter,
+                                                  resource, source, start,
+                                                  end, metaquery)
+        LOG.debug("q: %s" % q)
+        index_rows = table.scan(filter=q, row_start=start_row,
+                                row_stop=stop_row)
+        if not fetch_samples:
+            return index_rows
+        return self._fetch_meter_rows(conn.table(self.METER_TABLE),
+                                      (data['f:row']
+                                       for ignored, data in index_rows))
+
+    def _scan_meter_from_filter(self, conn, event_filter,
+                                require_meter=True):
+        """Return the (rowkey, data) of the meter rows matching the filter.
+
+        :param conn: The pooled connection to read through.
+        :param event_filter: EventFilter instance
+        :param require_meter: If true and the filter does not have a meter,
+                              raise an error.
+        """
+        return self._scan_meter(conn,
+                                user=event_filter.user,
+                                project=event_filter.project,
+                                meter=event_filter.meter,
+                                resource=event_filter.resource,
+                                source=event_filter.source,
+                                start=event_filter.start,
+                                end=event_filter.end,
+                                metaquery=event_filter.metaquery,
+                                require_meter=require_meter)
+
+    def _fetch_meter_rows(self, table, rowkeys):
+        """Fetch the given meter rows, by chunks of FETCH_CHUNK_SIZE rows.
+        """
+        chunk = []
+        for rowkey in rowkeys:
+            chunk.append(rowkey)
+            if len(chunk) >= self.FETCH_CHUNK_SIZE:
+                for row in table.rows(chunk):
+                    yield row
+                chunk = []
+        if chunk:
+            for row in table.rows(chunk):
+                yield row
+
+    def _scan_keys(self, table, source=None, limit=None, marker=None):
+        """Return the keys of the rows of a table, which HBase returns
+        sorted. Only the keys are transferred.
+
+        :param table: Name of the table to scan.
+        :param source: Optional source, only the rows having its column
+                       are returned.
+        :param limit: Optional maximum number of keys to return.
+        :param marker: Optional key, only the keys after it are returned.
         """
         LOG.debug("source: %s" % source)
-        scan_args = {}
+        scan_args = {'filter': 'FirstKeyOnlyFilter() AND KeyOnlyFilter()',
+                     'limit': limit,
+                     }
         if source:
             scan_args['columns'] = ['f:s_%s' % source]
-        return sorted(key for key, ignored in self.user.scan(**scan_args))
+        if marker is not None:
+            # The smallest key after the marker
+            scan_args['row_start'] = marker + '\x00'
+        self._flush()
+        with self.conn_pool.item() as conn:
+            for key, ignored in conn.table(table).scan(**scan_args):
+                yield key
 
-    def get_projects(self, source=None):
-        """Return an iterable of project id strings.
+    def get_users(self, source=None, limit=None, marker=None):
+        """Return an iterable of user id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of users to return.
+        :param marker: Optional user id, only the users after it are
+                       returned.
         """
-        LOG.debug("source: %s" % source)
-        scan_args = {}
-        if source:
-            scan_args['columns'] = ['f:s_%s' % source]
-        return (key for key, ignored in self.project.scan(**scan_args))
+        return self._scan_keys(self.USER_TABLE, source, limit, marker)
+
+    def get_projects(self, source=None, limit=None, marker=None):
+        """Return an iterable of project id strings, sorted.
+
+        :param source: Optional source filter.
+        :param limit: Optional maximum number of projects to return.
+        :param marker: Optional project id, only the projects after it are
+                       returned.
+        """
+        return self._scan_keys(self.PROJECT_TABLE, source, limit, marker)
 
     def get_resources(self, user=None, project=None, source=None,
                       start_timestamp=None, end_timestamp=None,
-                      metaquery={}):
+                      metaquery={}, resource=None):
         """Return an iterable of models.Resource instances
 
         :param user: Optional ID for user that owns the resource.
@@ -312,39 +665,42 @@ class Connection(base.Connection):
         :param source: Optional source filter.
         :param start_timestamp: Optional modified timestamp start range.
         :param end_timestamp: Optional modified timestamp end range.
+        :param metaquery: Optional dict with metadata to match on.
+        :param resource: Optional resource filter.
         """
-        q, start_row, end_row = make_query(user=user,
-                                           project=project,
-                                           source=source,
-                                           start=start_timestamp,
-                                           end=end_timestamp,
-                                           require_meter=False)
-        LOG.debug("q: %s" % q)
-        # TODO implement metaquery support
-        if len(metaquery) > 0:
-            raise NotImplementedError('metaquery not implemented')
-
-        resource_ids = {}
-        g = self.meter.scan(filter=q, row_start=start_row,
-                            row_stop=end_row)
-        for ignored, data in g:
-            resource_ids[data['f:resource_id']] = data['f:resource_id']
-
-        q = make_query(user=user, project=project, source=source,
-                       query_only=True, require_meter=False)
-        LOG.debug("q: %s" % q)
-        for resource_id, data in self.resource.rows(resource_ids):
-            yield models.Resource(
-                resource_id=resource_id,
-                project_id=data['f:project_id'],
-                user_id=data['f:user_id'],
-                metadata=json.loads(data['f:metadata']),
-                meter=[
-                    models.ResourceMeter(*(m[4:].split("!")))
-                    for m in data
-                    if m.startswith('f:m_')
-                ],
-            )
+        self._flush()
+        with self.conn_pool.item() as conn:
+            resource_table = conn.table(self.RESOURCE_TABLE)
+            if (user or project or source or start_timestamp or end_timestamp
+                    or metaquery or resource):
+                # The samples tell which resources match, the index rows
+                # are enough for that.
+                resource_ids = set(
+                    data['f:resource_id']
+                    for ignored, data in self._scan_meter(
+                        conn, user=user, project=project,
+                        resource=resource, source=source,
+                        start=start_timestamp, end=end_timestamp,
+                        metaquery=metaquery, require_meter=False,
+                        fetch_samples=False))
+                rows = resource_table.rows(sorted(resource_ids))
+            else:
+                # Every known resource matches, no need to look at the
+                # samples
+                rows = resource_table.scan()
+
+            for resource_id, data in rows:
+                yield models.Resource(
+                    resource_id=resource_id,
+                    project_id=data['f:project_id'],
+                    user_id=data['f:user_id'],
+                    metadata=json.loads(data['f:metadata']),
+                    meter=[
+                        models.ResourceMeter(*(m[4:].split("!")))
+                        for m in data
+                        if m.startswith('f:m_')
+                    ],
+                )
 
     def get_meters(self, user=None, project=None, resource=None, source=None,
                    metaquery={}):
@@ -356,61 +712,75 @@ class Connection(base.Connection):
         :param source: Optional source filter.
         :param metaquery: Optional dict with metadata to match on.
         """
-        q, ignored, ignored = make_query(user=user, project=project,
-                                         resource=resource, source=source,
-                                         require_meter=False)
-        LOG.debug("q: %s" % q)
-        # TODO implement metaquery support
-        if len(metaquery) > 0:
-            raise NotImplementedError('metaquery not implemented')
-
-        gen = self.resource.scan(filter=q)
-
-        for ignored, data in gen:
-            # Meter columns are stored like this:
-            # "m_{counter_name}|{counter_type}|{counter_unit}" => "1"
-            # where 'm' is a prefix (m for meter), value is always set to 1
-            meter = None
-            for m in data:
-                if m.startswith('f:m_'):
-                    meter = m
-                    break
-            if meter is None:
-                continue
-            name, type, unit = meter[4:].split("!")
-            yield models.Meter(
-                name=name,
-                type=type,
-                unit=unit,
-                resource_id=data['f:resource_id'],
-                project_id=data['f:project_id'],
-                user_id=data['f:user_id'],
-            )
+        conditions = _column_conditions(user=user, project=project,
+                                        resource=resource, source=source,
+                                        metaquery=metaquery)
+        self._flush()
+        with self.conn_pool.item() as conn:
+            resource_table = conn.table(self.RESOURCE_TABLE)
+            if resource:
+                # The resource table is keyed by resource id
+                q = _make_filter(conditions)
+                LOG.debug("q: %s" % q)
+                gen = resource_table.scan(filter=q, row_start=resource,
+                                          row_stop=resource + "\x00")
+            elif project:
+                # The project row lists the resources of the project, only
+                # those are read and filtered here
+                resource_ids = _load_hbase_list(
+                    conn.table(self.PROJECT_TABLE).row(project), 'res')
+                gen = ((key, data)
+                       for key, data
+                       in resource_table.rows(sorted(resource_ids))
+                       if _match_conditions(data, conditions))
+            else:
+                q = _make_filter(conditions)
+                LOG.debug("q: %s" % q)
+                gen = resource_table.scan(filter=q)
+
+            for ignored, data in gen:
+                # Meter columns are stored like this:
+                # "m_{counter_name}|{counter_type}|{counter_unit}" => "1"
+                # where 'm' is a prefix (m for meter), value is always set
+                # to 1
+                meter = None
+                for m in data:
+                    if m.startswith('f:m_'):
+                        meter = m
+                        break
+                if meter is None:
+                    continue
+                name, type, unit = meter[4:].split("!")
+                yield models.Meter(
+                    name=name,
+                    type=type,
+                    unit=unit,
+                    resource_id=data['f:resource_id'],
+                    project_id=data['f:project_id'],
+                    user_id=data['f:user_id'],
+                )
 
     def get_samples(self, event_filter):
         """Return an iterable of models.Sample instances
         """
-        q, start, stop = make_query_from_filter(event_filter,
-                                                require_meter=False)
-        LOG.debug("q: %s" % q)
-
-        gen = self.meter.scan(filter=q, row_start=start, row_stop=stop)
-        for ignored, meter in gen:
-            meter = json.loads(meter['f:message'])
-            meter['timestamp'] = timeutils.parse_strtime(meter['timestamp'])
-            yield models.Sample(**meter)
+        self._flush()
+        with self.conn_pool.item() as conn:
+            gen = self._scan_meter_from_filter(conn, event_filter,
+                                               require_meter=False)
+            for ignored, meter in gen:
+                yield models.Sample(**_decode_sample(meter))
 
     def _update_meter_stats(self, stat, meter):
         """Do the stats calculation on a requested time bucket in stats dict
 
         :param stats: dict where aggregated stats are kept
         :param index: time bucket index in stats
-        :param meter: meter record as returned from HBase
+        :param meter: meter record as returned by _decode_sample()
         :param start_time: query start time
         :param period: length of the time bucket
         """
-        vol = int(meter['f:counter_volume'])
-        ts = timeutils.parse_strtime(meter['f:timestamp'])
+        vol = meter['counter_volume']
+        ts = meter['timestamp']
         stat.min = min(vol, stat.min or vol)
         stat.max = max(vol, stat.max)
         stat.sum = vol + (stat.sum or 0)
@@ -422,7 +792,8 @@ class Connection(base.Connection):
             timeutils.delta_seconds(stat.duration_start,
                                     stat.duration_end)
 
-    def get_meter_statistics(self, event_filter, period=None):
+    def get_meter_statistics(self, event_filter, period=None, groupby=None,
+                             deltas=False):
         """Return an iterable of models.Statistics instances containing meter
         statistics described by the query parameters.
 
@@ -432,67 +803,77 @@ class Connection(base.Connection):
 
            Due to HBase limitations the aggregations are implemented
            in the driver itself, therefore this method will be quite slow
-           because of all the Thrift traffic it is going to create.
+           because of all the Thrift traffic it is going to create. All
+           the meters and groups are computed from a single scan though.
 
         """
-        q, start, stop = make_query_from_filter(event_filter)
+        self._flush()
+        with self.conn_pool.item() as conn:
+            meters = list(_decode_sample(meter) for (ignored, meter) in
+                          self._scan_meter_from_filter(conn, event_filter))
 
-        meters = list(meter for (ignored, meter) in
-                      self.meter.scan(filter=q,
-                                      row_start=start,
-                                      row_stop=stop)
-                      )
+        # Rows are stored newest-first for each meter, but several meters
+        # may be scanned at once.
+        meters.sort(key=lambda m: m['timestamp'])
 
         if event_filter.start:
             start_time = event_filter.start
         elif meters:
-            start_time = timeutils.parse_strtime(meters[-1]['f:timestamp'])
+            start_time = meters[0]['timestamp']
         else:
             start_time = None
 
         if event_filter.end:
             end_time = event_filter.end
         elif meters:
-            end_time = timeutils.parse_strtime(meters[0]['f:timestamp'])
+            end_time = meters[-1]['timestamp']
         else:
             end_time = None
 
-        results = []
+        results = {}
 
         if not period:
             period = 0
             period_start = start_time
             period_end = end_time
 
-        # As our HBase meters are stored as newest-first, we need to iterate
-        # in the reverse order
-        for meter in meters[::-1]:
-            ts = timeutils.parse_strtime(meter['f:timestamp'])
+        for meter in meters:
+            ts = meter['timestamp']
             if period:
                 offset = int(timeutils.delta_seconds(
                     start_time, ts) / period) * period
                 period_start = start_time + datetime.timedelta(0, offset)
-
-            if not len(results) or not results[-1].period_start == \
-                    period_start:
-                if period:
-                    period_end = period_start + datetime.timedelta(
-                        0, period)
-                results.append(
-                    models.Statistics(count=0,
-                                      min=0,
-                                      max=0,
-                                      avg=0,
-                                      sum=0,
-                                      period=period,
-                                      period_start=period_start,
-                                      period_end=period_end,
-                                      duration=None,
-                                      duration_start=None,
-                                      duration_end=None)
-                )
-            self._update_meter_stats(results[-1], meter)
-        return results
+                period_end = period_start + datetime.timedelta(0, period)
+            group = (dict((g, meter[g]) for g in groupby)
+                     if groupby else None)
+            key = (period_start, tuple(sorted((group or {}).items())))
+            if key not in results:
+                results[key] = models.Statistics(count=0,
+                                                 min=0,
+                                                 max=0,
+                                                 avg=0,
+                                                 sum=0,
+                                                 period=period,
+                                                 period_start=period_start,
+                                                 period_end=period_end,
+                                                 duration=None,
+                                                 duration_start=None,
+                                                 duration_end=None,
+                                                 groupby=group)
+            self._update_meter_stats(results[key], meter)
+        statistics = [results[key] for key in sorted(results)]
+
+        if deltas:
+            meters.sort(key=lambda m: (m['counter_name'], m['resource_id'],
+                                       m['timestamp']))
+            base.add_deltas(statistics,
+                            (((m['counter_name'], m['resource_id']),
+                              m['timestamp'],
+                              m['counter_volume'],
+                              dict((g, m[g]) for g in groupby)
+                              if groupby else None)
+                             for m in meters))
+        return statistics
 
 
 ###############
@@ -502,6 +883,10 @@ class Connection(base.Connection):
 class MTable(object):
     """HappyBase.Table mock
     """
+    # A filter, with its quoted or bare arguments.
+    FILTER_RE = re.compile(r"(\w+)\s*\(((?:'(?:[^']|'')*'|[^'()])*)\)")
+    ARG_RE = re.compile(r"'((?:[^']|'')*)'|([^,\s]+)")
+
     def __init__(self, name, families):
         self.name = name
         self.families = families
@@ -514,9 +899,14 @@ class MTable(object):
         return ((k, self.row(k)) for k in keys)
 
     def put(self, key, data):
-        self._rows[key] = data
+        # Like HBase, only the given columns are overwritten
+        self._rows.setdefault(key, {}).update(data)
 
-    def scan(self, filter=None, columns=[], row_start=None, row_stop=None):
+    def batch(self, batch_size=None):
+        return MBatch(self)
+
+    def scan(self, filter=None, columns=[], row_start=None, row_stop=None,
+             limit=None):
         sorted_keys = sorted(self._rows)
         # copy data between row_start and row_stop into a dict
         rows = {}
@@ -537,13 +927,12 @@ class MTable(object):
         elif filter:
             # TODO: we should really parse this properly, but at the moment we
             # are only going to support AND here
-            filters = filter.split('AND')
-            for f in filters:
-                # Extract filter name and its arguments
-                g = re.search("(.*)\((.*),?\)", f)
-                fname = g.group(1).strip()
-                fargs = [s.strip().replace('\'', '').replace('\"', '')
-                         for s in g.group(2).split(',')]
+            for g in self.FILTER_RE.finditer(filter):
+                # Extract filter name and its arguments, the quotes doubled
+                # inside the quoted arguments are unescaped.
+                fname = g.group(1)
+                fargs = [bare or quoted.replace("''", "'")
+                         for quoted, bare in self.ARG_RE.findall(g.group(2))]
                 m = getattr(self, fname)
                 if callable(m):
                     # overwrite rows for filtering to take effect
@@ -552,9 +941,25 @@ class MTable(object):
                 else:
                     raise NotImplementedError("%s filter is not implemented, "
                                               "you may want to add it!")
-        for k in sorted(rows):
+        for k in sorted(rows)[:limit]:
             yield k, rows[k]
 
+    @staticmethod
+    def FirstKeyOnlyFilter(args, rows):
+        """This method is called from scan() when 'FirstKeyOnlyFilter' is
+        found in the 'filter' argument
+        """
+        return dict((row, dict(sorted(data.items())[:1]))
+                    for row, data in rows.iteritems())
+
+    @staticmethod
+    def KeyOnlyFilter(args, rows):
+        """This method is called from scan() when 'KeyOnlyFilter' is found
+        in the 'filter' argument
+        """
+        return dict((row, dict((key, '') for key in data))
+                    for row, data in rows.iteritems())
+
     def SingleColumnValueFilter(self, args, rows):
         """This method is called from scan() when 'SingleColumnValueFilter'
         is found in the 'filter' argument
@@ -564,11 +969,17 @@ class MTable(object):
         value = args[3]
         if value.startswith('binary:'):
             value = value[7:]
+        regex = None
+        if value.startswith('regexstring:'):
+            regex = re.compile(value[12:])
         r = {}
         for row in rows:
             data = rows[row]
 
-            if op == '=':
+            if op == '=' and regex:
+                if column in data and regex.search(data[column]):
+                    r[row] = data
+            elif op == '=':
                 if column in data and data[column] == value:
                     r[row] = data
             elif op == '<=':
@@ -585,6 +996,29 @@ class MTable(object):
         return r
 
 
+class MBatch(object):
+    """HappyBase.Batch mock
+    """
+    def __init__(self, table):
+        self.table = table
+        self._mutations = {}
+
+    def put(self, key, data):
+        self._mutations.setdefault(key, {}).update(data)
+
+    def send(self):
+        for key, data in self._mutations.iteritems():
+            self.table.put(key, data)
+        self._mutations = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+
 class MConnection(object):
     """HappyBase.Connection mock
     """
@@ -595,6 +1029,10 @@ class MConnection(object):
         LOG.debug("Opening in-memory HBase connection")
         return
 
+    def close(self):
+        LOG.debug("Closing in-memory HBase connection")
+        return
+
     def create_table(self, n, families={}):
         if n in self.tables:
             return self.tables[n]
@@ -603,12 +1041,24 @@ class MConnection(object):
         return t
 
     def delete_table(self, name, use_prefix=True):
-        self.tables.remove(self.tables[name])
+        del self.tables[name]
 
     def table(self, name):
         return self.create_table(name)
 
 
+class MConnectionPool(object):
+    """ConnectionPool mock, all the green threads share the same in-memory
+    connection.
+    """
+    def __init__(self):
+        self.conn = MConnection()
+
+    @contextlib.contextmanager
+    def item(self):
+        yield self.conn
+
+
 #################################################
 # Here be various HBase helpers
 def reverse_timestamp(dt):
@@ -620,20 +1070,108 @@ def reverse_timestamp(dt):
     rowkeys in HBase are ordered lexicographically, the timestamps must be
     reversed.
     """
-    epoch = datetime.datetime(1970, 1, 1)
-    td = dt - epoch
+    td = dt - EPOCH
     ts = (td.microseconds +
           (td.seconds + td.days * 24 * 3600) * 100000) / 100000
     return 0x7fffffffffffffff - ts
 
 
+def _encode_sample(data):
+    """Return the compact binary encoding of a sample.
+
+    The encoding starts with a fixed size header: the format version, the
+    timestamp as microseconds since the epoch, the volume type ('i' for
+    integers, 'd' for floats, 'j' for anything else) and value, then the
+    lengths in characters of the variable fields (-1 for None). The
+    variable fields follow as a single UTF-8 string: the string fields, the
+    JSON resource metadata and, for 'j' volumes only, the JSON volume.
+
+    :param data: a dictionary such as returned by
+                 ceilometer.meter.meter_message_from_counter
+    """
+    td = data['timestamp'] - EPOCH
+    ts = (td.days * 86400 + td.seconds) * 1000000 + td.microseconds
+    fields = [data[name] for name in SAMPLE_STRING_FIELDS]
+    fields.append(json.dumps(data['resource_metadata']))
+    volume = data['counter_volume']
+    if (isinstance(volume, (int, long)) and not isinstance(volume, bool)
+            and -2 ** 63 <= volume < 2 ** 63):
+        volume_type, volume = 'i', _INT64.pack(volume)
+        fields.append(None)
+    elif isinstance(volume, float):
+        volume_type, volume = 'd', _DOUBLE.pack(volume)
+        fields.append(None)
+    else:
+        fields.append(json.dumps(volume))
+        volume_type, volume = 'j', ''
+
+    values = []
+    lengths = []
+    for value in fields:
+        if value is None:
+            lengths.append(-1)
+        else:
+            if isinstance(value, str):
+                value = value.decode('utf-8')
+            else:
+                value = unicode(value)
+            lengths.append(len(value))
+            values.append(value)
+    return (_SAMPLE_HEADER.pack(SAMPLE_FORMAT_VERSION, ts, volume_type,
+                                volume, *lengths)
+            + u''.join(values).encode('utf-8'))
+
+
+def _decode_sample(row):
+    """Return the sample stored in a meter row, as a dictionary of the
+    models.Sample attributes.
+
+    Rows written before the binary encoding hold the sample as JSON in the
+    'f:message' column, these are still decoded.
+
+    :param row: The columns of the meter row.
+    """
+    value = row.get(SAMPLE_COLUMN)
+    if value is None:
+        sample = json.loads(row['f:message'])
+        sample['timestamp'] = timeutils.parse_strtime(sample['timestamp'])
+        return sample
+
+    if value[0] != _SAMPLE_VERSION_BYTE:
+        raise ValueError('Unknown sample format version %d' % ord(value[0]))
+    header = _SAMPLE_HEADER.unpack_from(value)
+    # The variable fields are decoded at once, their lengths are in
+    # characters
+    text = value[_SAMPLE_HEADER.size:].decode('utf-8')
+    offset = 0
+    fields = []
+    for length in header[4:]:
+        if length < 0:
+            fields.append(None)
+        else:
+            fields.append(text[offset:offset + length])
+            offset += length
+
+    sample = dict(zip(SAMPLE_STRING_FIELDS, fields))
+    sample['resource_metadata'] = json.loads(fields[-2])
+    volume_type = header[2]
+    if volume_type == 'i':
+        sample['counter_volume'], = _INT64.unpack(header[3])
+    elif volume_type == 'd':
+        sample['counter_volume'], = _DOUBLE.unpack(header[3])
+    else:
+        sample['counter_volume'] = json.loads(fields[-1])
+    sample['timestamp'] = EPOCH + datetime.timedelta(microseconds=header[1])
+    return sample
+
+
 def make_query(user=None, project=None, meter=None,
                resource=None, source=None, start=None, end=None,
-               require_meter=True, query_only=False):
+               require_meter=True, query_only=False, metaquery={}):
     """Return a filter query based on the selected parameters.
     :param user: Optional user-id
     :param project: Optional project-id
-    :param meter: Optional counter-name
+    :param meter: Optional counter-name, or list of counter-names
     :param resource: Optional resource-id
     :param source: Optional source-id
     :param start: Optional start timestamp
@@ -642,21 +1180,11 @@ def make_query(user=None, project=None, meter=None,
             raise an error.
     :param query_only: If true only returns the filter query,
             otherwise also returns start and stop rowkeys
+    :param metaquery: Optional dict with metadata to match on.
     """
-    q = []
-
-    if user:
-        q.append("SingleColumnValueFilter ('f', 'user_id', =, 'binary:%s')"
-                 % user)
-    if project:
-        q.append("SingleColumnValueFilter ('f', 'project_id', =, 'binary:%s')"
-                 % project)
-    if resource:
-        q.append("SingleColumnValueFilter ('f', 'resource_id', =, 'binary:%s')"
-                 % resource)
-    if source:
-        q.append("SingleColumnValueFilter "
-                 "('f', 'source', =, 'binary:%s')" % source)
+    q = [_column_filter(column, value)
+         for column, value in _column_conditions(user, project, resource,
+                                                 source, metaquery)]
     # when start_time and end_time is provided,
     #    if it's filtered by meter,
     #         rowkey will be used in the query;
@@ -667,7 +1195,20 @@ def make_query(user=None, project=None, meter=None,
     rts_start = str(reverse_timestamp(start) + 1) if start else ""
     rts_end = str(reverse_timestamp(end) + 1) if end else ""
 
-    if meter:
+    if isinstance(meter, list):
+        # several meters are scanned at once, from the rows of the first
+        # one to the rows of the last one; the rows of the other meters
+        # in between and out of the time range are filtered out.
+        q.append(_meters_filter(meter))
+        if rts_start:
+            q.append("SingleColumnValueFilter ('f', 'rts', <=, 'binary:%s')" %
+                     rts_start)
+        if rts_end:
+            q.append("SingleColumnValueFilter ('f', 'rts', >=, 'binary:%s')" %
+                     rts_end)
+        stopRow = "%s_%s" % (max(meter), chr(127))
+        startRow = "%s_" % min(meter)
+    elif meter:
         # if it's meter filter without start and end,
         # startRow = meter while stopRow = meter + MAX_BYTE
         if not rts_start:
@@ -693,6 +1234,44 @@ def make_query(user=None, project=None, meter=None,
         return query_filter, startRow, stopRow
 
 
+def make_index_query(key, user=None, project=None, meter=None,
+                     resource=None, source=None, start=None, end=None,
+                     metaquery={}):
+    """Return a filter query and the start and stop rowkeys to scan one of
+    the secondary index tables of the meter table.
+
+    Index rowkeys are <key>_<reversed timestamp>_<counter_name>_<md5>, the
+    key being the resource or project id the index is about. The key column
+    is still filtered on, so that a key being a prefix of another one
+    doesn't match the rows of the latter.
+
+    :param key: The resource or project id to scan the index for
+    :param user: Optional user-id
+    :param project: Optional project-id
+    :param meter: Optional counter-name, or list of counter-names
+    :param resource: Optional resource-id
+    :param source: Optional source-id
+    :param start: Optional start timestamp
+    :param end: Optional end timestamp
+    :param metaquery: Optional dict with metadata to match on.
+    """
+    conditions = _column_conditions(user, project, resource, source,
+                                    metaquery)
+    if isinstance(meter, list):
+        q = _make_filter(conditions)
+        q = " AND ".join(f for f in (q, _meters_filter(meter)) if f)
+    else:
+        if meter:
+            conditions.append(('counter_name', meter))
+        q = _make_filter(conditions)
+
+    rts_start = str(reverse_timestamp(start) + 1) if start else chr(127)
+    rts_end = str(reverse_timestamp(end) + 1) if end else ""
+    return (q,
+            "%s_%s" % (key, rts_end),
+            "%s_%s" % (key, rts_start))
+
+
 def make_query_from_filter(event_filter, require_meter=True):
     """Return a query dictionary based on the settings in the filter.
 
@@ -700,13 +1279,70 @@ def make_query_from_filter(event_filter, require_meter=True):
     :param require_meter: If true and the filter does not have a meter,
                           raise an error.
     """
-    if event_filter.metaquery is not None and len(event_filter.metaquery) > 0:
-        raise NotImplementedError('metaquery not implemented')
-
     return make_query(event_filter.user, event_filter.project,
                       event_filter.meter, event_filter.resource,
                       event_filter.source, event_filter.start,
-                      event_filter.end, require_meter)
+                      event_filter.end, require_meter,
+                      metaquery=event_filter.metaquery)
+
+
+def _column_conditions(user=None, project=None, resource=None, source=None,
+                       metaquery={}):
+    """Return the (column, value) equality conditions a row must match.
+    """
+    conditions = []
+    if user:
+        conditions.append(('user_id', user))
+    if project:
+        conditions.append(('project_id', project))
+    if resource:
+        conditions.append(('resource_id', resource))
+    if source:
+        conditions.append(('source', source))
+    for key, value in sorted((metaquery or {}).iteritems()):
+        conditions.append(('r_%s' % key[len('metadata.'):],
+                           _format_meta_value(value)))
+    return conditions
+
+
+def _column_filter(column, value):
+    """Return the filter string matching rows where column equals value.
+
+    Rows that don't have the column at all are filtered out too, hence
+    filterIfColumnMissing set to true.
+    """
+    return ("SingleColumnValueFilter ('f', '%s', =, 'binary:%s', true, true)"
+            % (_escape(column), _escape(value)))
+
+
+def _meters_filter(meters):
+    """Return the filter string matching rows of any of the meters.
+    """
+    return ("SingleColumnValueFilter ('f', 'counter_name', =, "
+            "'regexstring:%s', true, true)"
+            % _escape('|'.join('^%s$' % re.escape(m) for m in meters)))
+
+
+def _escape(value):
+    """Escape a string quoted in a filter, by doubling its quotes.
+    """
+    return value.replace("'", "''")
+
+
+def _make_filter(conditions):
+    """Return the filter string for all the (column, value) conditions.
+    """
+    if conditions:
+        return " AND ".join(_column_filter(column, value)
+                            for column, value in conditions)
+
+
+def _match_conditions(data, conditions):
+    """Check the (column, value) conditions on the client side, for rows
+    which have been fetched by key rather than scanned.
+    """
+    return all(data.get('f:%s' % column) == value
+               for column, value in conditions)
 
 
 def _load_hbase_list(d, prefix):
@@ -717,3 +1353,22 @@ def _load_hbase_list(d, prefix):
     for key in (k for k in d if k.startswith(prefix)):
         ret.append(key[len(prefix):])
     return ret
+
+
+def _format_meta_value(value):
+    """Serialise a metadata value the way it is stored in HBase: strings are
+    kept as is, so that they can be compared in filters, anything else is
+    JSON encoded.
+    """
+    if isinstance(value, unicode):
+        return value.encode('utf-8')
+    if isinstance(value, str):
+        return value
+    return json.dumps(value)
+
+
+def _metadata_columns(metadata):
+    """Return the column qualifiers indexing the flattened metadata.
+    """
+    return dict(('f:r_%s' % key, _format_meta_value(value))
+                for key, value in utils.dict_to_keyval(metadata or {}))
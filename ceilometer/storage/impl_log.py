@@ -62,17 +62,23 @@ class Connection(base.Connection):
                  data['resource_id'],
                  data['counter_volume'])
 
-    def get_users(self, source=None):
-        """Return an iterable of user id strings.
+    def get_users(self, source=None, limit=None, marker=None):
+        """Return an iterable of user id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of users to return.
+        :param marker: Optional user id, only the users after it are
+                       returned.
         """
         return []
 
-    def get_projects(self, source=None):
-        """Return an iterable of project id strings.
+    def get_projects(self, source=None, limit=None, marker=None):
+        """Return an iterable of project id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of projects to return.
+        :param marker: Optional project id, only the projects after it are
+                       returned.
         """
         return []
 
@@ -124,7 +130,8 @@ class Connection(base.Connection):
         """
         return []
 
-    def get_meter_statistics(self, event_filter, period=None):
+    def get_meter_statistics(self, event_filter, period=None, groupby=None,
+                             deltas=False):
         """Return a dictionary containing meter statistics.
         described by the query parameters.
 
@@ -141,6 +148,9 @@ class Connection(base.Connection):
           'duration':
           'duration_start':
           'duration_end':
+          'groupby':
+          'delta':
+          'rate':
           }
 
         """
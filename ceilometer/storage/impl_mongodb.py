@@ -22,7 +22,7 @@
 
 import copy
 import datetime
-import operator
+import heapq
 import os
 import re
 import urlparse
@@ -30,13 +30,21 @@ import urlparse
 import bson.code
 import pymongo
 
+from oslo.config import cfg
+
 from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
 from ceilometer.storage import base
 from ceilometer.storage import models
 
 
 LOG = log.getLogger(__name__)
 
+# Length of the meter collection partitions
+PARTITION_PERIODS = {'day': datetime.timedelta(days=1),
+                     'week': datetime.timedelta(weeks=1),
+                     }
+
 
 class MongoDBStorage(base.StorageEngine):
     """Put the data into a MongoDB database
@@ -53,18 +61,44 @@ class MongoDBStorage(base.StorageEngine):
               }
         - meter
           - the raw incoming data
+        - meter_<YYYYMMDD>
+          - the raw incoming data of a day or week starting on YYYYMMDD,
+            when mongodb_partition_period is set
+        - meter_partition
+          - the catalogue of the meter collection partitions
+          - { _id: name of the collection,
+              start: datetime of the beginning of the partition
+              end: datetime of the end of the partition
+            }
         - resource
           - the metadata for resources
           - { _id: uuid of resource,
               metadata: metadata dictionaries
               user_id: uuid
               project_id: uuid
+              user_ids: [ array of the user ids of the samples ]
+              first_sample_timestamp: datetime of the oldest sample
+              last_sample_timestamp: datetime of the newest sample
               meter: [ array of {counter_name: string, counter_type: string,
                                  counter_unit: string} ]
             }
     """
 
-    OPTIONS = []
+    OPTIONS = [
+        cfg.StrOpt('mongodb_partition_period',
+                   default='',
+                   help="Store the samples in one collection per 'day' or "
+                   "'week' rather than in a single meter collection",
+                   ),
+        cfg.IntOpt('time_to_live',
+                   default=-1,
+                   help='Number of seconds samples are kept in the '
+                   'database, -1 to keep them forever. With partitions, '
+                   'whole partitions are dropped once they expire; the '
+                   'expiry of the samples of the meter collection is '
+                   'applied by ceilometer-dbsync',
+                   ),
+    ]
 
     def register_opts(self, conf):
         """Register any configuration options used by this engine.
@@ -91,6 +125,39 @@ def make_timestamp_range(start, end):
     return ts_range
 
 
+def partition_start(timestamp, period):
+    """Return the start of the partition of the given period holding the
+    timestamp.
+
+    :param timestamp: datetime of a sample.
+    :param period: 'day' or 'week', weeks start on mondays.
+    """
+    start = datetime.datetime(timestamp.year, timestamp.month, timestamp.day)
+    if period == 'week':
+        start -= datetime.timedelta(days=start.weekday())
+    return start
+
+
+def paginate_ids(collection, q, limit=None, marker=None):
+    """Return the ids of the documents matching the query, sorted.
+
+    Only the ids are read, so the _id index covers the query.
+
+    :param collection: The collection to query.
+    :param q: The query document.
+    :param limit: Optional maximum number of ids to return.
+    :param marker: Optional id, only the ids after it are returned.
+    """
+    q = dict(q)
+    if marker is not None:
+        q['_id'] = {'$gt': marker}
+    cursor = collection.find(q, fields=['_id'])
+    cursor = cursor.sort('_id', pymongo.ASCENDING)
+    if limit:
+        cursor = cursor.limit(limit)
+    return (doc['_id'] for doc in cursor)
+
+
 def make_query_from_filter(event_filter, require_meter=True):
     """Return a query dictionary based on the settings in the filter.
 
@@ -105,7 +172,9 @@ def make_query_from_filter(event_filter, require_meter=True):
     if event_filter.project:
         q['project_id'] = event_filter.project
 
-    if event_filter.meter:
+    if isinstance(event_filter.meter, list):
+        q['counter_name'] = {'$in': event_filter.meter}
+    elif event_filter.meter:
         q['counter_name'] = event_filter.meter
     elif require_meter:
         raise RuntimeError('Missing required meter specifier')
@@ -132,28 +201,33 @@ class Connection(base.Connection):
 
     _mim_instance = None
 
+    # The map functions are completed with the key the samples are
+    # emitted under and the values of the fields they are grouped by.
     MAP_STATS = bson.code.Code("""
     function () {
-        emit('statistics', { min : this.counter_volume,
-                             max : this.counter_volume,
-                             sum : this.counter_volume,
-                             count : NumberInt(1),
-                             duration_start : this.timestamp,
-                             duration_end : this.timestamp,
-                             period_start : this.timestamp,
-                             period_end : this.timestamp} )
+        var groupby = %(groupby)s;
+        emit(%(key)s, { min : this.counter_volume,
+                        max : this.counter_volume,
+                        sum : this.counter_volume,
+                        count : NumberInt(1),
+                        duration_start : this.timestamp,
+                        duration_end : this.timestamp,
+                        period_start : this.timestamp,
+                        period_end : this.timestamp,
+                        groupby : groupby} )
     }
     """)
 
     MAP_STATS_PERIOD = bson.code.Code("""
     function () {
-        var period = %d * 1000;
-        var period_first = %d * 1000;
+        var period = %(period)d * 1000;
+        var period_first = %(period_first)d * 1000;
         var period_start = period_first
                            + (Math.floor(new Date(this.timestamp.getTime()
                                          - period_first) / period)
                               * period);
-        emit(period_start,
+        var groupby = %(groupby)s;
+        emit(%(key)s,
              { min : this.counter_volume,
                max : this.counter_volume,
                sum : this.counter_volume,
@@ -161,7 +235,8 @@ class Connection(base.Connection):
                duration_start : this.timestamp,
                duration_end : this.timestamp,
                period_start : new Date(period_start),
-               period_end : new Date(period_start + period) } )
+               period_end : new Date(period_start + period),
+               groupby : groupby} )
     }
     """)
 
@@ -193,6 +268,36 @@ class Connection(base.Connection):
         return value;
     }""")
 
+    # Indexes of the resource collection, as (name, keys). We need
+    # variations for user_id vs. project_id because of the way the indexes
+    # are stored in b-trees. The user_id and project_id values are usually
+    # mutually exclusive in the queries, so the database won't take
+    # advantage of an index including both.
+    RESOURCE_INDEXES = [
+        ('resource_user_idx', [('user_id', pymongo.ASCENDING),
+                               ('source', pymongo.ASCENDING)]),
+        ('resource_project_idx', [('project_id', pymongo.ASCENDING),
+                                  ('source', pymongo.ASCENDING)]),
+    ]
+
+    # Indexes of the sample collections, as (name, keys). The queries are
+    # built by make_query_from_filter(): get_meter_statistics() always
+    # filters on the meter, the other queries usually on one of the
+    # resource, user or project, all of them over a time range.
+    METER_INDEXES = [
+        ('meter_counter_idx', [('counter_name', pymongo.ASCENDING),
+                               ('timestamp', pymongo.ASCENDING)]),
+        ('meter_resource_idx', [('resource_id', pymongo.ASCENDING),
+                                ('timestamp', pymongo.ASCENDING)]),
+        ('meter_project_idx', [('project_id', pymongo.ASCENDING),
+                               ('timestamp', pymongo.ASCENDING)]),
+        ('meter_user_idx', [('user_id', pymongo.ASCENDING),
+                            ('timestamp', pymongo.ASCENDING)]),
+    ]
+
+    # Indexes created by earlier versions of the driver
+    OBSOLETE_INDEXES = ['resource_idx', 'meter_idx']
+
     def __init__(self, conf):
         opts = self._parse_connection_url(conf.database_connection)
         LOG.info('connecting to MongoDB on %s:%s', opts['host'], opts['port'])
@@ -215,6 +320,11 @@ class Connection(base.Connection):
                         raise nose.SkipTest("Ming not found")
                     LOG.debug('Creating a new MIM Connection object')
                     Connection._mim_instance = mim.Connection()
+                    # MIM doesn't implement the $min and $max update
+                    # operators, which MongoDB has since 2.6
+                    if not hasattr(mim.Match, '_op_min'):
+                        mim.Match._op_min = _mim_op_min
+                        mim.Match._op_max = _mim_op_max
                 self.conn = Connection._mim_instance
                 LOG.debug('Using MIM for test connection')
         else:
@@ -226,30 +336,142 @@ class Connection(base.Connection):
         if 'username' in opts:
             self.db.authenticate(opts['username'], opts['password'])
 
-        # Establish indexes
-        #
-        # We need variations for user_id vs. project_id because of the
-        # way the indexes are stored in b-trees. The user_id and
-        # project_id values are usually mutually exclusive in the
-        # queries, so the database won't take advantage of an index
-        # including both.
-        for primary in ['user_id', 'project_id']:
-            self.db.resource.ensure_index([
-                (primary, pymongo.ASCENDING),
-                ('source', pymongo.ASCENDING),
-            ], name='resource_idx')
-            self.db.meter.ensure_index([
-                ('resource_id', pymongo.ASCENDING),
-                (primary, pymongo.ASCENDING),
-                ('counter_name', pymongo.ASCENDING),
-                ('timestamp', pymongo.ASCENDING),
-                ('source', pymongo.ASCENDING),
-            ], name='meter_idx')
+        self.partition_period = conf.mongodb_partition_period or None
+        if (self.partition_period is not None
+                and self.partition_period not in PARTITION_PERIODS):
+            raise ValueError('Unknown partition period %s'
+                             % self.partition_period)
+        self.time_to_live = conf.time_to_live
+        # Names of the partitions known to be in the catalogue
+        self._partitions = set()
+
+        if self.partition_period:
+            self._expire_partitions()
+
+    def _ensure_indexes(self, collection, indexes):
+        """Build the indexes of a collection, in the background so that the
+        collection stays available meanwhile.
+        """
+        existing = collection.index_information()
+        for name in self.OBSOLETE_INDEXES:
+            if name in existing:
+                LOG.debug('Dropping obsolete index %s of %s',
+                          name, collection.name)
+                collection.drop_index(name)
+        for name, keys in indexes:
+            collection.ensure_index(keys, name=name, background=True)
+
+    def _ensure_meter_indexes(self, collection):
+        """Establish the indexes of a collection of samples.
+        """
+        self._ensure_indexes(collection, self.METER_INDEXES)
+
+    def _ensure_ttl_index(self, collection):
+        """Make the samples of the collection expire after time_to_live
+        seconds, or never if it is not set.
+        """
+        index = collection.index_information().get('meter_ttl')
+        ttl = self.time_to_live if self.time_to_live > 0 else None
+        if index is not None and index.get('expireAfterSeconds') != ttl:
+            collection.drop_index('meter_ttl')
+        if ttl:
+            collection.ensure_index('timestamp', name='meter_ttl',
+                                    expireAfterSeconds=ttl)
+
+    def _expire_partitions(self):
+        """Drop the partitions whose samples are all older than
+        time_to_live seconds.
+        """
+        if self.time_to_live <= 0:
+            return
+        cutoff = timeutils.utcnow() - datetime.timedelta(
+            seconds=self.time_to_live)
+        for partition in self.db.meter_partition.find(
+                {'end': {'$lte': cutoff}}):
+            LOG.debug('Dropping expired partition %s', partition['_id'])
+            self.db.drop_collection(partition['_id'])
+            self.db.meter_partition.remove({'_id': partition['_id']})
+            self._partitions.discard(partition['_id'])
+
+    def _meter_collection(self, timestamp):
+        """Return the collection the samples taken at timestamp go to.
+        """
+        if not self.partition_period:
+            return self.db.meter
+        start = partition_start(timestamp, self.partition_period)
+        name = start.strftime('meter_%Y%m%d')
+        if name not in self._partitions:
+            # A new partition is needed about once a day or week, a good
+            # time to drop the expired ones.
+            self._expire_partitions()
+            self.db.meter_partition.update(
+                {'_id': name},
+                {'$set': {'start': start,
+                          'end': start + PARTITION_PERIODS[
+                              self.partition_period],
+                          },
+                 },
+                upsert=True,
+            )
+            # The partition is new, so building its indexes is cheap
+            self._ensure_meter_indexes(self.db[name])
+            self._partitions.add(name)
+        return self.db[name]
+
+    def _meter_collections(self, start=None, end=None):
+        """Return the collections which may hold samples taken between
+        start and end.
+
+        The samples recorded before partitioning was enabled stay in the
+        meter collection, which is always part of the result.
+        """
+        if not self.partition_period:
+            return [self.db.meter]
+        q = {}
+        if start:
+            q['end'] = {'$gt': start}
+        if end:
+            q['start'] = {'$lt': end}
+        names = sorted(p['_id'] for p in self.db.meter_partition.find(q))
+        return [self.db.meter] + [self.db[name] for name in names]
 
     def upgrade(self, version=None):
-        pass
+        self._ensure_indexes(self.db.resource, self.RESOURCE_INDEXES)
+        for collection in self._meter_collections():
+            self._ensure_meter_indexes(collection)
+        # With partitions, the samples recorded before still expire
+        self._ensure_ttl_index(self.db.meter)
+        self._upgrade_resources()
+
+    def _upgrade_resources(self):
+        """Add the sample time range and the users to the resources
+        recorded before they were maintained.
+        """
+        collections = self._meter_collections()
+        for resource in self.db.resource.find(
+                {'first_sample_timestamp': {'$exists': False}}):
+            q = {'resource_id': resource['_id']}
+            user_ids = set()
+            timestamps = []
+            for collection in collections:
+                user_ids.update(collection.find(q).distinct('user_id'))
+                for direction in [pymongo.ASCENDING, pymongo.DESCENDING]:
+                    for sample in collection.find(
+                            q, fields=['timestamp']).sort(
+                                'timestamp', direction).limit(1):
+                        timestamps.append(sample['timestamp'])
+            if not timestamps:
+                continue
+            self.db.resource.update(
+                {'_id': resource['_id']},
+                {'$addToSet': {'user_ids': {'$each': list(user_ids)}},
+                 '$min': {'first_sample_timestamp': min(timestamps)},
+                 '$max': {'last_sample_timestamp': max(timestamps)},
+                 },
+            )
 
     def clear(self):
+        self._partitions = set()
         if self._mim_instance is not None:
             # Don't want to use drop_database() because
             # may end up running out of spidermonkey instances.
@@ -310,7 +532,12 @@ class Connection(base.Connection):
                                      'counter_type': data['counter_type'],
                                      'counter_unit': data['counter_unit'],
                                      },
+                           'user_ids': data['user_id'],
                            },
+             # The time range of the samples of the resource, so that
+             # get_resources() doesn't have to look at the samples
+             '$min': {'first_sample_timestamp': data['timestamp']},
+             '$max': {'last_sample_timestamp': data['timestamp']},
              },
             upsert=True,
         )
@@ -319,28 +546,34 @@ class Connection(base.Connection):
         # modify a data structure owned by our caller (the driver adds
         # a new key '_id').
         record = copy.copy(data)
-        self.db.meter.insert(record)
+        self._meter_collection(data['timestamp']).insert(record)
         return
 
-    def get_users(self, source=None):
-        """Return an iterable of user id strings.
+    def get_users(self, source=None, limit=None, marker=None):
+        """Return an iterable of user id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of users to return.
+        :param marker: Optional user id, only the users after it are
+                       returned.
         """
         q = {}
         if source is not None:
             q['source'] = source
-        return sorted(self.db.user.find(q).distinct('_id'))
+        return paginate_ids(self.db.user, q, limit, marker)
 
-    def get_projects(self, source=None):
-        """Return an iterable of project id strings.
+    def get_projects(self, source=None, limit=None, marker=None):
+        """Return an iterable of project id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of projects to return.
+        :param marker: Optional project id, only the projects after it are
+                       returned.
         """
         q = {}
         if source is not None:
             q['source'] = source
-        return sorted(self.db.project.find(q).distinct('_id'))
+        return paginate_ids(self.db.project, q, limit, marker)
 
     def get_resources(self, user=None, project=None, source=None,
                       start_timestamp=None, end_timestamp=None,
@@ -357,36 +590,34 @@ class Connection(base.Connection):
         """
         q = {}
         if user is not None:
-            q['user_id'] = user
+            # Any user the resource had samples for
+            q['user_ids'] = user
         if project is not None:
             q['project_id'] = project
         if source is not None:
             q['source'] = source
         if resource is not None:
-            q['resource_id'] = resource
-        # Add resource_ prefix so it matches the field in the db
-        q.update(dict(('resource_' + k, v)
-                      for (k, v) in metaquery.iteritems()))
-
-        # FIXME(dhellmann): This may not perform very well,
-        # but doing any better will require changing the database
-        # schema and that will need more thought than I have time
-        # to put into it today.
-        if start_timestamp or end_timestamp:
-            # Look for resources matching the above criteria and with
-            # samples in the time range we care about, then change the
-            # resource query to return just those resources by id.
-            ts_range = make_timestamp_range(start_timestamp, end_timestamp)
-            if ts_range:
-                q['timestamp'] = ts_range
-
-        # FIXME(jd): We should use self.db.meter.group() and not use the
-        # resource collection, but that's not supported by MIM, so it's not
-        # easily testable yet. Since it was bugged before anyway, it's still
-        # better for now.
-        resource_ids = self.db.meter.find(q).distinct('resource_id')
-        q = {'_id': {'$in': resource_ids}}
+            q['_id'] = resource
+        q.update(metaquery)
+
+        # The resource may have samples in the time range if its first and
+        # last samples are on both sides of the range start and end.
+        if start_timestamp:
+            q['last_sample_timestamp'] = {'$gte': start_timestamp}
+        if end_timestamp:
+            q['first_sample_timestamp'] = {'$lt': end_timestamp}
+
         for resource in self.db.resource.find(q):
+            # Unless one of its first and last samples is in the range, a
+            # resource spanning the whole range may have no sample in it.
+            # The same goes for the samples of the user over the range.
+            if ((user is not None and (start_timestamp or end_timestamp))
+                or (start_timestamp and end_timestamp
+                    and resource['first_sample_timestamp'] < start_timestamp
+                    and resource['last_sample_timestamp'] >= end_timestamp)):
+                if not self._has_samples(resource['_id'], user,
+                                         start_timestamp, end_timestamp):
+                    continue
             yield models.Resource(
                 resource_id=resource['_id'],
                 project_id=resource['project_id'],
@@ -402,6 +633,21 @@ class Connection(base.Connection):
                 ],
             )
 
+    def _has_samples(self, resource, user, start, end):
+        """Return whether there are samples of the resource, and of the user
+        if set, in the time range.
+        """
+        q = {'resource_id': resource}
+        if user is not None:
+            q['user_id'] = user
+        ts_range = make_timestamp_range(start, end)
+        if ts_range:
+            q['timestamp'] = ts_range
+        for collection in self._meter_collections(start, end):
+            if collection.find_one(q, fields=['_id']):
+                return True
+        return False
+
     def get_meters(self, user=None, project=None, resource=None, source=None,
                    metaquery={}):
         """Return an iterable of models.Meter instances
@@ -441,15 +687,17 @@ class Connection(base.Connection):
         :func:`ceilometer.meter.meter_message_from_counter`.
         """
         q = make_query_from_filter(event_filter, require_meter=False)
-        samples = self.db.meter.find(q)
-        for s in samples:
-            # Remove the ObjectId generated by the database when
-            # the event was inserted. It is an implementation
-            # detail that should not leak outside of the driver.
-            del s['_id']
-            yield models.Sample(**s)
-
-    def get_meter_statistics(self, event_filter, period=None):
+        for collection in self._meter_collections(event_filter.start,
+                                                  event_filter.end):
+            for s in collection.find(q):
+                # Remove the ObjectId generated by the database when
+                # the event was inserted. It is an implementation
+                # detail that should not leak outside of the driver.
+                del s['_id']
+                yield models.Sample(**s)
+
+    def get_meter_statistics(self, event_filter, period=None, groupby=None,
+                             deltas=False):
         """Return an iterable of models.Statistics instance containing meter
         statistics described by the query parameters.
 
@@ -458,25 +706,110 @@ class Connection(base.Connection):
         """
         q = make_query_from_filter(event_filter)
 
+        if groupby:
+            groupby_js = '{%s}' % ', '.join('%s : this.%s' % (g, g)
+                                            for g in groupby)
+        else:
+            groupby_js = 'null'
         if period:
-            map_stats = self.MAP_STATS_PERIOD % \
-                (period,
-                 int(event_filter.start.strftime('%s'))
-                 if event_filter.start else 0)
+            if groupby:
+                key = '{period_start : period_start, groupby : groupby}'
+            else:
+                key = 'period_start'
+            map_stats = self.MAP_STATS_PERIOD % {
+                'period': period,
+                'period_first': (int(event_filter.start.strftime('%s'))
+                                 if event_filter.start else 0),
+                'groupby': groupby_js,
+                'key': key,
+            }
         else:
-            map_stats = self.MAP_STATS
-
-        results = self.db.meter.map_reduce(
-            map_stats,
-            self.REDUCE_STATS,
-            {'inline': 1},
-            finalize=self.FINALIZE_STATS,
-            query=q,
-        )
+            map_stats = self.MAP_STATS % {
+                'groupby': groupby_js,
+                'key': 'groupby' if groupby else "'statistics'",
+            }
 
-        return sorted((models.Statistics(**(r['value']))
-                       for r in results['results']),
-                      key=operator.attrgetter('period_start'))
+        stats = {}
+        collections = self._meter_collections(event_filter.start,
+                                              event_filter.end)
+        for collection in collections:
+            results = collection.map_reduce(
+                map_stats,
+                self.REDUCE_STATS,
+                {'inline': 1},
+                finalize=self.FINALIZE_STATS,
+                query=q,
+            )
+            for r in results['results']:
+                key = self._stats_key(r['_id'])
+                if key in stats:
+                    stats[key] = self._merge_stats(stats[key], r['value'])
+                else:
+                    stats[key] = r['value']
+
+        statistics = sorted((models.Statistics(**value)
+                             for value in stats.itervalues()),
+                            key=lambda s: (s.period_start,
+                                           sorted((s.groupby or {}).items())))
+        if deltas:
+            base.add_deltas(statistics,
+                            self._iter_counter_samples(collections, q,
+                                                       groupby))
+        return statistics
+
+    @staticmethod
+    def _iter_counter_samples(collections, q, groupby):
+        """Return the (series, timestamp, volume, groupby) tuples of the
+        samples matching the query, ordered by series and timestamp, for
+        base.add_deltas().
+        """
+        fields = ['counter_name', 'resource_id', 'timestamp',
+                  'counter_volume'] + list(groupby or [])
+        sort = [('counter_name', pymongo.ASCENDING),
+                ('resource_id', pymongo.ASCENDING),
+                ('timestamp', pymongo.ASCENDING)]
+
+        def keyed(cursor):
+            for s in cursor:
+                yield ((s['counter_name'], s['resource_id'], s['timestamp']),
+                       s)
+
+        # A series may span several partitions, each of them is read
+        # in order and they are merged.
+        for (name, resource, timestamp), s in heapq.merge(
+                *[keyed(c.find(q, fields=fields, sort=sort))
+                  for c in collections]):
+            yield ((name, resource),
+                   timestamp,
+                   s['counter_volume'],
+                   dict((g, s[g]) for g in groupby) if groupby else None)
+
+    @classmethod
+    def _stats_key(cls, key):
+        """Return a hashable version of a map-reduce key, group keys being
+        documents.
+        """
+        if isinstance(key, dict):
+            return tuple(sorted((k, cls._stats_key(v))
+                                for k, v in key.iteritems()))
+        return key
+
+    @staticmethod
+    def _merge_stats(a, b):
+        """Return the statistics of a time bucket found in two partitions.
+        """
+        value = dict(a)
+        value['min'] = min(a['min'], b['min'])
+        value['max'] = max(a['max'], b['max'])
+        value['sum'] = a['sum'] + b['sum']
+        value['count'] = a['count'] + b['count']
+        value['avg'] = value['sum'] / float(value['count'])
+        value['duration_start'] = min(a['duration_start'],
+                                      b['duration_start'])
+        value['duration_end'] = max(a['duration_end'], b['duration_end'])
+        value['duration'] = timeutils.delta_seconds(value['duration_start'],
+                                                    value['duration_end'])
+        return value
 
     def _fix_interval_min_max(self, a_min, a_max):
         if hasattr(a_min, 'valueOf') and a_min.valueOf is not None:
@@ -507,6 +840,28 @@ class Connection(base.Connection):
         return (a_min, a_max)
 
 
+def _mim_op_min(self, subdoc, key, arg):
+    """The $min update operator, for MIM.
+    """
+    try:
+        if not arg < subdoc[key]:
+            return
+    except KeyError:
+        pass
+    subdoc[key] = arg
+
+
+def _mim_op_max(self, subdoc, key, arg):
+    """The $max update operator, for MIM.
+    """
+    try:
+        if not arg > subdoc[key]:
+            return
+    except KeyError:
+        pass
+    subdoc[key] = arg
+
+
 def require_map_reduce(conn):
     """Raises SkipTest if the connection is using mim.
     """
@@ -20,8 +20,11 @@
 from __future__ import absolute_import
 
 import copy
+import json
 import os
+from sqlalchemy import and_
 from sqlalchemy import func
+from sqlalchemy import or_
 
 from ceilometer.openstack.common import log
 from ceilometer.openstack.common import timeutils
@@ -30,7 +33,9 @@ from ceilometer.storage import models as api_models
 from ceilometer.storage.sqlalchemy import migration
 from ceilometer.storage.sqlalchemy.models import Meter, Project, Resource
 from ceilometer.storage.sqlalchemy.models import Source, User, Base
+from ceilometer.storage.sqlalchemy.models import META_TYPE_MAP
 import ceilometer.storage.sqlalchemy.session as sqlalchemy_session
+from ceilometer import utils
 
 LOG = log.getLogger(__name__)
 
@@ -61,6 +66,13 @@ class SQLAlchemyStorage(base.StorageEngine):
               message_signature: message signature
               message_id: message uuid
               }
+        - metadata_text, metadata_bool, metadata_int, metadata_float
+          - the flattened resource metadata of each meter, one table per
+            value type, indexed to resolve metaqueries
+          - { id: meter id                  (->meter.id)
+              meta_key: dotted metadata key, e.g. 'image.name'
+              value: metadata value
+              }
         - resource
           - the metadata for resources
           - { id: resource uuid
@@ -91,15 +103,91 @@ class SQLAlchemyStorage(base.StorageEngine):
         return Connection(conf)
 
 
-def make_query_from_filter(query, event_filter, require_meter=True):
+def _meta_values(value):
+    """Return the (index table, value) pairs a metaquery value matches.
+
+    The API gives every value as a string, which also matches the numbers
+    and booleans whose JSON encoding it is, e.g. '5' matches the integer
+    and float metadata equal to 5 and 'true' the boolean metadata.
+    """
+    if not isinstance(value, basestring):
+        try:
+            return [(META_TYPE_MAP[type(value)], value)]
+        except KeyError:
+            return []
+    values = [(META_TYPE_MAP[type(value)], value)]
+    try:
+        decoded = json.loads(value)
+    except ValueError:
+        return values
+    if isinstance(decoded, bool):
+        values.append((META_TYPE_MAP[bool], decoded))
+    elif isinstance(decoded, (int, long)):
+        values.append((META_TYPE_MAP[int], decoded))
+        values.append((META_TYPE_MAP[float], float(decoded)))
+    elif isinstance(decoded, float):
+        values.append((META_TYPE_MAP[float], decoded))
+        if decoded.is_integer():
+            values.append((META_TYPE_MAP[int], int(decoded)))
+    return values
+
+
+def apply_metaquery_filter(session, query, metaquery):
+    """Apply provided metaquery filter to existing query.
+
+    Each 'metadata.<key>' condition is resolved against the index tables
+    matching the type of the value, and restricts the meters to the ids
+    found there.
+
+    :param session: session used for original query
+    :param query: Query instance
+    :param metaquery: dict with metadata to match on.
+    """
+    for k, value in metaquery.iteritems():
+        key = k[len('metadata.'):]
+        values = _meta_values(value)
+        if not values:
+            raise NotImplementedError('Query on %s is of %s type and is '
+                                      'not supported' % (k, type(value)))
+        query = query.filter(or_(*[
+            Meter.id.in_(session.query(_model.id).filter(
+                and_(_model.meta_key == key,
+                     _model.value == v)).subquery())
+            for _model, v in values]))
+    return query
+
+
+def paginate_query(query, key, limit=None, marker=None):
+    """Return the query sorted by key, only returning up to limit rows after
+    the marker if they are set. The rows are fetched by batches rather
+    than all at once.
+
+    :param query: Query to paginate.
+    :param key: Column to sort on, the marker is a value of this column.
+    :param limit: Optional maximum number of rows to return.
+    :param marker: Optional value of key, only rows after it are returned.
+    """
+    if marker is not None:
+        query = query.filter(key > marker)
+    query = query.order_by(key)
+    if limit:
+        query = query.limit(limit)
+    return query.yield_per(1000)
+
+
+def make_query_from_filter(session, query, event_filter, require_meter=True):
     """Return a query dictionary based on the settings in the filter.
 
+    :param session: session used for original query
+    :param query: Query instance
     :param filter: EventFilter instance
     :param require_meter: If true and the filter does not have a meter,
                           raise an error.
     """
 
-    if event_filter.meter:
+    if isinstance(event_filter.meter, list):
+        query = query.filter(Meter.counter_name.in_(event_filter.meter))
+    elif event_filter.meter:
         query = query.filter(Meter.counter_name == event_filter.meter)
     elif require_meter:
         raise RuntimeError('Missing required meter specifier')
@@ -119,7 +207,8 @@ def make_query_from_filter(query, event_filter, require_meter=True):
         query = query.filter_by(resource_id=event_filter.resource)
 
     if event_filter.metaquery:
-        raise NotImplementedError('metaquery not implemented')
+        query = apply_metaquery_filter(session, query,
+                                       event_filter.metaquery)
 
     return query
 
@@ -199,27 +288,48 @@ class Connection(base.Connection):
         meter.message_signature = data['message_signature']
         meter.message_id = data['message_id']
 
+        # Index the flattened metadata so that metaqueries don't have to
+        # decode the JSON blob of every meter.
+        if rmetadata:
+            self.session.flush()
+            for key, v in utils.dict_to_keyval(rmetadata):
+                try:
+                    _model = META_TYPE_MAP[type(v)]
+                except KeyError:
+                    LOG.warn('Unknown metadata type. Key (%s) will not be '
+                             'queryable.', key)
+                else:
+                    self.session.add(_model(id=meter.id, meta_key=key,
+                                            value=v))
+
         return
 
-    def get_users(self, source=None):
-        """Return an iterable of user id strings.
+    def get_users(self, source=None, limit=None, marker=None):
+        """Return an iterable of user id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of users to return.
+        :param marker: Optional user id, only the users after it are
+                       returned.
         """
         query = self.session.query(User.id)
         if source is not None:
             query = query.filter(User.sources.any(id=source))
-        return (x[0] for x in query.all())
+        return (x[0] for x in paginate_query(query, User.id, limit, marker))
 
-    def get_projects(self, source=None):
-        """Return an iterable of project id strings.
+    def get_projects(self, source=None, limit=None, marker=None):
+        """Return an iterable of project id strings, sorted.
 
         :param source: Optional source filter.
+        :param limit: Optional maximum number of projects to return.
+        :param marker: Optional project id, only the projects after it are
+                       returned.
         """
         query = self.session.query(Project.id)
         if source:
             query = query.filter(Project.sources.any(id=source))
-        return (x[0] for x in query.all())
+        return (x[0] for x in paginate_query(query, Project.id, limit,
+                                             marker))
 
     def get_resources(self, user=None, project=None, source=None,
                       start_timestamp=None, end_timestamp=None,
@@ -248,7 +358,7 @@ class Connection(base.Connection):
         if resource is not None:
             query = query.filter(Meter.resource_id == resource)
         if metaquery:
-            raise NotImplementedError('metaquery not implemented')
+            query = apply_metaquery_filter(self.session, query, metaquery)
 
         for meter in query.all():
             yield api_models.Resource(
@@ -288,7 +398,10 @@ class Connection(base.Connection):
         query = query.options(
             sqlalchemy_session.sqlalchemy.orm.joinedload('meters'))
         if metaquery:
-            raise NotImplementedError('metaquery not implemented')
+            meter_q = apply_metaquery_filter(
+                self.session, self.session.query(Meter.resource_id),
+                metaquery)
+            query = query.filter(Resource.id.in_(meter_q.subquery()))
 
         for resource in query.all():
             meter_names = set()
@@ -309,7 +422,7 @@ class Connection(base.Connection):
         """Return an iterable of api_models.Samples
         """
         query = self.session.query(Meter)
-        query = make_query_from_filter(query, event_filter,
+        query = make_query_from_filter(self.session, query, event_filter,
                                        require_meter=False)
         samples = query.all()
 
@@ -338,26 +451,33 @@ class Connection(base.Connection):
     def _make_volume_query(self, event_filter, counter_volume_func):
         """Returns complex Meter counter_volume query for max and sum."""
         subq = self.session.query(Meter.id)
-        subq = make_query_from_filter(subq, event_filter, require_meter=False)
+        subq = make_query_from_filter(self.session, subq, event_filter,
+                                      require_meter=False)
         subq = subq.subquery()
         mainq = self.session.query(Resource.id, counter_volume_func)
         mainq = mainq.join(Meter).group_by(Resource.id)
         return mainq.filter(Meter.id.in_(subq))
 
-    def _make_stats_query(self, event_filter):
-        query = self.session.query(
+    def _make_stats_query(self, event_filter, groupby=None):
+        select = [
             func.min(Meter.timestamp).label('tsmin'),
             func.max(Meter.timestamp).label('tsmax'),
             func.avg(Meter.counter_volume).label('avg'),
             func.sum(Meter.counter_volume).label('sum'),
             func.min(Meter.counter_volume).label('min'),
             func.max(Meter.counter_volume).label('max'),
-            func.count(Meter.counter_volume).label('count'))
+            func.count(Meter.counter_volume).label('count'),
+        ]
+        group_attributes = [getattr(Meter, g) for g in groupby or []]
+        query = self.session.query(*(select + group_attributes))
+        if group_attributes:
+            query = query.group_by(*group_attributes)
 
-        return make_query_from_filter(query, event_filter)
+        return make_query_from_filter(self.session, query, event_filter)
 
     @staticmethod
-    def _stats_result_to_model(result, period, period_start, period_end):
+    def _stats_result_to_model(result, period, period_start, period_end,
+                               groupby=None):
         duration = (timeutils.delta_seconds(result.tsmin, result.tsmax)
                     if result.tsmin is not None and result.tsmax is not None
                     else None)
@@ -373,15 +493,53 @@ class Connection(base.Connection):
             period=period,
             period_start=period_start,
             period_end=period_end,
+            groupby=(dict((g, getattr(result, g)) for g in groupby)
+                     if groupby else None),
         )
 
-    def get_meter_statistics(self, event_filter, period=None):
+    def get_meter_statistics(self, event_filter, period=None, groupby=None,
+                             deltas=False):
         """Return an iterable of api_models.Statistics instances containing
         meter statistics described by the query parameters.
 
         The filter must have a meter value set.
 
         """
+        statistics = self._iter_meter_statistics(event_filter, period,
+                                                 groupby)
+        if not deltas:
+            return statistics
+
+        # The increments of the counters are computed from their samples,
+        # streamed in order by the database.
+        statistics = list(statistics)
+        group_attributes = [getattr(Meter, g) for g in groupby or []]
+        query = self.session.query(Meter.counter_name,
+                                   Meter.resource_id,
+                                   Meter.timestamp,
+                                   Meter.counter_volume,
+                                   *group_attributes)
+        query = make_query_from_filter(self.session, query, event_filter)
+        query = query.order_by(Meter.counter_name,
+                               Meter.resource_id,
+                               Meter.timestamp)
+        base.add_deltas(statistics,
+                        (((r.counter_name, r.resource_id),
+                          r.timestamp,
+                          r.counter_volume,
+                          dict((g, getattr(r, g)) for g in groupby)
+                          if groupby else None)
+                         for r in query.yield_per(1000)))
+        return statistics
+
+    def _iter_meter_statistics(self, event_filter, period, groupby):
+        if groupby and not period:
+            # One GROUP BY query computes all the groups at once.
+            for r in self._make_stats_query(event_filter, groupby):
+                yield self._stats_result_to_model(r, 0, r.tsmin, r.tsmax,
+                                                  groupby)
+            return
+
         if not period or not event_filter.start or not event_filter.end:
             res = self._make_stats_query(event_filter).all()[0]
 
@@ -389,7 +547,7 @@ class Connection(base.Connection):
             yield self._stats_result_to_model(res, 0, res.tsmin, res.tsmax)
             return
 
-        query = self._make_stats_query(event_filter)
+        query = self._make_stats_query(event_filter, groupby)
         # HACK(jd) This is an awful method to compute stats by period, but
         # since we're trying to be SQL agnostic we have to write portable
         # code, so here it is, admire! We're going to do one request to get
@@ -401,13 +559,14 @@ class Connection(base.Connection):
                 period):
             q = query.filter(Meter.timestamp >= period_start)
             q = q.filter(Meter.timestamp < period_end)
-            r = q.all()[0]
-            # Don't return results that didn't have any event
-            if r.count:
-                yield self._stats_result_to_model(
-                    result=r,
-                    period=int(timeutils.delta_seconds(period_start,
-                                                       period_end)),
-                    period_start=period_start,
-                    period_end=period_end,
-                )
+            for r in q.all():
+                # Don't return results that didn't have any event
+                if r.count:
+                    yield self._stats_result_to_model(
+                        result=r,
+                        period=int(timeutils.delta_seconds(period_start,
+                                                           period_end)),
+                        period_start=period_start,
+                        period_end=period_end,
+                        groupby=groupby,
+                    )
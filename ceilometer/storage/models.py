@@ -18,11 +18,15 @@
 """Model classes for use in the storage API.
 """
 
+from ceilometer import counter
+
 
 class Model(object):
     """Base class for storage API models.
     """
 
+    __slots__ = ()
+
     def __init__(self, **kwds):
         self.fields = list(kwds)
         for k, v in kwds.iteritems():
@@ -109,7 +113,20 @@ class Meter(Model):
 
 class Sample(Model):
     """One collected data point.
+
+    Samples are read in large numbers, so their attributes are stored in
+    slots and the counter name, type and unit are interned.
     """
+
+    fields = ('source',
+              'counter_name', 'counter_type', 'counter_unit', 'counter_volume',
+              'user_id', 'project_id', 'resource_id',
+              'timestamp', 'resource_metadata',
+              'message_id',
+              'message_signature')
+
+    __slots__ = fields
+
     def __init__(self,
                  source,
                  counter_name, counter_type, counter_unit, counter_volume,
@@ -133,19 +150,25 @@ class Sample(Model):
         :param message_signature: a hash created from the rest of the
                                   message data
         """
-        Model.__init__(self,
-                       source=source,
-                       counter_name=counter_name,
-                       counter_type=counter_type,
-                       counter_unit=counter_unit,
-                       counter_volume=counter_volume,
-                       user_id=user_id,
-                       project_id=project_id,
-                       resource_id=resource_id,
-                       timestamp=timestamp,
-                       resource_metadata=resource_metadata,
-                       message_id=message_id,
-                       message_signature=message_signature)
+        self.source = source
+        self.counter_name = counter.intern_string(counter_name)
+        self.counter_type = counter.intern_string(counter_type)
+        self.counter_unit = counter.intern_string(counter_unit)
+        self.counter_volume = counter_volume
+        self.user_id = user_id
+        self.project_id = project_id
+        self.resource_id = resource_id
+        self.timestamp = timestamp
+        self.resource_metadata = resource_metadata
+        self.message_id = message_id
+        self.message_signature = message_signature
+
+    def __getstate__(self):
+        return self.as_dict()
+
+    def __setstate__(self, state):
+        for f, v in state.iteritems():
+            setattr(self, f, v)
 
 
 class Statistics(Model):
@@ -154,7 +177,8 @@ class Statistics(Model):
     def __init__(self,
                  min, max, avg, sum, count,
                  period, period_start, period_end,
-                 duration, duration_start, duration_end):
+                 duration, duration_start, duration_end,
+                 groupby=None, delta=None, rate=None):
         """
         :param min: The smallest volume found
         :param max: The largest volume found
@@ -167,10 +191,16 @@ class Statistics(Model):
         :param duration: The total time for the matching samples
         :param duration_start: The earliest time for the matching samples
         :param duration_end: The latest time for the matching samples
+        :param groupby: The values of the fields the samples are grouped
+                        by, as a dict, or None if they are not grouped
+        :param delta: The increase of the cumulative counters, if computed
+        :param rate: The average rate of increase per second of the
+                     cumulative counters, if computed
         """
         Model.__init__(self,
                        min=min, max=max, avg=avg, sum=sum, count=count,
                        period=period, period_start=period_start,
                        period_end=period_end, duration=duration,
                        duration_start=duration_start,
-                       duration_end=duration_end)
+                       duration_end=duration_end,
+                       groupby=groupby, delta=delta, rate=rate)
@@ -0,0 +1,74 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import json
+
+from sqlalchemy import *
+
+from ceilometer import utils
+
+meta = MetaData()
+
+# (table name, value type, whether the value is part of the index)
+tables = [('metadata_text', Text, False),
+          ('metadata_bool', Boolean, True),
+          ('metadata_int', BigInteger, True),
+          ('metadata_float', Float(53), True)]
+
+
+def _meta_table_for(value):
+    if isinstance(value, bool):
+        return 'metadata_bool'
+    if isinstance(value, basestring):
+        return 'metadata_text'
+    if isinstance(value, (int, long)):
+        return 'metadata_int'
+    if isinstance(value, float):
+        return 'metadata_float'
+
+
+def upgrade(migrate_engine):
+    meta.bind = migrate_engine
+    meter = Table('meter', meta, autoload=True)
+    meta_tables = {}
+    for t_name, t_type, indexed_value in tables:
+        t = Table(
+            t_name, meta,
+            Column('id', Integer, ForeignKey('meter.id'), primary_key=True),
+            Column('meta_key', String(255), primary_key=True),
+            Column('value', t_type),
+        )
+        t.create()
+        if indexed_value:
+            Index('ix_%s_key_value' % t_name, t.c.meta_key, t.c.value).create()
+        else:
+            Index('ix_%s_key' % t_name, t.c.meta_key).create()
+        meta_tables[t_name] = t
+
+    # Index the metadata of the samples already recorded
+    for row in select([meter.c.id, meter.c.resource_metadata]).execute():
+        if not row['resource_metadata']:
+            continue
+        rmeta = json.loads(row['resource_metadata'])
+        for key, v in utils.dict_to_keyval(rmeta):
+            t_name = _meta_table_for(v)
+            if t_name is not None:
+                meta_tables[t_name].insert().values(
+                    id=row['id'], meta_key=key, value=v).execute()
+
+
+def downgrade(migrate_engine):
+    meta.bind = migrate_engine
+    for t_name, t_type, indexed_value in tables:
+        Table(t_name, meta, autoload=True).drop()
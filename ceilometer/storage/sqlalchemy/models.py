@@ -23,7 +23,7 @@ import urlparse
 
 from oslo.config import cfg
 from sqlalchemy import Column, Integer, String, Table, ForeignKey, DateTime, \
-    Float
+    Float, Boolean, BigInteger, Text, Index
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import relationship
 from sqlalchemy.types import TypeDecorator, VARCHAR
@@ -75,6 +75,16 @@ class CeilometerBase(object):
         return getattr(self, key)
 
 
+def meta_table_args(*indexes):
+    """Return the __table_args__ of a metadata table, mixing its indexes
+    with the engine specific settings returned by table_args().
+    """
+    args = table_args()
+    if args:
+        return indexes + (args,)
+    return indexes
+
+
 Base = declarative_base(cls=CeilometerBase)
 
 
@@ -115,6 +125,64 @@ class Meter(Base):
     message_id = Column(String)
 
 
+class MetaText(Base):
+    """Metering text metadata."""
+
+    __tablename__ = 'metadata_text'
+    __table_args__ = meta_table_args(
+        Index('ix_metadata_text_key', 'meta_key'),
+    )
+    id = Column(Integer, ForeignKey('meter.id'), primary_key=True)
+    meta_key = Column(String(255), primary_key=True)
+    value = Column(Text)
+
+
+class MetaBool(Base):
+    """Metering boolean metadata."""
+
+    __tablename__ = 'metadata_bool'
+    __table_args__ = meta_table_args(
+        Index('ix_metadata_bool_key_value', 'meta_key', 'value'),
+    )
+    id = Column(Integer, ForeignKey('meter.id'), primary_key=True)
+    meta_key = Column(String(255), primary_key=True)
+    value = Column(Boolean)
+
+
+class MetaBigInt(Base):
+    """Metering integer metadata."""
+
+    __tablename__ = 'metadata_int'
+    __table_args__ = meta_table_args(
+        Index('ix_metadata_int_key_value', 'meta_key', 'value'),
+    )
+    id = Column(Integer, ForeignKey('meter.id'), primary_key=True)
+    meta_key = Column(String(255), primary_key=True)
+    value = Column(BigInteger)
+
+
+class MetaFloat(Base):
+    """Metering float metadata."""
+
+    __tablename__ = 'metadata_float'
+    __table_args__ = meta_table_args(
+        Index('ix_metadata_float_key_value', 'meta_key', 'value'),
+    )
+    id = Column(Integer, ForeignKey('meter.id'), primary_key=True)
+    meta_key = Column(String(255), primary_key=True)
+    value = Column(Float(53))
+
+
+# Map the Python type of a metadata value to the table indexing it. Values of
+# any other type (e.g. None) are not queryable.
+META_TYPE_MAP = {bool: MetaBool,
+                 str: MetaText,
+                 unicode: MetaText,
+                 int: MetaBigInt,
+                 long: MetaBigInt,
+                 float: MetaFloat}
+
+
 class User(Base):
     __tablename__ = 'user'
     id = Column(String(255), primary_key=True)
@@ -0,0 +1,103 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import calendar
+
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import plugin
+
+LOG = log.getLogger(__name__)
+
+
+class Window(object):
+    """Aggregate of the counters of one (counter, resource) in a window."""
+
+    __slots__ = ('start', 'count', 'total', 'max', 'last')
+
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.total = 0
+        self.max = None
+        self.last = None
+
+    def add(self, counter):
+        self.count += 1
+        self.total += counter.volume
+        if self.max is None or counter.volume > self.max:
+            self.max = counter.volume
+        self.last = counter
+
+    def volume(self, method):
+        if method == 'mean':
+            return self.total / float(self.count)
+        elif method == 'sum':
+            return self.total
+        elif method == 'max':
+            return self.max
+        return self.last.volume
+
+
+class WindowAggregatorTransformer(plugin.TransformerBase):
+    """Transformer that downsamples counters over a time window.
+
+    The counters of each (counter, resource) whose timestamps fall in a
+    window are replaced by a single counter, emitted when the pipeline is
+    flushed after the window closed. The windows are aligned on multiples
+    of their length since the epoch, so that they neither overlap nor
+    drift with the polling. The emitted counter is the last one received,
+    with its volume replaced by the aggregate of the window.
+
+    Parameters:
+
+    - window: length of the window, in seconds.
+    - method: aggregate of the volumes, among mean, max, last and sum.
+    """
+
+    METHODS = ('mean', 'max', 'last', 'sum')
+
+    def __init__(self, window=60, method='last', **kwargs):
+        if method not in self.METHODS:
+            raise ValueError('Unknown aggregation method %s' % method)
+        self.window = window
+        self.method = method
+        self.windows = {}
+        super(WindowAggregatorTransformer, self).__init__(**kwargs)
+
+    def _window_start(self, counter):
+        timestamp = (timeutils.parse_isotime(counter.timestamp)
+                     if counter.timestamp else timeutils.utcnow())
+        ts = calendar.timegm(timestamp.utctimetuple())
+        return ts - ts % self.window
+
+    def handle_sample(self, context, counter, source):
+        start = self._window_start(counter)
+        key = (counter.name, counter.resource_id, start)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = Window(start)
+        window.add(counter)
+
+    def flush(self, context, source):
+        now = timeutils.utcnow_ts()
+        counters = []
+        for key, window in sorted(self.windows.items()):
+            if now >= window.start + self.window:
+                del self.windows[key]
+                LOG.debug('aggregated %d counters of %s for %s',
+                          window.count, key[0], key[1])
+                counters.append(window.last._replace(
+                    volume=window.volume(self.method)))
+        return counters
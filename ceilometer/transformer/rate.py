@@ -0,0 +1,108 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+import collections
+
+from ceilometer import counter as ceilometer_counter
+from ceilometer.openstack.common import log
+from ceilometer.openstack.common import timeutils
+from ceilometer import plugin
+
+LOG = log.getLogger(__name__)
+
+
+class RateOfChangeTransformer(plugin.TransformerBase):
+    """Transformer that derives rate counters from cumulative counters.
+
+    The counters go through unchanged. For each (counter, resource) of
+    cumulative counters, the other types being ignored, the last volume
+    and timestamp seen are kept, and the next counter of the
+    same resource produces a gauge of the increase per second, emitted
+    when the pipeline is flushed. A counter going backwards is assumed to
+    have been reset, e.g. by an instance restart, and to have increased
+    by its current value.
+
+    Parameters:
+
+    - target: dict giving the name and unit of the rate counters, as
+      str.format() patterns applied to the fields of the source counter,
+      and a scale the rate is multiplied by. By default
+      'network.incoming.bytes' in 'B' gives 'network.incoming.bytes.rate'
+      in 'B/s'.
+    - size: maximum number of resources whose last value is kept, the
+      least recently updated ones being evicted first.
+    - ttl: number of seconds after which a resource not seen anymore is
+      forgotten.
+    """
+
+    def __init__(self, target=None, size=10000, ttl=3600, **kwargs):
+        target = target or {}
+        self.target_name = target.get('name', '{name}.rate')
+        self.target_unit = target.get('unit', '{unit}/s')
+        self.scale = float(target.get('scale', 1))
+        self.size = size
+        self.ttl = ttl
+        # (counter name, resource id) -> (seen at, timestamp, volume),
+        # least recently updated first.
+        self.previous = collections.OrderedDict()
+        self.rates = []
+        super(RateOfChangeTransformer, self).__init__(**kwargs)
+
+    def _evict(self, now):
+        while len(self.previous) > self.size:
+            self.previous.popitem(last=False)
+        # Only the stale entries at the front are looked at, items() would
+        # copy the whole dictionary for every counter.
+        while self.previous:
+            seen_at, _timestamp, _volume = self.previous[
+                next(iter(self.previous))]
+            if now - seen_at < self.ttl:
+                break
+            self.previous.popitem(last=False)
+
+    def handle_sample(self, context, counter, source):
+        if counter.type != ceilometer_counter.TYPE_CUMULATIVE:
+            return counter
+        now = timeutils.utcnow_ts()
+        timestamp = (timeutils.parse_isotime(counter.timestamp)
+                     if counter.timestamp else timeutils.utcnow())
+        timestamp = timeutils.normalize_time(timestamp)
+        key = (counter.name, counter.resource_id)
+        prev = self.previous.pop(key, None)
+        self.previous[key] = (now, timestamp, counter.volume)
+        self._evict(now)
+
+        if prev is not None:
+            _seen_at, prev_timestamp, prev_volume = prev
+            elapsed = timeutils.delta_seconds(prev_timestamp, timestamp)
+            if elapsed > 0:
+                # account for the counter being reset in between
+                increase = (counter.volume - prev_volume
+                            if prev_volume <= counter.volume
+                            else counter.volume)
+                fields = counter._asdict()
+                self.rates.append(counter._replace(
+                    name=self.target_name.format(**fields),
+                    type=ceilometer_counter.TYPE_GAUGE,
+                    unit=self.target_unit.format(**fields),
+                    volume=self.scale * increase / elapsed))
+            else:
+                LOG.debug('ignoring out of order counter %s for %s',
+                          counter.name, counter.resource_id)
+        return counter
+
+    def flush(self, context, source):
+        rates = self.rates
+        self.rates = []
+        return rates
@@ -42,3 +42,44 @@ def read_cached_file(filename, cache_info, reload_func=None):
         if reload_func:
             reload_func(cache_info['data'])
     return cache_info['data']
+
+
+def dict_to_keyval(value, key_base=None):
+    """Expand a given dict to its corresponding key-value pairs.
+
+    Generated keys are fully qualified, delimited using dot notation, the
+    same way MongoDB addresses fields of embedded documents, e.g.
+    'key.child_key.grandchild_key[0]'.
+    """
+    if isinstance(value, dict):
+        items = ((key_base + '.' + k if key_base else k, v)
+                 for k, v in value.iteritems())
+    elif isinstance(value, (tuple, list)):
+        items = ((key_base + '[%d]' % i, v)
+                 for i, v in enumerate(value))
+    else:
+        return
+
+    for key, v in items:
+        if isinstance(v, (dict, tuple, list)):
+            for subkey, subvalue in dict_to_keyval(v, key):
+                yield subkey, subvalue
+        else:
+            yield key, v
+
+
+class FrozenDict(dict):
+    """Dictionary that can not be modified once built.
+
+    It is used to share a dictionary, e.g. the resource metadata of an
+    instance, between counters without copying it.
+    """
+
+    def _immutable(self, *args, **kwargs):
+        raise TypeError('%s is immutable' % self.__class__.__name__)
+
+    __setitem__ = __delitem__ = _immutable
+    clear = pop = popitem = setdefault = update = _immutable
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),)
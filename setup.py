@@ -133,11 +133,17 @@ setuptools.setup(
     sqlite = ceilometer.storage.impl_sqlalchemy:SQLAlchemyStorage
     hbase = ceilometer.storage.impl_hbase:HBaseStorage
 
+    [ceilometer.api.result_cache]
+    memory = ceilometer.api.result_cache:MemoryBackend
+    memcached = ceilometer.api.result_cache:MemcachedBackend
+
     [ceilometer.compute.virt]
     libvirt = ceilometer.compute.virt.libvirt.inspector:LibvirtInspector
 
     [ceilometer.transformer]
     accumulator = ceilometer.transformer.accumulator:TransformerAccumulator
+    rate_of_change = ceilometer.transformer.rate:RateOfChangeTransformer
+    aggregator = ceilometer.transformer.aggregator:WindowAggregatorTransformer
 
     [ceilometer.publisher]
     meter_publisher = ceilometer.publisher.meter_publish:MeterPublisher
@@ -21,10 +21,12 @@ import abc
 import datetime
 import mock
 
+from oslo.config import cfg
 from stevedore import extension
 from stevedore import dispatch
 from stevedore.tests import manager as extension_tests
 
+from ceilometer import agent
 from ceilometer import counter
 from ceilometer import pipeline
 from ceilometer.tests import base
@@ -50,13 +52,14 @@ class TestPollster:
     def get_counter_names(self):
         return [self.test_data.name]
 
-    def get_counters(self, manager, instance=None):
+    def get_counters(self, manager, instance=None, counter_names=None):
         self.counters.append((manager, instance))
+        self.counter_names = counter_names
         return [self.test_data]
 
 
 class TestPollsterException(TestPollster):
-    def get_counters(self, manager, instance=None):
+    def get_counters(self, manager, instance=None, counter_names=None):
         # Put an instance parameter here so that it can be used
         # by both central manager and compute manager
         # In future, we possibly don't need such hack if we
@@ -177,7 +180,7 @@ class BaseAgentManagerTestCase(base.TestCase):
         self.pipeline_cfg.append({
             'name': "test_pipeline",
             'interval': 10,
-            'counters': ['test'],
+            'counters': ['testanother'],
             'transformers': [],
             'publishers': ["test_pub"],
         })
@@ -187,6 +190,88 @@ class BaseAgentManagerTestCase(base.TestCase):
         self.assertTrue(60 in polling_tasks.keys())
         self.assertTrue(10 in polling_tasks.keys())
 
+    def test_setup_polling_tasks_pollster_interval(self):
+        self.pipeline_cfg.append({
+            'name': "test_pipeline_40",
+            'interval': 40,
+            'counters': ['test'],
+            'transformers': [],
+            'publishers': ["test_pub"],
+        })
+        self.setup_pipeline()
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.assertEqual(polling_tasks.keys(), [20])
+        task = polling_tasks[20]
+        self.assertEqual(len(task.pipelines), 2)
+
+        # The pipelines only receive the counters of their own interval.
+        published = []
+        for _i in range(6):
+            self.mgr.interval_task(task)
+            published.append(len(self.publisher.counters))
+        self.assertEqual(published, [2, 2, 3, 4, 5, 5])
+        self.assertEqual(len(self.Pollster.counters), 4)
+
+    def test_counter_names(self):
+        polling_tasks = self.mgr.setup_polling_tasks()
+        task = polling_tasks[60]
+        self.assertEqual(task.counter_names.values(), [set(['test'])])
+        self.mgr.interval_task(task)
+        pollster = list(task.pollsters)[0].obj
+        self.assertEqual(pollster.counter_names, set(['test']))
+
+    def test_pollster_not_due_skipped(self):
+        self.pipeline_cfg.extend([{
+            'name': "test_pipeline_40",
+            'interval': 40,
+            'counters': ['test'],
+            'transformers': [],
+            'publishers': ["test_pub"],
+        }, {
+            'name': "test_pipeline_20",
+            'interval': 20,
+            'counters': ['testanother'],
+            'transformers': [],
+            'publishers': ["test_pub"],
+        }])
+        self.setup_pipeline()
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.assertEqual(polling_tasks.keys(), [20])
+        self.mgr.interval_task(polling_tasks[20])
+        self.mgr.interval_task(polling_tasks[20])
+        self.assertEqual(len(self.Pollster.counters), 1)
+        self.assertEqual(len(self.PollsterAnother.counters), 2)
+
+    def test_initial_delay(self):
+        self.assertEqual(self.mgr.initial_delay(60),
+                         agent.phase_offset(cfg.CONF.host, 60))
+        self.assertTrue(0 <= self.mgr.initial_delay(60) < 60)
+        self.assertNotEqual(agent.phase_offset('host-1', 3600),
+                            agent.phase_offset('host-2', 3600))
+
+    def test_initial_delay_jitter(self):
+        cfg.CONF.set_override('polling_phase_offset', False)
+        self.addCleanup(cfg.CONF.clear_override, 'polling_phase_offset')
+        self.assertEqual(self.mgr.initial_delay(60), 0)
+        cfg.CONF.set_override('polling_jitter', 10)
+        self.addCleanup(cfg.CONF.clear_override, 'polling_jitter')
+        self.assertTrue(0 <= self.mgr.initial_delay(60) <= 10)
+
+    def test_initialize_service_hook(self):
+        service = mock.MagicMock()
+        self.mgr.initialize_service_hook(service)
+        service.tg.add_timer.assert_called_once_with(
+            60, self.mgr.interval_task,
+            initial_delay=self.mgr.initial_delay(60),
+            task=mock.ANY)
+
+    def test_polling_semaphore(self):
+        self.mgr.polling_semaphore = mock.MagicMock()
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.mgr.interval_task(polling_tasks[60])
+        self.assertEqual(self.mgr.polling_semaphore.__enter__.call_count, 1)
+        self.assertEqual(self.mgr.polling_semaphore.__exit__.call_count, 1)
+
     def test_setup_polling_tasks_mismatch_counter(self):
         self.pipeline_cfg.append(
             {
@@ -86,6 +86,12 @@ class TestListUsers(tests_api.TestBase):
         data = self.get('/users')
         self.assertEquals(['user-id', 'user-id2'], data['users'])
 
+    def test_users_paginated(self):
+        data = self.get('/users', limit=1)
+        self.assertEquals(['user-id'], data['users'])
+        data = self.get('/users', limit=1, marker='user-id')
+        self.assertEquals(['user-id2'], data['users'])
+
     def test_users_non_admin(self):
         data = self.get('/users',
                         headers={"X-Roles": "Member",
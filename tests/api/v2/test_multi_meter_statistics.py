@@ -0,0 +1,86 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Test the statistics of several meters at once.
+"""
+
+import datetime
+
+from oslo.config import cfg
+
+from ceilometer.collector import meter
+from ceilometer import counter
+
+from .base import FunctionalTest
+from ceilometer.storage.impl_mongodb import require_map_reduce
+
+
+class TestMultiMeterStatistics(FunctionalTest):
+
+    PATH = '/statistics'
+
+    def setUp(self):
+        super(TestMultiMeterStatistics, self).setUp()
+        require_map_reduce(self.conn)
+
+        for name, volume, resource in (('cpu_util', 10, 'resource-1'),
+                                       ('cpu_util', 30, 'resource-1'),
+                                       ('cpu_util', 50, 'resource-2'),
+                                       ('disk.read.bytes', 1000,
+                                        'resource-1'),
+                                       ('network.incoming.bytes', 5,
+                                        'resource-1')):
+            c = counter.Counter(
+                name,
+                'gauge',
+                'B',
+                volume,
+                'user-id',
+                'project-id',
+                resource,
+                timestamp=datetime.datetime(2013, 3, 1, 11, 0),
+                resource_metadata={},
+            )
+            msg = meter.meter_message_from_counter(c,
+                                                   cfg.CONF.metering_secret,
+                                                   'source1',
+                                                   )
+            self.conn.record_metering_data(msg)
+
+    def test_by_meter(self):
+        data = self.get_json(self.PATH,
+                             meter=['cpu_util', 'disk.read.bytes'])
+        results = dict((d['groupby']['counter_name'], d) for d in data)
+        self.assertEqual(sorted(results), ['cpu_util', 'disk.read.bytes'])
+        self.assertEqual(results['cpu_util']['count'], 3)
+        self.assertEqual(results['cpu_util']['avg'], 30)
+        self.assertEqual(results['disk.read.bytes']['sum'], 1000)
+
+    def test_groupby_resource(self):
+        data = self.get_json(self.PATH,
+                             meter=['cpu_util', 'disk.read.bytes'],
+                             groupby=['resource_id'])
+        results = dict(((d['groupby']['counter_name'],
+                         d['groupby']['resource_id']), d['sum'])
+                       for d in data)
+        self.assertEqual(results,
+                         {('cpu_util', 'resource-1'): 40,
+                          ('cpu_util', 'resource-2'): 50,
+                          ('disk.read.bytes', 'resource-1'): 1000})
+
+    def test_invalid_groupby(self):
+        data = self.get_json(self.PATH,
+                             meter=['cpu_util'],
+                             groupby=['counter_volume'],
+                             expect_errors=True)
+        self.assertEqual(data.status_int, 400)
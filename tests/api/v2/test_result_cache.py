@@ -0,0 +1,368 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Test the API statistics result cache.
+"""
+
+import datetime
+import sys
+
+import mock
+from oslo.config import cfg
+
+from ceilometer.api import result_cache
+from ceilometer.openstack.common import timeutils
+from ceilometer import storage
+from ceilometer.storage import models
+from ceilometer.tests import base as test_base
+
+from .base import FunctionalTest
+
+
+class FakeMemcacheClient(object):
+
+    def __init__(self, servers):
+        self.servers = servers
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, time=0):
+        self.data[key] = (value, time)
+        return True
+
+
+class TestAlign(test_base.TestCase):
+
+    def test_align_down(self):
+        self.assertEqual(
+            result_cache.align(datetime.datetime(2013, 3, 1, 11, 23, 12),
+                               900),
+            datetime.datetime(2013, 3, 1, 11, 15))
+
+    def test_align_up(self):
+        self.assertEqual(
+            result_cache.align(datetime.datetime(2013, 3, 1, 11, 23, 12),
+                               900, up=True),
+            datetime.datetime(2013, 3, 1, 11, 30))
+
+    def test_aligned(self):
+        t = datetime.datetime(2013, 3, 1, 11, 30)
+        self.assertEqual(result_cache.align(t, 900), t)
+        self.assertEqual(result_cache.align(t, 900, up=True), t)
+
+
+class TestMemoryBackend(test_base.TestCase):
+
+    def setUp(self):
+        super(TestMemoryBackend, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        self.backend = result_cache.MemoryBackend('memory://?size=2')
+
+    def test_size(self):
+        self.assertEqual(self.backend.size, 2)
+        self.assertEqual(result_cache.MemoryBackend('memory://').size,
+                         result_cache.MemoryBackend.DEFAULT_SIZE)
+
+    def test_get_set(self):
+        self.assertEqual(self.backend.get('a'), None)
+        self.backend.set('a', [1], 10)
+        self.assertEqual(self.backend.get('a'), [1])
+
+    def test_expire(self):
+        self.backend.set('a', [1], 10)
+        timeutils.advance_time_seconds(10)
+        self.assertEqual(self.backend.get('a'), None)
+
+    def test_evict_least_recently_used(self):
+        self.backend.set('a', 1, 10)
+        self.backend.set('b', 2, 10)
+        self.backend.get('a')
+        self.backend.set('c', 3, 10)
+        self.assertEqual(self.backend.get('a'), 1)
+        self.assertEqual(self.backend.get('b'), None)
+        self.assertEqual(self.backend.get('c'), 3)
+
+
+class TestMemcachedBackend(test_base.TestCase):
+
+    def setUp(self):
+        super(TestMemcachedBackend, self).setUp()
+        fake = mock.Mock(Client=FakeMemcacheClient)
+        patcher = mock.patch.dict(sys.modules, {'memcache': fake})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_servers(self):
+        backend = result_cache.MemcachedBackend(
+            'memcached://host1:11211,host2:11211')
+        self.assertEqual(backend.client.servers,
+                         ['host1:11211', 'host2:11211'])
+
+    def test_get_set(self):
+        backend = result_cache.MemcachedBackend('memcached://host1:11211')
+        backend.set('a', [1], 10)
+        self.assertEqual(backend.client.data['a'], ([1], 10))
+
+
+class TestResultCache(test_base.TestCase):
+
+    def setUp(self):
+        super(TestResultCache, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 10))
+        self.addCleanup(timeutils.clear_time_override)
+        self.cache = result_cache.ResultCache(
+            result_cache.MemoryBackend('memory://'), 60, 3600)
+
+    @staticmethod
+    def _filter(**kwargs):
+        return storage.EventFilter(meter='cpu_util', **kwargs)
+
+    def test_on_grid(self):
+        f = self._filter(start=datetime.datetime(2013, 3, 1, 11, 0),
+                         end=datetime.datetime(2013, 3, 1, 12, 10))
+        self.assertTrue(self.cache.on_grid(f, 600))
+        self.assertTrue(self.cache.on_grid(self._filter(), 600))
+
+    def test_not_on_grid(self):
+        f = self._filter(start=datetime.datetime(2013, 3, 1, 11, 3))
+        self.assertFalse(self.cache.on_grid(f, 600))
+        f = self._filter(end=datetime.datetime(2013, 3, 1, 12, 3))
+        self.assertFalse(self.cache.on_grid(f, 600))
+
+    def test_key_normalised(self):
+        self.assertEqual(
+            self.cache.key(self._filter(metaquery={'metadata.a': '1',
+                                                   'metadata.b': '2'}),
+                           None),
+            self.cache.key(self._filter(metaquery={'metadata.b': '2',
+                                                   'metadata.a': '1'}),
+                           0))
+
+    def test_key_differs(self):
+        self.assertNotEqual(self.cache.key(self._filter(), 60),
+                            self.cache.key(self._filter(), 120))
+        self.assertNotEqual(self.cache.key(self._filter(), None),
+                            self.cache.key(self._filter(resource='r'), None))
+
+    def test_key_groupby(self):
+        self.assertNotEqual(self.cache.key(self._filter(), None),
+                            self.cache.key(self._filter(), None,
+                                           ['project_id']))
+        self.assertEqual(self.cache.key(self._filter(), None,
+                                        ['project_id', 'user_id']),
+                         self.cache.key(self._filter(), None,
+                                        ['user_id', 'project_id']))
+
+    def test_key_deltas(self):
+        self.assertNotEqual(self.cache.key(self._filter(), None),
+                            self.cache.key(self._filter(), None,
+                                           deltas=True))
+
+    def test_ttl_history(self):
+        f = self._filter(start=datetime.datetime(2013, 3, 1, 10, 0),
+                         end=datetime.datetime(2013, 3, 1, 12, 0))
+        self.assertEqual(self.cache.ttl_for(f, 600), 3600)
+        self.assertEqual(self.cache.ttl_for(f, None), 3600)
+
+    def test_ttl_open(self):
+        f = self._filter(start=datetime.datetime(2013, 3, 1, 10, 0))
+        self.assertEqual(self.cache.ttl_for(f, None), 60)
+        self.assertEqual(self.cache.ttl_for(f, 600), 60)
+
+    def test_ttl_open_period_closing(self):
+        timeutils.advance_time_seconds(590)
+        f = self._filter(start=datetime.datetime(2013, 3, 1, 10, 0))
+        self.assertEqual(self.cache.ttl_for(f, 600), 10)
+
+    def test_hits_and_misses(self):
+        f = self._filter()
+        self.assertEqual(self.cache.get(f, None), None)
+        self.cache.set(f, None, [])
+        self.assertEqual(self.cache.get(f, None), [])
+        self.assertEqual(self.cache.hits, 1)
+        self.assertEqual(self.cache.misses, 1)
+
+
+class TestResultCacheSplit(test_base.TestCase):
+
+    def setUp(self):
+        super(TestResultCacheSplit, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 10))
+        self.addCleanup(timeutils.clear_time_override)
+        self.cache = result_cache.ResultCache(
+            result_cache.MemoryBackend('memory://'), 60, 3600)
+        self.calls = []
+
+    def _compute(self, event_filter, period):
+        """Compute one statistics per period, as the storage drivers."""
+        self.calls.append((event_filter.start, event_filter.end))
+        end = event_filter.end or timeutils.utcnow()
+        statistics = []
+        start = event_filter.start
+        while start < end:
+            period_end = start + datetime.timedelta(seconds=period or 0)
+            statistics.append(models.Statistics(
+                min=1, max=1, avg=1, sum=1, count=1,
+                period=period or 0,
+                period_start=start, period_end=period_end,
+                duration=0, duration_start=start, duration_end=start))
+            if not period:
+                break
+            start = period_end
+        return statistics
+
+    def _get(self, period=600, **kwargs):
+        f = storage.EventFilter(meter='cpu_util', **kwargs)
+        return self.cache.get_meter_statistics(self._compute, f, period)
+
+    def test_split_on_grid(self):
+        stats = self._get(start=datetime.datetime(2013, 3, 1, 11, 3))
+        self.assertEqual(self.calls,
+                         [(datetime.datetime(2013, 3, 1, 11, 3),
+                           datetime.datetime(2013, 3, 1, 11, 10)),
+                          (datetime.datetime(2013, 3, 1, 11, 10),
+                           datetime.datetime(2013, 3, 1, 12, 10)),
+                          (datetime.datetime(2013, 3, 1, 12, 10), None)])
+        self.assertEqual([s.period_start.strftime('%H:%M') for s in stats],
+                         ['11:03', '11:10', '11:20', '11:30', '11:40',
+                          '11:50', '12:00'])
+        self.assertEqual(stats[0].period_end,
+                         datetime.datetime(2013, 3, 1, 11, 10))
+        self.assertEqual(stats[0].period, 420)
+
+    def test_sliding_window_hits(self):
+        self._get(start=datetime.datetime(2013, 3, 1, 11, 3))
+        del self.calls[:]
+        timeutils.advance_time_seconds(30)
+        self._get(start=datetime.datetime(2013, 3, 1, 11, 3, 30, 12))
+        # Only the edges are computed again.
+        self.assertEqual(self.calls,
+                         [(datetime.datetime(2013, 3, 1, 11, 3, 30, 12),
+                           datetime.datetime(2013, 3, 1, 11, 10)),
+                          (datetime.datetime(2013, 3, 1, 12, 10), None)])
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'bypassed': 0})
+
+    def test_closed_period_misses(self):
+        self._get(start=datetime.datetime(2013, 3, 1, 11, 3))
+        timeutils.advance_time_seconds(600)
+        self._get(start=datetime.datetime(2013, 3, 1, 11, 13))
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 0, 'misses': 2, 'bypassed': 0})
+
+    def test_no_closed_period(self):
+        self._get(start=datetime.datetime(2013, 3, 1, 12, 3))
+        self.assertEqual(self.calls,
+                         [(datetime.datetime(2013, 3, 1, 12, 3), None)])
+        self.assertEqual(self.cache.stats()['bypassed'], 1)
+
+    def test_unaligned_without_period_not_cached(self):
+        start = datetime.datetime(2013, 3, 1, 11, 3, 5, 12)
+        self._get(period=None, start=start)
+        self._get(period=None, start=start)
+        self.assertEqual(len(self.calls), 2)
+        self.assertEqual(self.cache.backend.entries, {})
+        self.assertEqual(self.cache.stats()['bypassed'], 2)
+
+    def test_aligned_without_period_cached(self):
+        start = datetime.datetime(2013, 3, 1, 11, 3)
+        self._get(period=None, start=start)
+        self._get(period=None, start=start)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(self.cache.stats(),
+                         {'hits': 1, 'misses': 1, 'bypassed': 0})
+
+
+class TestResultCacheConfig(test_base.TestCase):
+
+    def test_disabled_by_default(self):
+        self.assertEqual(result_cache.get_result_cache(cfg.CONF), None)
+
+    def test_load_backend(self):
+        cfg.CONF.set_override('api_result_cache_url', 'memory://?size=5')
+        self.addCleanup(cfg.CONF.clear_override, 'api_result_cache_url')
+        cache = result_cache.get_result_cache(cfg.CONF)
+        self.assertTrue(isinstance(cache.backend,
+                                   result_cache.MemoryBackend))
+        self.assertEqual(cache.backend.size, 5)
+        self.assertEqual(cache.ttl, cfg.CONF.api_result_cache_ttl)
+
+
+class TestStatisticsResultCache(FunctionalTest):
+
+    PATH = '/meters/cpu_util/statistics'
+
+    def setUp(self):
+        cfg.CONF.set_override('api_result_cache_url', 'memory://')
+        self.addCleanup(cfg.CONF.clear_override, 'api_result_cache_url')
+        super(TestStatisticsResultCache, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 10))
+        self.addCleanup(timeutils.clear_time_override)
+        self.filters = []
+        self.stubs.Set(self.conn, 'get_meter_statistics',
+                       self._get_meter_statistics)
+        self.stubs.Set(storage, 'get_connection', lambda conf: self.conn)
+
+    def _get_meter_statistics(self, event_filter, period=None, groupby=None,
+                              deltas=False):
+        self.filters.append(event_filter)
+        # The periods start with the query, as in the storage drivers.
+        end = event_filter.start + datetime.timedelta(seconds=period)
+        return [models.Statistics(min=1, max=1, avg=1, sum=1, count=1,
+                                  period=period,
+                                  period_start=event_filter.start,
+                                  period_end=end,
+                                  duration=period,
+                                  duration_start=event_filter.start,
+                                  duration_end=end)]
+
+    def _get(self, start):
+        return self.get_json(self.PATH,
+                             q=[{'field': 'resource_id',
+                                 'value': 'resource-id'},
+                                {'field': 'timestamp',
+                                 'op': 'ge',
+                                 'value': start}],
+                             period=600)
+
+    def test_sliding_window_hits(self):
+        self._get('2013-03-01T11:03:00')
+        self._get('2013-03-01T11:07:00')
+        self.assertEqual([(f.start, f.end) for f in self.filters],
+                         [(datetime.datetime(2013, 3, 1, 11, 3),
+                           datetime.datetime(2013, 3, 1, 11, 10)),
+                          (datetime.datetime(2013, 3, 1, 11, 10),
+                           datetime.datetime(2013, 3, 1, 12, 10)),
+                          (datetime.datetime(2013, 3, 1, 12, 10), None),
+                          (datetime.datetime(2013, 3, 1, 11, 7),
+                           datetime.datetime(2013, 3, 1, 11, 10)),
+                          (datetime.datetime(2013, 3, 1, 12, 10), None)])
+
+    def test_unaligned_start_kept(self):
+        stats = self._get('2013-03-01T11:03:00')
+        self.assertEqual(stats[0]['period_start'], '2013-03-01T11:03:00')
+        self.assertEqual(stats[0]['period_end'], '2013-03-01T11:10:00')
+        self.assertEqual(stats[1]['period_start'], '2013-03-01T11:10:00')
+
+    def test_counters_in_headers(self):
+        self._get('2013-03-01T11:03:00')
+        response = self.app.get(self.PATH_PREFIX + self.PATH,
+                                params={'q.field': 'timestamp',
+                                        'q.op': 'ge',
+                                        'q.value': '2013-03-01T11:03:00',
+                                        'period': 600})
+        self.assertEqual(response.headers['X-Result-Cache-Hits'], '1')
+        self.assertEqual(response.headers['X-Result-Cache-Misses'], '1')
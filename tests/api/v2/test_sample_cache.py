@@ -0,0 +1,341 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Test the API sample cache.
+"""
+
+import datetime
+import threading
+import time
+
+import nose
+from oslo.config import cfg
+
+from ceilometer.api import sample_cache
+from ceilometer.collector import meter
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer import storage
+from ceilometer.tests import base as test_base
+from ceilometer.tests import db as db_test_base
+
+from .base import FunctionalTest
+
+
+def _require_numpy():
+    if sample_cache.numpy is None:
+        raise nose.SkipTest('requires NumPy')
+
+
+def _record(conn, volume, timestamp, resource='resource-id'):
+    c = counter.Counter('cpu_util', 'gauge', '%', volume,
+                        'user-id', 'project-id', resource,
+                        timestamp=timestamp,
+                        resource_metadata={})
+    msg = meter.meter_message_from_counter(c,
+                                           cfg.CONF.metering_secret,
+                                           'source1')
+    conn.record_metering_data(msg)
+
+
+class FakeSample(object):
+
+    def __init__(self, timestamp, counter_volume):
+        self.timestamp = timestamp
+        self.counter_volume = counter_volume
+
+
+class TestRingBuffer(test_base.TestCase):
+
+    def setUp(self):
+        super(TestRingBuffer, self).setUp()
+        _require_numpy()
+
+    def test_append(self):
+        b = sample_cache.RingBuffer(3)
+        b.append(1, 1.5)
+        b.append(2, 2.5)
+        timestamps, volumes = b.arrays()
+        self.assertEqual(list(timestamps), [1, 2])
+        self.assertEqual(list(volumes), [1.5, 2.5])
+        self.assertFalse(b.full)
+
+    def test_overwrite_oldest(self):
+        b = sample_cache.RingBuffer(3)
+        for i in range(5):
+            b.append(i, i * 10)
+        timestamps, volumes = b.arrays()
+        self.assertTrue(b.full)
+        self.assertEqual(list(timestamps), [2, 3, 4])
+        self.assertEqual(list(volumes), [20, 30, 40])
+
+    def test_clear(self):
+        b = sample_cache.RingBuffer(3)
+        b.append(1, 1)
+        b.clear()
+        self.assertEqual(len(b.arrays()[0]), 0)
+
+
+class TestSeries(test_base.TestCase):
+
+    def setUp(self):
+        super(TestSeries, self).setUp()
+        _require_numpy()
+        self.start = datetime.datetime(2013, 3, 1, 10, 0)
+        self.series = sample_cache.Series(100)
+        self.series.fill(
+            [FakeSample(self.start + datetime.timedelta(minutes=10 * i), i)
+             for i in reversed(range(12))],
+            self.start, self.start + datetime.timedelta(hours=2))
+
+    def test_covers(self):
+        self.assertTrue(self.series.covers(self.start))
+        self.assertFalse(self.series.covers(
+            self.start - datetime.timedelta(seconds=1)))
+        self.assertFalse(self.series.covers(None))
+
+    def test_covers_after_overwrite(self):
+        series = sample_cache.Series(2)
+        series.fill([FakeSample(self.start, 1),
+                     FakeSample(self.start + datetime.timedelta(minutes=1),
+                                2),
+                     FakeSample(self.start + datetime.timedelta(minutes=2),
+                                3)],
+                    self.start, self.start + datetime.timedelta(hours=1))
+        self.assertFalse(series.covers(
+            self.start + datetime.timedelta(minutes=1)))
+        self.assertTrue(series.covers(
+            self.start + datetime.timedelta(minutes=2)))
+
+    def test_statistics(self):
+        stats = self.series.statistics(self.start, None, None)
+        self.assertEqual(len(stats), 1)
+        s = stats[0]
+        self.assertEqual(s.min, 0)
+        self.assertEqual(s.max, 11)
+        self.assertEqual(s.sum, 66)
+        self.assertEqual(s.avg, 5.5)
+        self.assertEqual(s.count, 12)
+        self.assertEqual(s.duration_start, self.start)
+        self.assertEqual(s.duration_end,
+                         self.start + datetime.timedelta(minutes=110))
+        self.assertEqual(s.duration, 110 * 60)
+        self.assertEqual(s.period, 0)
+
+    def test_statistics_end_excluded(self):
+        stats = self.series.statistics(
+            self.start + datetime.timedelta(minutes=20),
+            self.start + datetime.timedelta(minutes=50),
+            None)
+        self.assertEqual(stats[0].count, 3)
+        self.assertEqual(stats[0].min, 2)
+        self.assertEqual(stats[0].max, 4)
+
+    def test_statistics_period(self):
+        stats = self.series.statistics(
+            self.start + datetime.timedelta(minutes=5), None, 1800)
+        self.assertEqual([s.count for s in stats], [3, 3, 3, 2])
+        self.assertEqual([s.sum for s in stats], [6, 15, 24, 21])
+        self.assertEqual(stats[0].period, 1800)
+        self.assertEqual(stats[0].period_start,
+                         self.start + datetime.timedelta(minutes=5))
+        self.assertEqual(stats[0].period_end,
+                         self.start + datetime.timedelta(minutes=35))
+        self.assertEqual(stats[3].period_start,
+                         self.start + datetime.timedelta(minutes=95))
+
+    def test_statistics_period_skips_empty(self):
+        series = sample_cache.Series(10)
+        series.fill([FakeSample(self.start, 1),
+                     FakeSample(self.start + datetime.timedelta(hours=3),
+                                2)],
+                    self.start, self.start + datetime.timedelta(hours=4))
+        stats = series.statistics(self.start, None, 3600)
+        self.assertEqual([s.period_start for s in stats],
+                         [self.start,
+                          self.start + datetime.timedelta(hours=3)])
+
+    def test_statistics_empty(self):
+        self.assertEqual(self.series.statistics(
+            self.start + datetime.timedelta(hours=3), None, None), None)
+
+
+class TestSampleCacheConfig(test_base.TestCase):
+
+    def test_disabled_by_default(self):
+        self.assertEqual(sample_cache.get_sample_cache(cfg.CONF), None)
+
+    def test_disabled_without_numpy(self):
+        cfg.CONF.set_override('api_sample_cache_size', 10)
+        self.addCleanup(cfg.CONF.clear_override, 'api_sample_cache_size')
+        self.stubs.Set(sample_cache, 'numpy', None)
+        self.assertEqual(sample_cache.get_sample_cache(cfg.CONF), None)
+
+
+class TestSampleCache(db_test_base.TestBase):
+
+    def setUp(self):
+        super(TestSampleCache, self).setUp()
+        _require_numpy()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        for i in range(6):
+            _record(self.conn, 10 + i * 10,
+                    datetime.datetime(2013, 3, 1, 11, 10 + 5 * i))
+        self.get_samples_calls = 0
+        self.real_get_samples = self.conn.get_samples
+        self.stubs.Set(self.conn, 'get_samples', self._get_samples)
+        self.cache = sample_cache.SampleCache(100, 10, 3600, 60)
+
+    def _get_samples(self, event_filter):
+        self.get_samples_calls += 1
+        return self.real_get_samples(event_filter)
+
+    def _stats(self, start, resource='resource-id', **kwargs):
+        f = storage.EventFilter(meter='cpu_util',
+                                resource=resource,
+                                start=start,
+                                **kwargs)
+        return self.cache.get_meter_statistics(self.conn, f)
+
+    def test_read_through(self):
+        stats = self._stats(datetime.datetime(2013, 3, 1, 11, 20))
+        self.assertEqual(stats[0].count, 4)
+        self.assertEqual(stats[0].sum, 180)
+        self.assertEqual(self.get_samples_calls, 1)
+
+    def test_reuse_until_expired(self):
+        start = datetime.datetime(2013, 3, 1, 11, 20)
+        self._stats(start)
+        _record(self.conn, 100, datetime.datetime(2013, 3, 1, 11, 50))
+        self.assertEqual(self._stats(start)[0].count, 4)
+        self.assertEqual(self.get_samples_calls, 1)
+        timeutils.advance_time_seconds(60)
+        self.assertEqual(self._stats(start)[0].count, 5)
+        self.assertEqual(self.get_samples_calls, 2)
+
+    def test_range_not_covered(self):
+        self.assertEqual(self._stats(datetime.datetime(2013, 3, 1, 10, 0)),
+                         None)
+
+    def test_start_before_window_not_loaded(self):
+        self.assertEqual(self._stats(datetime.datetime(2013, 2, 28, 12, 0)),
+                         None)
+        self.assertEqual(self.get_samples_calls, 0)
+
+    def test_not_cacheable(self):
+        self.assertEqual(self._stats(datetime.datetime(2013, 3, 1, 11, 20),
+                                     project='project-id'),
+                         None)
+        self.assertEqual(self._stats(None), None)
+        self.assertEqual(self.get_samples_calls, 0)
+
+    def test_series_evicted(self):
+        self.cache.max_series = 1
+        _record(self.conn, 1, datetime.datetime(2013, 3, 1, 11, 30), 'other')
+        start = datetime.datetime(2013, 3, 1, 11, 20)
+        self._stats(start)
+        self._stats(start, 'other')
+        self._stats(start)
+        self.assertEqual(self.get_samples_calls, 3)
+
+
+class SlowConnection(object):
+
+    def __init__(self, samples):
+        self.samples = samples
+        self.get_samples_calls = 0
+
+    def get_samples(self, event_filter):
+        self.get_samples_calls += 1
+        # Leave the other requests the time to miss too.
+        time.sleep(0.1)
+        return self.samples
+
+
+class TestSampleCacheConcurrency(test_base.TestCase):
+
+    def setUp(self):
+        super(TestSampleCacheConcurrency, self).setUp()
+        _require_numpy()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        self.conn = SlowConnection(
+            [FakeSample(datetime.datetime(2013, 3, 1, 11, 10 + 5 * i),
+                        10 + i * 10)
+             for i in range(6)])
+        self.cache = sample_cache.SampleCache(100, 10, 3600, 60)
+
+    def test_concurrent_misses_load_once(self):
+        f = storage.EventFilter(meter='cpu_util',
+                                resource='resource-id',
+                                start=datetime.datetime(2013, 3, 1, 11, 20))
+        results = []
+        threads = [threading.Thread(
+            target=lambda: results.append(
+                self.cache.get_meter_statistics(self.conn, f)))
+            for i in range(2)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(self.conn.get_samples_calls, 1)
+        self.assertEqual([stats[0].count for stats in results], [4, 4])
+
+
+class TestSampleCacheStatistics(FunctionalTest):
+
+    PATH = '/meters/cpu_util/statistics'
+
+    def setUp(self):
+        _require_numpy()
+        cfg.CONF.set_override('api_sample_cache_size', 100)
+        self.addCleanup(cfg.CONF.clear_override, 'api_sample_cache_size')
+        super(TestSampleCacheStatistics, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 12, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        for i in range(6):
+            _record(self.conn, 10 + i * 10,
+                    datetime.datetime(2013, 3, 1, 11, 10 + 5 * i))
+        self.stubs.Set(self.conn, 'get_meter_statistics',
+                       self._get_meter_statistics)
+        self.stubs.Set(storage, 'get_connection', lambda conf: self.conn)
+
+    def _get_meter_statistics(self, event_filter, period=None, groupby=None,
+                              deltas=False):
+        raise AssertionError('statistics not computed from the cache')
+
+    def _query(self, start):
+        return [{'field': 'resource_id', 'value': 'resource-id'},
+                {'field': 'timestamp', 'op': 'ge', 'value': start}]
+
+    def test_statistics_from_cache(self):
+        data = self.get_json(self.PATH, q=self._query('2013-03-01T11:20:00'))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['count'], 4)
+        self.assertEqual(data[0]['min'], 30)
+        self.assertEqual(data[0]['max'], 60)
+        self.assertEqual(data[0]['sum'], 180)
+        self.assertEqual(data[0]['avg'], 45)
+        self.assertEqual(data[0]['duration_start'], '2013-03-01T11:20:00')
+        self.assertEqual(data[0]['duration_end'], '2013-03-01T11:35:00')
+
+    def test_statistics_period_from_cache(self):
+        data = self.get_json(self.PATH,
+                             q=self._query('2013-03-01T11:00:00'),
+                             period=900)
+        self.assertEqual([d['count'] for d in data], [1, 3, 2])
+        self.assertEqual([d['period_start'] for d in data],
+                         ['2013-03-01T11:00:00',
+                          '2013-03-01T11:15:00',
+                          '2013-03-01T11:30:00'])
@@ -0,0 +1,96 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Test grouping the statistics of a meter.
+"""
+
+import datetime
+
+from oslo.config import cfg
+
+from ceilometer.collector import meter
+from ceilometer import counter
+
+from .base import FunctionalTest
+from ceilometer.storage.impl_mongodb import require_map_reduce
+
+
+class TestStatisticsGroupby(FunctionalTest):
+
+    PATH = '/meters/instance/statistics'
+
+    def setUp(self):
+        super(TestStatisticsGroupby, self).setUp()
+        require_map_reduce(self.conn)
+
+        for project, user, day in (('project-1', 'user-1', 1),
+                                   ('project-1', 'user-2', 2),
+                                   ('project-2', 'user-3', 2),
+                                   ('project-3', 'user-3', 3)):
+            c = counter.Counter(
+                'instance',
+                'gauge',
+                'instance',
+                1,
+                user,
+                project,
+                'resource-%s-%s' % (project, day),
+                timestamp=datetime.datetime(2013, 3, day, 12, 0),
+                resource_metadata={},
+            )
+            msg = meter.meter_message_from_counter(c,
+                                                   cfg.CONF.metering_secret,
+                                                   'source1',
+                                                   )
+            self.conn.record_metering_data(msg)
+
+    def test_groupby_project(self):
+        data = self.get_json(self.PATH, groupby=['project_id'])
+        self.assertEqual(
+            dict((d['groupby']['project_id'], d['sum']) for d in data),
+            {'project-1': 2, 'project-2': 1, 'project-3': 1})
+
+    def test_groupby_project_and_user(self):
+        data = self.get_json(self.PATH, groupby=['project_id', 'user_id'])
+        self.assertEqual(len(data), 4)
+        self.assertEqual(
+            set(tuple(sorted(d['groupby'].items())) for d in data),
+            set([(('project_id', 'project-1'), ('user_id', 'user-1')),
+                 (('project_id', 'project-1'), ('user_id', 'user-2')),
+                 (('project_id', 'project-2'), ('user_id', 'user-3')),
+                 (('project_id', 'project-3'), ('user_id', 'user-3'))]))
+
+    def test_groupby_with_period(self):
+        data = self.get_json(self.PATH,
+                             q=[{'field': 'timestamp',
+                                 'op': 'ge',
+                                 'value': '2013-03-01T00:00:00'}],
+                             period=2 * 86400,
+                             groupby=['project_id'])
+        self.assertEqual(
+            sorted((d['period_start'], d['groupby']['project_id'], d['sum'])
+                   for d in data),
+            [('2013-03-01T00:00:00', 'project-1', 2),
+             ('2013-03-01T00:00:00', 'project-2', 1),
+             ('2013-03-03T00:00:00', 'project-3', 1)])
+
+    def test_no_groupby(self):
+        data = self.get_json(self.PATH)
+        self.assertEqual(len(data), 1)
+        self.assertEqual(data[0]['groupby'], None)
+        self.assertEqual(data[0]['sum'], 4)
+
+    def test_invalid_groupby(self):
+        response = self.get_json(self.PATH, groupby=['resource_metadata'],
+                                 expect_errors=True)
+        self.assertEqual(response.status_int, 400)
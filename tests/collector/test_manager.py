@@ -100,6 +100,11 @@ class TestCollectorService(tests_base.TestCase):
         with patch('ceilometer.openstack.common.rpc.create_connection'):
             self.srv.start()
 
+    def test_stop_flushes_storage(self):
+        self.srv.storage_conn = MagicMock()
+        self.srv.stop()
+        self.assertTrue(self.srv.storage_conn.flush.called)
+
     def test_valid_message(self):
         msg = {'counter_name': 'test',
                'resource_id': self.id(),
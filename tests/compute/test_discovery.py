@@ -0,0 +1,127 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/compute/discovery.py
+"""
+
+import datetime
+
+import mock
+from oslo.config import cfg
+
+from ceilometer.compute import discovery
+from ceilometer.compute.virt import inspector as virt_inspector
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+
+
+class TestInstanceDiscovery(base.TestCase):
+
+    def setUp(self):
+        super(TestInstanceDiscovery, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 10, 0))
+        self.addCleanup(timeutils.clear_time_override)
+        self.local = ['uuid-1', 'uuid-2']
+        self.nova = ['uuid-1', 'uuid-2']
+        self.inspector = mock.Mock()
+        self.inspector.inspect_instances.side_effect = lambda: [
+            virt_inspector.Instance(name='instance-%s' % uuid, UUID=uuid)
+            for uuid in self.local]
+        self.nv = mock.Mock()
+        self.nv.instance_get_all_by_host.side_effect = self._nova_instances
+        self.discovery = discovery.InstanceDiscovery(self.inspector,
+                                                     self.nv)
+
+    def _nova_instances(self, host):
+        instances = []
+        for uuid in self.nova:
+            instance = mock.Mock()
+            instance.id = uuid
+            instances.append(instance)
+        return instances
+
+    def _discover(self):
+        return [i.id for i in self.discovery.discover()]
+
+    def _nova_calls(self):
+        return self.nv.instance_get_all_by_host.call_count
+
+    def test_steady_state(self):
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 1)
+
+    def test_new_instance(self):
+        self._discover()
+        self.local.append('uuid-3')
+        self.nova.append('uuid-3')
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2', 'uuid-3'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_domain_unknown_to_nova(self):
+        self._discover()
+        self.local.append('not-nova')
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_domains_unknown_to_nova_on_different_cycles(self):
+        self.local.extend(['not-nova-1', 'not-nova-2'])
+        self._discover()
+        self.local.append('not-nova-3')
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_deleted_instance(self):
+        self._discover()
+        self.local.remove('uuid-2')
+        self.assertEqual(self._discover(), ['uuid-1'])
+        self.assertEqual(self._nova_calls(), 1)
+
+    def test_stopped_instance(self):
+        self.local.remove('uuid-2')
+        self.assertEqual(self._discover(), ['uuid-1'])
+        self.assertEqual(self._discover(), ['uuid-1'])
+        timeutils.advance_time_seconds(cfg.CONF.compute_discovery_ttl)
+        self.assertEqual(self._discover(), ['uuid-1'])
+        self.assertEqual(self._discover(), ['uuid-1'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_domain_unknown_to_nova_on_ttl(self):
+        self.local.append('not-nova')
+        self._discover()
+        timeutils.advance_time_seconds(cfg.CONF.compute_discovery_ttl)
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_ttl(self):
+        self._discover()
+        timeutils.advance_time_seconds(cfg.CONF.compute_discovery_ttl)
+        self._discover()
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_no_local_listing(self):
+        self.inspector.inspect_instances.side_effect = NotImplementedError
+        self._discover()
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 2)
+
+    def test_local_listing_failure(self):
+        self.inspector.inspect_instances.side_effect = Exception('broken')
+        self._discover()
+        self.assertEqual(self._discover(), ['uuid-1', 'uuid-2'])
+        self.assertEqual(self._nova_calls(), 2)
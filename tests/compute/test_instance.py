@@ -24,6 +24,7 @@ import mock
 
 from ceilometer.compute import instance
 from ceilometer.compute import manager
+from ceilometer.openstack.common import timeutils
 
 
 class FauxInstance(object):
@@ -103,3 +104,38 @@ class TestLocationMetadata(unittest.TestCase):
         md = instance.get_metadata_from_object(self.instance)
         self.assertEqual(md['image_ref'], None)
         self.assertEqual(md['image_ref_url'], None)
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def setUp(self):
+        super(TestMetadataCache, self).setUp()
+        self.cache = instance.MetadataCache()
+        self.instance = FauxInstance(id='instance-1', name='display name',
+                                     flavor=None, image=None, hostId='h')
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+    def test_shared_during_cycle(self):
+        self.cache.refresh()
+        md = self.cache.get(self.instance)
+        self.assertEqual(md['display_name'], 'display name')
+        self.assertTrue(self.cache.get(self.instance) is md)
+        self.assertRaises(TypeError, md.__setitem__, 'host', 'other')
+        timestamp = self.cache.timestamp
+        timeutils.advance_time_seconds(1)
+        self.assertEqual(self.cache.timestamp, timestamp)
+
+    def test_not_cached_outside_cycle(self):
+        md = self.cache.get(self.instance)
+        self.assertFalse(self.cache.get(self.instance) is md)
+        timestamp = self.cache.timestamp
+        timeutils.advance_time_seconds(1)
+        self.assertNotEqual(self.cache.timestamp, timestamp)
+
+    def test_clear(self):
+        self.cache.refresh()
+        md = self.cache.get(self.instance)
+        self.cache.clear()
+        self.cache.refresh()
+        self.assertFalse(self.cache.get(self.instance) is md)
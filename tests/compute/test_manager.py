@@ -20,6 +20,7 @@
 
 import datetime
 
+import eventlet
 import mock
 from oslo.config import cfg
 from stevedore import extension
@@ -75,7 +76,132 @@ class TestRunTasks(agentbase.BaseAgentManagerTestCase):
         super(TestRunTasks, self).test_setup_polling_tasks()
         self.assertTrue(self.Pollster.counters[0][1] is self.instance)
 
+    def test_snapshot_per_cycle(self):
+        self.mgr._inspector = mock.MagicMock()
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.mgr.interval_task(polling_tasks.values()[0])
+        self.assertEqual([c[0] for c in self.mgr.inspector.method_calls],
+                         ['refresh', 'clear'])
+
+    def test_metadata_cache_per_cycle(self):
+        self.mgr.metadata_cache = mock.MagicMock()
+        polling_tasks = self.mgr.setup_polling_tasks()
+        self.mgr.interval_task(polling_tasks.values()[0])
+        self.assertEqual([c[0] for c in
+                          self.mgr.metadata_cache.method_calls],
+                         ['refresh', 'clear'])
+
     def test_interval_exception_isolation(self):
         super(TestRunTasks, self).test_interval_exception_isolation()
         self.assertEqual(len(self.PollsterException.counters), 1)
         self.assertEqual(len(self.PollsterExceptionAnother.counters), 1)
+
+
+class SlowPollster(object):
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.running = 0
+        self.max_running = 0
+
+    def get_counter_names(self):
+        return ['slow']
+
+    def get_counters(self, manager, instance, counter_names=None):
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            eventlet.sleep(self.delays.get(instance.id, 0))
+        finally:
+            self.running -= 1
+        yield agentbase.default_test_data._replace(
+            name='slow',
+            resource_id=instance.id)
+
+
+class FakePipeline(object):
+
+    def __init__(self):
+        self.counters = []
+
+    @staticmethod
+    def support_counter(counter_name):
+        return True
+
+    def publish_counters(self, ctxt, counters, source):
+        self.counters.extend(counters)
+
+    def flush(self, ctxt, source):
+        pass
+
+
+class TestParallelPolling(base.TestCase):
+
+    def _task(self, delays, workers=2, deadline=0):
+        for name, value in (('compute_polling_workers', workers),
+                            ('compute_polling_deadline', deadline)):
+            cfg.CONF.set_override(name, value)
+            self.addCleanup(cfg.CONF.clear_override, name)
+        self.pollster = SlowPollster(delays)
+        self.pipeline = FakePipeline()
+        task = manager.PollingTask(mock.MagicMock())
+        task.add(extension.Extension('slow', None, None, self.pollster),
+                 [self.pipeline])
+        return task
+
+    @staticmethod
+    def _instances(*ids):
+        instances = []
+        for i in ids:
+            instance = mock.MagicMock()
+            instance.id = i
+            setattr(instance, 'OS-EXT-STS:vm_state', 'active')
+            instances.append(instance)
+        return instances
+
+    def test_bounded_concurrency(self):
+        task = self._task({'a': 0.01, 'b': 0.01, 'c': 0.01})
+        task.poll_and_publish_instances(self._instances('a', 'b', 'c'))
+        self.assertEqual(self.pollster.max_running, 2)
+        self.assertEqual(sorted(c.resource_id
+                                for c in self.pipeline.counters),
+                         ['a', 'b', 'c'])
+        self.assertEqual(task.in_flight, set())
+
+    def test_deadline_skips_in_flight(self):
+        task = self._task({'slow': 2}, deadline=1)
+        task.poll_and_publish_instances(self._instances('fast', 'slow'))
+        self.assertEqual([c.resource_id for c in self.pipeline.counters],
+                         ['fast'])
+        self.assertEqual(task.in_flight, set(['slow']))
+
+        task.poll_and_publish_instances(self._instances('fast', 'slow'))
+        self.assertEqual([c.resource_id for c in self.pipeline.counters],
+                         ['fast', 'fast'])
+        self.assertEqual(self.pollster.max_running, 2)
+
+    def test_in_flight_cleared_once_returned(self):
+        task = self._task({'slow': 2}, deadline=1)
+        task.poll_and_publish_instances(self._instances('fast', 'slow'))
+        eventlet.sleep(1.5)
+        self.assertEqual(task.in_flight, set())
+        # The counters of the late polling are dropped.
+        self.assertEqual([c.resource_id for c in self.pipeline.counters],
+                         ['fast'])
+
+    def test_deadline_covers_refresh(self):
+        task = self._task({}, deadline=1)
+        delays = [2, 0]
+        task.manager.inspector.refresh.side_effect = (
+            lambda: eventlet.sleep(delays.pop(0)))
+        task.poll_and_publish_instances(self._instances('a'), refresh=True)
+        self.assertEqual(self.pipeline.counters, [])
+        # The previous snapshot is still being taken.
+        task.poll_and_publish_instances(self._instances('a'), refresh=True)
+        self.assertEqual(self.pipeline.counters, [])
+        self.assertEqual(task.manager.inspector.refresh.call_count, 1)
+        eventlet.sleep(1.5)
+        task.poll_and_publish_instances(self._instances('a'), refresh=True)
+        self.assertEqual([c.resource_id for c in self.pipeline.counters],
+                         ['a'])
+        self.assertEqual(task.manager.inspector.refresh.call_count, 2)
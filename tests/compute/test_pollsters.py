@@ -60,6 +60,29 @@ class TestInstancePollster(TestPollsterBase):
         self.assertEqual(counters[0].name, 'instance')
         self.assertEqual(counters[1].name, 'instance:m1.small')
 
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_counters_requested(self):
+        self.mox.ReplayAll()
+
+        mgr = manager.AgentManager()
+        pollster = pollsters.InstancePollster()
+        counters = list(pollster.get_counters(mgr, self.instance,
+                                              counter_names=['instance:*']))
+        self.assertEqual([c.name for c in counters], ['instance:m1.small'])
+
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_metadata_shared_during_cycle(self):
+        self.mox.ReplayAll()
+
+        mgr = manager.AgentManager()
+        mgr.metadata_cache.refresh()
+        pollster = pollsters.InstancePollster()
+        counters = (list(pollster.get_counters(mgr, self.instance)) +
+                    list(pollster.get_counters(mgr, self.instance)))
+        self.assertEqual(len(set(id(c.resource_metadata)
+                                 for c in counters)), 1)
+        self.assertEqual(len(set(c.timestamp for c in counters)), 1)
+
 
 class TestDiskIOPollster(TestPollsterBase):
 
@@ -152,6 +175,24 @@ class TestNetPollster(TestPollsterBase):
         _verify_vnic_metering('network.outgoing.packets', '10.0.0.2', 4L)
         _verify_vnic_metering('network.outgoing.packets', '192.168.0.3', 8L)
 
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_counters_requested(self):
+        vnic = virt_inspector.Interface(name='vnet0', fref='fa163e71ec6e',
+                                        mac='fa:16:3e:71:ec:6d',
+                                        parameters={})
+        stats = virt_inspector.InterfaceStats(rx_bytes=1L, rx_packets=2L,
+                                              tx_bytes=3L, tx_packets=4L)
+        self.inspector.inspect_vnics(self.instance.name).AndReturn(
+            [(vnic, stats)])
+        self.mox.ReplayAll()
+
+        mgr = manager.AgentManager()
+        pollster = pollsters.NetPollster()
+        counters = list(pollster.get_counters(
+            mgr, self.instance, counter_names=['network.incoming.bytes']))
+        self.assertEqual([(c.name, c.volume) for c in counters],
+                         [('network.incoming.bytes', 1L)])
+
 
 class TestCPUPollster(TestPollsterBase):
 
@@ -188,3 +229,18 @@ class TestCPUPollster(TestPollsterBase):
         _verify_cpu_metering(True, 1 * (10 ** 6))
         _verify_cpu_metering(False, 3 * (10 ** 6))
         _verify_cpu_metering(False, 2 * (10 ** 6))
+
+    @mock.patch('ceilometer.pipeline.setup_pipeline', mock.MagicMock())
+    def test_get_counters_requested(self):
+        self.inspector.inspect_cpus(self.instance.name).AndReturn(
+            virt_inspector.CPUStats(time=1 * (10 ** 6), number=2))
+        self.mox.ReplayAll()
+
+        mgr = manager.AgentManager()
+        pollster = pollsters.CPUPollster()
+        pollster.utilization_map = {}
+        counters = list(pollster.get_counters(mgr, self.instance,
+                                              counter_names=['cpu']))
+        self.assertEqual([c.name for c in counters], ['cpu'])
+        # The utilization is not computed when not requested.
+        self.assertEqual(pollster.utilization_map, {})
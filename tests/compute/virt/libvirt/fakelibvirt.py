@@ -0,0 +1,168 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Fake libvirt module, implementing the parts used by the inspector.
+
+Domains are described by a name, an XML description and their
+statistics, and every call made to a connection or a domain is recorded
+in its calls attribute.
+"""
+
+VIR_ERR_NO_SUPPORT = 3
+VIR_ERR_NO_DOMAIN = 42
+VIR_ERR_SYSTEM_ERROR = 38
+VIR_FROM_REMOTE = 13
+VIR_FROM_RPC = 7
+
+VIR_DOMAIN_STATS_CPU_TOTAL = 2
+VIR_DOMAIN_STATS_VCPU = 8
+VIR_DOMAIN_STATS_INTERFACE = 16
+VIR_DOMAIN_STATS_BLOCK = 32
+VIR_CONNECT_GET_ALL_DOMAINS_STATS_ACTIVE = 16
+
+
+class libvirtError(Exception):
+
+    def __init__(self, message, error_code=None):
+        super(libvirtError, self).__init__(message)
+        self.error_code = error_code
+
+    def get_error_code(self):
+        return self.error_code
+
+    def get_error_domain(self):
+        return None
+
+
+class virDomain(object):
+
+    def __init__(self, conn, domain_id, name, xml, vcpus=1, cpu_time=0,
+                 interfaces=None, blocks=None):
+        """Fake domain.
+
+        :param interfaces: dict of (rx_bytes, rx_packets, tx_bytes,
+                           tx_packets) per device name.
+        :param blocks: dict of (read_requests, read_bytes, write_requests,
+                       write_bytes, errors) per device name.
+        """
+        self.conn = conn
+        self.domain_id = domain_id
+        self._name = name
+        self.xml = xml
+        self.vcpus = vcpus
+        self.cpu_time = cpu_time
+        self.interfaces = interfaces or {}
+        self.blocks = blocks or {}
+
+    def _call(self, *args):
+        self.conn.calls.append(args)
+
+    def name(self):
+        return self._name
+
+    def UUIDString(self):
+        return 'uuid-' + self._name
+
+    def ID(self):
+        return self.domain_id
+
+    def info(self):
+        self._call('info', self._name)
+        return (1, 2048, 2048, self.vcpus, self.cpu_time)
+
+    def XMLDesc(self, flags):
+        self._call('XMLDesc', self._name)
+        return self.xml
+
+    def interfaceStats(self, device):
+        self._call('interfaceStats', self._name, device)
+        rx_bytes, rx_packets, tx_bytes, tx_packets = self.interfaces[device]
+        return (rx_bytes, rx_packets, 0, 0, tx_bytes, tx_packets, 0, 0)
+
+    def blockStats(self, device):
+        self._call('blockStats', self._name, device)
+        return self.blocks[device]
+
+    def stats_record(self):
+        record = {'cpu.time': self.cpu_time,
+                  'vcpu.current': self.vcpus,
+                  'net.count': len(self.interfaces),
+                  'block.count': len(self.blocks)}
+        for i, (name, stats) in enumerate(sorted(self.interfaces.items())):
+            record['net.%d.name' % i] = name
+            for key, value in zip(('rx.bytes', 'rx.pkts',
+                                   'tx.bytes', 'tx.pkts'), stats):
+                record['net.%d.%s' % (i, key)] = value
+        for i, (name, stats) in enumerate(sorted(self.blocks.items())):
+            record['block.%d.name' % i] = name
+            for key, value in zip(('rd.reqs', 'rd.bytes',
+                                   'wr.reqs', 'wr.bytes'), stats):
+                record['block.%d.%s' % (i, key)] = value
+        return record
+
+
+class virConnect(object):
+
+    def __init__(self, uri=None):
+        self.uri = uri
+        self.domains = []
+        self.calls = []
+
+    def add_domain(self, *args, **kwargs):
+        domain = virDomain(self, len(self.domains) + 1, *args, **kwargs)
+        self.domains.append(domain)
+        return domain
+
+    def getCapabilities(self):
+        self.calls.append(('getCapabilities',))
+        return '<capabilities/>'
+
+    def numOfDomains(self):
+        self.calls.append(('numOfDomains',))
+        return len(self.domains)
+
+    def listDomainsID(self):
+        self.calls.append(('listDomainsID',))
+        return [d.domain_id for d in self.domains]
+
+    def lookupByID(self, domain_id):
+        self.calls.append(('lookupByID', domain_id))
+        for d in self.domains:
+            if d.domain_id == domain_id:
+                return d
+        raise libvirtError('no domain %s' % domain_id, VIR_ERR_NO_DOMAIN)
+
+    def lookupByName(self, name):
+        self.calls.append(('lookupByName', name))
+        for d in self.domains:
+            if d.name() == name:
+                return d
+        raise libvirtError('no domain %s' % name, VIR_ERR_NO_DOMAIN)
+
+    def getAllDomainStats(self, stats, flags):
+        self.calls.append(('getAllDomainStats',))
+        return [(d, d.stats_record()) for d in self.domains]
+
+
+class virConnectWithoutBulkStats(virConnect):
+    """Connection to a libvirt too old to support bulk statistics."""
+
+    def __getattribute__(self, name):
+        if name == 'getAllDomainStats':
+            raise AttributeError(name)
+        return super(virConnectWithoutBulkStats,
+                     self).__getattribute__(name)
+
+
+def openReadOnly(uri):
+    return virConnect(uri)
@@ -19,9 +19,15 @@
 """Tests for libvirt inspector.
 """
 
+from eventlet import tpool
+from oslo.config import cfg
+
+from ceilometer.compute.virt import inspector as virt_inspector
 from ceilometer.compute.virt.libvirt import inspector as libvirt_inspector
 from ceilometer.tests import base as test_base
 
+from tests.compute.virt.libvirt import fakelibvirt
+
 
 class TestLibvirtInspection(test_base.TestCase):
 
@@ -77,6 +83,8 @@ class TestLibvirtInspection(test_base.TestCase):
              </domain>
         """
 
+        self.domain.UUIDString().AndReturn('uuid-00000001')
+        self.domain.ID().AndReturn(1)
         self.domain.XMLDesc(0).AndReturn(dom_xml)
         self.domain.interfaceStats('vnet0').AndReturn((1L, 2L, 0L, 0L,
                                                        3L, 4L, 0L, 0L))
@@ -131,6 +139,8 @@ class TestLibvirtInspection(test_base.TestCase):
              </domain>
         """
 
+        self.domain.UUIDString().AndReturn('uuid-00000001')
+        self.domain.ID().AndReturn(1)
         self.domain.XMLDesc(0).AndReturn(dom_xml)
 
         self.domain.blockStats('vda').AndReturn((1L, 2L, 3L, 4L, -1))
@@ -145,3 +155,230 @@ class TestLibvirtInspection(test_base.TestCase):
         self.assertEqual(info0.read_bytes, 2L)
         self.assertEqual(info0.write_requests, 3L)
         self.assertEqual(info0.write_bytes, 4L)
+
+
+DOMAIN_XML = """
+    <domain type='kvm'>
+        <devices>
+            <disk type='file' device='disk'>
+                <source file='/path/%(name)s/disk'/>
+                <target dev='vda' bus='virtio'/>
+            </disk>
+            <interface type='bridge'>
+                <mac address='fa:16:3e:71:ec:6d'/>
+                <target dev='%(vnic)s'/>
+                <filterref filter='nova-%(name)s-fa163e71ec6d'>
+                    <parameter name='IP' value='10.0.0.2'/>
+                </filterref>
+            </interface>
+        </devices>
+    </domain>
+"""
+
+
+class TestLibvirtInspectAll(test_base.TestCase):
+
+    def setUp(self):
+        super(TestLibvirtInspectAll, self).setUp()
+        self.stubs.Set(libvirt_inspector, 'libvirt', fakelibvirt)
+        self.inspector = libvirt_inspector.LibvirtInspector()
+
+    def _connect(self, conn):
+        for i, name in enumerate(('instance-00000001', 'instance-00000002')):
+            conn.add_domain(name,
+                            DOMAIN_XML % {'name': name, 'vnic': 'vnet%d' % i},
+                            vcpus=2,
+                            cpu_time=1000 + i,
+                            interfaces={'vnet%d' % i: (1, 2, 3, 4)},
+                            blocks={'vda': (5, 6, 7, 8, -1)})
+        self.inspector.connection = conn
+        return conn
+
+    def _check(self, stats):
+        self.assertEqual(sorted(stats),
+                         ['instance-00000001', 'instance-00000002'])
+        s = stats['instance-00000002']
+        self.assertEqual(s.cpu.number, 2)
+        self.assertEqual(s.cpu.time, 1001)
+        [(vnic, vnic_stats)] = s.vnics
+        self.assertEqual(vnic.name, 'vnet1')
+        self.assertEqual(vnic.fref, 'nova-instance-00000002-fa163e71ec6d')
+        self.assertEqual(vnic.parameters, {'ip': '10.0.0.2'})
+        self.assertEqual(vnic_stats.rx_bytes, 1)
+        self.assertEqual(vnic_stats.rx_packets, 2)
+        self.assertEqual(vnic_stats.tx_bytes, 3)
+        self.assertEqual(vnic_stats.tx_packets, 4)
+        [(disk, disk_stats)] = s.disks
+        self.assertEqual(disk.device, 'vda')
+        self.assertEqual(disk_stats.read_requests, 5)
+        self.assertEqual(disk_stats.read_bytes, 6)
+        self.assertEqual(disk_stats.write_requests, 7)
+        self.assertEqual(disk_stats.write_bytes, 8)
+        self.assertEqual(disk_stats.errors, -1)
+
+    def test_bulk(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self._check(self.inspector.inspect_all())
+        self.assertEqual([c[0] for c in conn.calls],
+                         ['getCapabilities', 'getAllDomainStats',
+                          'XMLDesc', 'XMLDesc'])
+
+    def test_bulk_nonblocking(self):
+        cfg.CONF.set_override('libvirt_nonblocking', True)
+        self.addCleanup(cfg.CONF.clear_override, 'libvirt_nonblocking')
+        executed = []
+
+        def execute(f, *args, **kwargs):
+            executed.append(f.__name__)
+            return f(*args, **kwargs)
+        self.stubs.Set(tpool, 'execute', execute)
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.connection = tpool.Proxy(
+            conn, autowrap=(fakelibvirt.virDomain, fakelibvirt.virConnect))
+        self._check(self.inspector.inspect_all())
+        for name in ('getAllDomainStats', 'UUIDString', 'name', 'ID',
+                     'XMLDesc'):
+            self.assertTrue(name in executed, name)
+        domain = self.inspector.domains['instance-00000001']
+        self.assertTrue(isinstance(domain, tpool.Proxy))
+        self.assertEqual(self.inspector.inspect_cpus('instance-00000001'),
+                         virt_inspector.CPUStats(number=2, time=1000))
+        self.assertEqual(executed[-1], 'info')
+
+    def test_bulk_blocking(self):
+        cfg.CONF.set_override('libvirt_nonblocking', False)
+        self.addCleanup(cfg.CONF.clear_override, 'libvirt_nonblocking')
+        self._connect(fakelibvirt.virConnect())
+        self._check(self.inspector.inspect_all())
+        domain = self.inspector.domains['instance-00000001']
+        self.assertTrue(isinstance(domain, fakelibvirt.virDomain))
+
+    def test_per_domain_fallback(self):
+        conn = self._connect(fakelibvirt.virConnectWithoutBulkStats())
+        self._check(self.inspector.inspect_all())
+        self.assertTrue(('lookupByID', 2) in conn.calls)
+        self.assertTrue(('interfaceStats', 'instance-00000002', 'vnet1')
+                        in conn.calls)
+
+    def test_bulk_not_supported(self):
+        conn = self._connect(fakelibvirt.virConnect())
+
+        def not_supported(stats, flags):
+            raise fakelibvirt.libvirtError('not supported',
+                                           fakelibvirt.VIR_ERR_NO_SUPPORT)
+        conn.getAllDomainStats = not_supported
+        self._check(self.inspector.inspect_all())
+
+    def test_per_domain_deleted_while_listing(self):
+        conn = self._connect(fakelibvirt.virConnectWithoutBulkStats())
+        conn.domains.pop()
+        conn.listDomainsID = lambda: [1, 2]
+        self.assertEqual(sorted(self.inspector.inspect_all()),
+                         ['instance-00000001'])
+
+    def _xml_calls(self, conn):
+        return len([c for c in conn.calls if c[0] == 'XMLDesc'])
+
+    def test_device_cache(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        self._check(self.inspector.inspect_all())
+        list(self.inspector.inspect_vnics('instance-00000001'))
+        list(self.inspector.inspect_disks('instance-00000001'))
+        self.assertEqual(self._xml_calls(conn), 2)
+
+    def test_device_cache_per_domain(self):
+        conn = self._connect(fakelibvirt.virConnectWithoutBulkStats())
+        self.inspector.inspect_all()
+        self._check(self.inspector.inspect_all())
+        self.assertEqual(self._xml_calls(conn), 2)
+
+    def test_device_cache_restarted_domain(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        conn.domains[0].domain_id = 3
+        self.inspector.inspect_all()
+        self.assertEqual(self._xml_calls(conn), 3)
+
+    def test_device_cache_devices_changed(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        domain = conn.domains[0]
+        domain.xml = domain.xml.replace('vnet0', 'vnet9')
+        domain.interfaces = {'vnet9': (1, 2, 3, 4)}
+        stats = self.inspector.inspect_all()
+        self.assertEqual(self._xml_calls(conn), 3)
+        [(vnic, _stats)] = stats['instance-00000001'].vnics
+        self.assertEqual(vnic.name, 'vnet9')
+
+    def test_device_cache_expired(self):
+        self.stubs.Set(libvirt_inspector.timeutils, 'utcnow_ts',
+                       lambda: 1000)
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        self.stubs.Set(libvirt_inspector.timeutils, 'utcnow_ts',
+                       lambda: 1000 + cfg.CONF.libvirt_device_cache_ttl)
+        self.inspector.inspect_all()
+        self.assertEqual(self._xml_calls(conn), 4)
+
+    def test_device_cache_vanished_domain(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        conn.domains.pop()
+        self.inspector.inspect_all()
+        self.assertEqual(sorted(self.inspector.devices),
+                         ['uuid-instance-00000001'])
+
+    def test_device_cache_unplugged(self):
+        conn = self._connect(fakelibvirt.virConnectWithoutBulkStats())
+        self.inspector.inspect_vnics('instance-00000001')
+        conn.domains[0].interfaces = {}
+        self.assertRaises(KeyError, self.inspector.inspect_vnics,
+                          'instance-00000001')
+        self.assertEqual(self.inspector.devices, {})
+
+    def _calls(self, conn, name):
+        return len([c for c in conn.calls if c[0] == name])
+
+    def test_single_lookup_per_cycle(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_all()
+        self.inspector.inspect_cpus('instance-00000001')
+        self.inspector.inspect_vnics('instance-00000001')
+        self.inspector.inspect_disks('instance-00000001')
+        self.assertEqual(self._calls(conn, 'lookupByName'), 0)
+
+        self.inspector.clear_cache()
+        self.inspector.inspect_cpus('instance-00000001')
+        self.inspector.inspect_disks('instance-00000001')
+        self.assertEqual(self._calls(conn, 'lookupByName'), 2)
+
+    def test_connection_check_rate_limited(self):
+        now = [1000]
+        self.stubs.Set(libvirt_inspector.timeutils, 'utcnow_ts',
+                       lambda: now[0])
+        conn = self._connect(fakelibvirt.virConnect())
+        for i in range(3):
+            self.inspector.inspect_cpus('instance-00000001')
+        self.assertEqual(self._calls(conn, 'getCapabilities'), 1)
+        now[0] += cfg.CONF.libvirt_connection_check_interval
+        self.inspector.inspect_cpus('instance-00000001')
+        self.assertEqual(self._calls(conn, 'getCapabilities'), 2)
+
+    def test_connection_checked_after_failure(self):
+        conn = self._connect(fakelibvirt.virConnect())
+        self.inspector.inspect_cpus('instance-00000001')
+        self.assertRaises(virt_inspector.InstanceNotFoundException,
+                          self.inspector.inspect_cpus, 'instance-00000009')
+        self.inspector.inspect_cpus('instance-00000001')
+        self.assertEqual(self._calls(conn, 'getCapabilities'), 2)
+
+    def test_inspect_instances(self):
+        self._connect(fakelibvirt.virConnect())
+        self.assertEqual(list(self.inspector.inspect_instances()),
+                         [virt_inspector.Instance(
+                             name='instance-00000001',
+                             UUID='uuid-instance-00000001'),
+                          virt_inspector.Instance(
+                              name='instance-00000002',
+                              UUID='uuid-instance-00000002')])
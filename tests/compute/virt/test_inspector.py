@@ -0,0 +1,63 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for the inspector snapshot.
+"""
+
+from ceilometer.compute.virt import inspector as virt_inspector
+from ceilometer.tests import base as test_base
+
+
+class TestSnapshotInspector(test_base.TestCase):
+
+    def setUp(self):
+        super(TestSnapshotInspector, self).setUp()
+        self.inspector = self.mox.CreateMock(virt_inspector.Inspector)
+        self.snapshot = virt_inspector.SnapshotInspector(self.inspector)
+        self.stats = virt_inspector.InstanceStats(
+            cpu=virt_inspector.CPUStats(number=1, time=10),
+            vnics=[],
+            disks=[])
+
+    def test_from_snapshot(self):
+        self.inspector.inspect_all().AndReturn({'instance-1': self.stats})
+        self.mox.ReplayAll()
+        self.snapshot.refresh()
+        self.assertEqual(self.snapshot.inspect_cpus('instance-1'),
+                         self.stats.cpu)
+        self.assertEqual(self.snapshot.inspect_vnics('instance-1'), [])
+        self.assertEqual(self.snapshot.inspect_disks('instance-1'), [])
+
+    def test_missing_instance(self):
+        cpu = virt_inspector.CPUStats(number=2, time=20)
+        self.inspector.inspect_all().AndReturn({'instance-1': self.stats})
+        self.inspector.inspect_cpus('instance-2').AndReturn(cpu)
+        self.mox.ReplayAll()
+        self.snapshot.refresh()
+        self.assertEqual(self.snapshot.inspect_cpus('instance-2'), cpu)
+
+    def test_cleared(self):
+        self.inspector.inspect_all().AndReturn({'instance-1': self.stats})
+        self.inspector.clear_cache()
+        self.inspector.inspect_cpus('instance-1').AndReturn(self.stats.cpu)
+        self.mox.ReplayAll()
+        self.snapshot.refresh()
+        self.snapshot.clear()
+        self.snapshot.inspect_cpus('instance-1')
+
+    def test_refresh_failure(self):
+        self.inspector.inspect_all().AndRaise(
+            virt_inspector.InspectorException('broken'))
+        self.mox.ReplayAll()
+        self.snapshot.refresh()
+        self.assertEqual(self.snapshot.snapshot, {})
@@ -120,3 +120,9 @@ class TestImagePollster(base.TestCase):
         counters = list(glance.ImagePollster().get_counters(self.manager))
         self.assertEqual(set([c.name for c in counters]),
                          set(glance.ImagePollster().get_counter_names()))
+
+    def test_get_counters_requested(self):
+        counters = list(glance.ImagePollster().get_counters(
+            self.manager, counter_names=['image.size']))
+        self.assertEqual(set([c.name for c in counters]), set(['image.size']))
+        self.assertEqual(len(counters), 3)
@@ -70,6 +70,13 @@ class TestFloatingIPPollster(base.TestCase):
                                      '1.1.1.3',
                                      ])
 
+    def test_client_reused(self):
+        self.mox.StubOutWithMock(nova_client.Client, '__init__')
+        nova_client.Client.__init__()
+        self.mox.ReplayAll()
+        list(self.pollster.get_counters(self.manager))
+        list(self.pollster.get_counters(self.manager))
+
     def test_get_counter_names(self):
         counters = list(self.pollster.get_counters(self.manager))
         self.assertEqual(set([c.name for c in counters]),
@@ -134,6 +134,18 @@ class UserTest(DBTestBase):
         users = self.conn.get_users(source='test-1')
         assert list(users) == ['user-id']
 
+    def test_get_users_sorted(self):
+        users = list(self.conn.get_users())
+        self.assertEqual(users, sorted(users))
+
+    def test_get_users_paginated(self):
+        users = list(self.conn.get_users(limit=2))
+        self.assertEqual(users, ['user-id', 'user-id-2'])
+        users = list(self.conn.get_users(limit=2, marker='user-id-2'))
+        self.assertEqual(users, ['user-id-3', 'user-id-alternate'])
+        users = list(self.conn.get_users(marker='user-id-alternate'))
+        self.assertEqual(users, [])
+
 
 class ProjectTest(DBTestBase):
 
@@ -147,6 +159,15 @@ class ProjectTest(DBTestBase):
         expected = ['project-id']
         assert list(projects) == expected
 
+    def test_get_projects_paginated(self):
+        projects = list(self.conn.get_projects(limit=2))
+        self.assertEqual(projects, ['project-id', 'project-id-2'])
+        projects = list(self.conn.get_projects(marker='project-id-2'))
+        self.assertEqual(projects, ['project-id-3'])
+        projects = list(self.conn.get_projects(source='test', limit=1,
+                                               marker='project-id-2'))
+        self.assertEqual(projects, ['project-id-3'])
+
 
 class ResourceTest(DBTestBase):
 
@@ -208,19 +229,14 @@ class ResourceTest(DBTestBase):
 
     def test_get_resources_by_metaquery(self):
         q = {'metadata.display_name': 'test-server'}
-        got_not_imp = False
-        try:
-            resources = list(self.conn.get_resources(metaquery=q))
-            assert len(resources) == 4
-        except NotImplementedError:
-            got_not_imp = True
-            self.assertTrue(got_not_imp)
-        #this should work, but it doesn't.
-        #actually unless I wrap get_resources in list()
-        #it doesn't get called - weird
-        #self.assertRaises(NotImplementedError,
-        #                  self.conn.get_resources,
-        #                  metaquery=q)
+        resources = list(self.conn.get_resources(metaquery=q))
+        assert len(resources) == 4
+
+    def test_get_resources_by_metaquery_selective(self):
+        q = {'metadata.tag': 'counter-2'}
+        resources = list(self.conn.get_resources(metaquery=q))
+        self.assertEqual([r.resource_id for r in resources],
+                         ['resource-id-2'])
 
     def test_get_resources_by_empty_metaquery(self):
         resources = list(self.conn.get_resources(metaquery={}))
@@ -243,14 +259,14 @@ class MeterTest(DBTestBase):
 
     def test_get_meters_by_metaquery(self):
         q = {'metadata.display_name': 'test-server'}
-        got_not_imp = False
-        try:
-            results = list(self.conn.get_meters(metaquery=q))
-            assert results
-            assert len(results) == 4
-        except NotImplementedError:
-            got_not_imp = True
-            self.assertTrue(got_not_imp)
+        results = list(self.conn.get_meters(metaquery=q))
+        assert results
+        assert len(results) == 4
+
+    def test_get_meters_by_metaquery_no_match(self):
+        q = {'metadata.display_name': 'no-such-server'}
+        results = list(self.conn.get_meters(metaquery=q))
+        assert not results
 
     def test_get_meters_by_empty_metaquery(self):
         results = list(self.conn.get_meters(metaquery={}))
@@ -284,15 +300,22 @@ class RawEventTest(DBTestBase):
     def test_get_samples_by_metaquery(self):
         q = {'metadata.display_name': 'test-server'}
         f = storage.EventFilter(metaquery=q)
-        got_not_imp = False
-        try:
-            results = list(self.conn.get_samples(f))
-            assert results
-            for meter in results:
-                assert meter.as_dict() in self.msgs
-        except NotImplementedError:
-            got_not_imp = True
-            self.assertTrue(got_not_imp)
+        results = list(self.conn.get_samples(f))
+        assert results
+        for meter in results:
+            assert meter.as_dict() in self.msgs
+
+    def test_get_samples_by_metaquery_selective(self):
+        q = {'metadata.tag': 'self.counter2'}
+        f = storage.EventFilter(metaquery=q)
+        results = list(self.conn.get_samples(f))
+        self.assertEqual([m.as_dict() for m in results], [self.msg2])
+
+    def test_get_samples_by_metaquery_no_match(self):
+        q = {'metadata.display_name': 'no-such-server'}
+        f = storage.EventFilter(user='user-id', metaquery=q)
+        results = list(self.conn.get_samples(f))
+        assert not results
 
     def test_get_samples_by_start_time(self):
         f = storage.EventFilter(
@@ -384,6 +407,24 @@ class StatisticsTest(DBTestBase):
                                                    source='test',
                                                    )
             self.conn.record_metering_data(msg)
+        for i in range(2):
+            c = counter.Counter(
+                'snapshot.size',
+                'gauge',
+                'GiB',
+                1 + i,
+                'user-id',
+                'project1',
+                'resource-id',
+                timestamp=datetime.datetime(2012, 9, 25, 10 + i, 40),
+                resource_metadata={'display_name': 'test-snapshot'}
+            )
+            self.counters.append(c)
+            msg = meter.meter_message_from_counter(c,
+                                                   secret='not-so-secret',
+                                                   source='test',
+                                                   )
+            self.conn.record_metering_data(msg)
 
     def test_by_user(self):
         f = storage.EventFilter(
@@ -505,6 +546,152 @@ class StatisticsTest(DBTestBase):
         assert results.sum == 18
         assert results.avg == 6
 
+    def test_multiple_meters(self):
+        f = storage.EventFilter(
+            meter=['volume.size', 'snapshot.size'],
+        )
+        results = list(self.conn.get_meter_statistics(f))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].count, 8)
+        self.assertEqual(results[0].sum, 48)
+        self.assertEqual(results[0].groupby, None)
+
+    def test_multiple_meters_groupby_meter(self):
+        f = storage.EventFilter(
+            meter=['volume.size', 'snapshot.size'],
+            resource='resource-id',
+        )
+        results = dict((r.groupby['counter_name'], r)
+                       for r in self.conn.get_meter_statistics(
+                           f, groupby=['counter_name']))
+        self.assertEqual(sorted(results), ['snapshot.size', 'volume.size'])
+        self.assertEqual(results['snapshot.size'].count, 2)
+        self.assertEqual(results['snapshot.size'].sum, 3)
+        self.assertEqual(results['volume.size'].count, 3)
+        self.assertEqual(results['volume.size'].max, 7)
+
+    def test_groupby_project(self):
+        f = storage.EventFilter(
+            meter='volume.size',
+        )
+        results = dict((r.groupby['project_id'], r)
+                       for r in self.conn.get_meter_statistics(
+                           f, groupby=['project_id']))
+        self.assertEqual(sorted(results), ['project1', 'project2'])
+        self.assertEqual(results['project1'].sum, 18)
+        self.assertEqual(results['project1'].count, 3)
+        self.assertEqual(results['project2'].sum, 27)
+        self.assertEqual(results['project2'].min, 8)
+        self.assertEqual(results['project2'].duration_start,
+                         datetime.datetime(2012, 9, 25, 10, 30))
+        self.assertEqual(results['project2'].duration_end,
+                         datetime.datetime(2012, 9, 25, 12, 32))
+
+    def test_groupby_user_with_filter(self):
+        f = storage.EventFilter(
+            meter='volume.size',
+            start='2012-09-25T11:00:00',
+        )
+        results = list(self.conn.get_meter_statistics(f,
+                                                      groupby=['user_id']))
+        self.assertEqual(
+            dict((r.groupby['user_id'], (r.count, r.sum)) for r in results),
+            {'user-id': (2, 13), 'user-5': (2, 19)})
+
+    def test_groupby_period(self):
+        f = storage.EventFilter(
+            meter=['volume.size', 'snapshot.size'],
+            start='2012-09-25T10:28:00',
+        )
+        results = list(self.conn.get_meter_statistics(
+            f, period=7200, groupby=['counter_name', 'resource_id']))
+        groups = dict(((r.period_start,
+                        r.groupby['counter_name'],
+                        r.groupby['resource_id']), r.sum)
+                      for r in results)
+        first = datetime.datetime(2012, 9, 25, 10, 28)
+        second = datetime.datetime(2012, 9, 25, 12, 28)
+        self.assertEqual(groups,
+                         {(first, 'volume.size', 'resource-id'): 11,
+                          (first, 'volume.size', 'resource-6'): 17,
+                          (first, 'snapshot.size', 'resource-id'): 3,
+                          (second, 'volume.size', 'resource-id'): 7,
+                          (second, 'volume.size', 'resource-6'): 10})
+        self.assertEqual(set(r.period for r in results), set([7200]))
+
+
+class CumulativeStatisticsTest(DBTestBase):
+
+    def prepare_data(self):
+        for volume, resource, minute in ((10, 'resource-1', 0),
+                                         (30, 'resource-1', 10),
+                                         # the counter has been reset
+                                         (5, 'resource-1', 20),
+                                         (25, 'resource-1', 30),
+                                         (100, 'resource-2', 5),
+                                         (160, 'resource-2', 15)):
+            c = counter.Counter(
+                'cpu',
+                counter.TYPE_CUMULATIVE,
+                'ns',
+                volume,
+                'user-id',
+                'project-id',
+                resource,
+                timestamp=datetime.datetime(2013, 3, 1, 10, minute),
+                resource_metadata={},
+            )
+            msg = meter.meter_message_from_counter(c,
+                                                   secret='not-so-secret',
+                                                   source='test',
+                                                   )
+            self.conn.record_metering_data(msg)
+
+    def test_no_deltas(self):
+        f = storage.EventFilter(meter='cpu')
+        results = list(self.conn.get_meter_statistics(f))
+        self.assertEqual(results[0].delta, None)
+        self.assertEqual(results[0].rate, None)
+
+    def test_deltas(self):
+        f = storage.EventFilter(meter='cpu')
+        results = list(self.conn.get_meter_statistics(f, deltas=True))
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0].delta, 105)
+        self.assertEqual(results[0].rate, 105 / 1800.0)
+
+    def test_deltas_groupby_resource(self):
+        f = storage.EventFilter(meter='cpu')
+        results = dict((r.groupby['resource_id'], r)
+                       for r in self.conn.get_meter_statistics(
+                           f, groupby=['resource_id'], deltas=True))
+        self.assertEqual(results['resource-1'].delta, 45)
+        self.assertEqual(results['resource-1'].rate, 45 / 1800.0)
+        self.assertEqual(results['resource-2'].delta, 60)
+        self.assertEqual(results['resource-2'].rate, 60 / 600.0)
+
+    def test_deltas_period(self):
+        f = storage.EventFilter(meter='cpu',
+                                start='2013-03-01T10:00:00',
+                                end='2013-03-01T10:45:00')
+        results = list(self.conn.get_meter_statistics(f, period=900,
+                                                      deltas=True))
+        self.assertEqual([r.period_start for r in results],
+                         [datetime.datetime(2013, 3, 1, 10, 0),
+                          datetime.datetime(2013, 3, 1, 10, 15),
+                          datetime.datetime(2013, 3, 1, 10, 30)])
+        self.assertEqual([r.delta for r in results], [20, 65, 20])
+        self.assertEqual([r.rate for r in results],
+                         [20 / 900.0, 65 / 900.0, 20 / 900.0])
+
+    def test_deltas_single_sample(self):
+        f = storage.EventFilter(meter='cpu',
+                                resource='resource-1',
+                                start='2013-03-01T10:25:00')
+        results = list(self.conn.get_meter_statistics(f, deltas=True))
+        self.assertEqual(results[0].delta, 0)
+        self.assertEqual(results[0].rate, None)
+
 
 class CounterDataTypeTest(DBTestBase):
 
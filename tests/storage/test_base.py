@@ -20,6 +20,7 @@ import math
 import unittest
 
 from ceilometer.storage import base
+from ceilometer.storage import models
 
 
 class BaseTest(unittest.TestCase):
@@ -49,3 +50,32 @@ class BaseTest(unittest.TestCase):
         self.assertEqual(times[21],
                          (datetime.datetime(2013, 01, 02, 13, 19, 15),
                           datetime.datetime(2013, 01, 02, 13, 20, 10)))
+
+    def test_counter_increment(self):
+        self.assertEqual(base.counter_increment(10, 30), 20)
+        self.assertEqual(base.counter_increment(30, 30), 0)
+        # The counter has been reset
+        self.assertEqual(base.counter_increment(30, 5), 5)
+
+    def test_add_deltas(self):
+        start = datetime.datetime(2013, 01, 01, 12, 00)
+        statistics = [
+            models.Statistics(min=0, max=0, avg=0, sum=0, count=0,
+                              period=600,
+                              period_start=start + datetime.timedelta(
+                                  minutes=10 * i),
+                              period_end=start + datetime.timedelta(
+                                  minutes=10 * (i + 1)),
+                              duration=0,
+                              duration_start=None,
+                              duration_end=None)
+            for i in (1, 0)]
+        samples = [('r1', start, 10, None),
+                   ('r1', start + datetime.timedelta(minutes=5), 30, None),
+                   ('r1', start + datetime.timedelta(minutes=15), 5, None),
+                   ('r2', start + datetime.timedelta(minutes=12), 100, None),
+                   ('r2', start + datetime.timedelta(minutes=18), 110, None)]
+        base.add_deltas(statistics, samples)
+        self.assertEqual(statistics[1].delta, 20)
+        self.assertEqual(statistics[0].delta, 15)
+        self.assertEqual(statistics[0].rate, 15 / 600.0)
@@ -24,12 +24,377 @@
   running the tests. Make sure the Thrift server is running on that server.
 
 """
+import datetime
+import json
+
+import eventlet
+from oslo.config import cfg
+
 from tests.storage import base
 
+from ceilometer.collector import meter
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer import storage
+from ceilometer.storage import impl_hbase
+from ceilometer.tests import base as test_base
+
 
 class HBaseEngineTestBase(base.DBTestBase):
     database_connection = 'hbase://__test__'
 
+    def _table(self, name):
+        with self.conn.conn_pool.item() as conn:
+            return conn.table(name)
+
+
+class IndexTest(HBaseEngineTestBase):
+
+    def _forbid_meter_scan(self):
+        def scan(*args, **kwargs):
+            raise AssertionError('meter table should not be scanned')
+        self.stubs.Set(self._table(self.conn.METER_TABLE), 'scan', scan)
+
+    def test_indexes_are_written(self):
+        resource_idx = self._table(self.conn.RESOURCE_INDEX_TABLE)
+        project_idx = self._table(self.conn.PROJECT_INDEX_TABLE)
+        meter_table = self._table(self.conn.METER_TABLE)
+        self.assertEqual(len(list(resource_idx.scan())), len(self.msgs))
+        self.assertEqual(len(list(project_idx.scan())), len(self.msgs))
+        for key, data in resource_idx.scan():
+            self.assertTrue(key.startswith(data['f:resource_id'] + '_'))
+            self.assertTrue(meter_table.row(data['f:row']))
+
+    def test_get_samples_by_resource_uses_index(self):
+        self._forbid_meter_scan()
+        f = storage.EventFilter(resource='resource-id-alternate')
+        results = list(self.conn.get_samples(f))
+        self.assertEqual(len(results), 2)
+        for meter in results:
+            assert meter.as_dict() in [self.msg2, self.msg3]
+
+    def test_get_samples_by_project_uses_index(self):
+        self._forbid_meter_scan()
+        f = storage.EventFilter(project='project-id',
+                                start=datetime.datetime(2012, 7, 2, 10, 41))
+        results = list(self.conn.get_samples(f))
+        self.assertEqual(len(results), 2)
+        for meter in results:
+            assert meter.as_dict() in [self.msg2, self.msg3]
+
+    def test_get_resources_by_project_uses_index(self):
+        self._forbid_meter_scan()
+        resources = list(self.conn.get_resources(project='project-id-2'))
+        self.assertEqual([r.resource_id for r in resources],
+                         ['resource-id-2'])
+
+    def test_get_meters_by_resource_reads_one_row(self):
+        def scan(*args, **kwargs):
+            self.assertEqual(kwargs['row_start'], 'resource-id')
+            return orig_scan(*args, **kwargs)
+        resource_table = self._table(self.conn.RESOURCE_TABLE)
+        orig_scan = resource_table.scan
+        self.stubs.Set(resource_table, 'scan', scan)
+        results = list(self.conn.get_meters(resource='resource-id'))
+        self.assertEqual([m.resource_id for m in results], ['resource-id'])
+
+    def test_upgrade_backfills_indexes(self):
+        # Drop what the samples recorded before the indexes did not write
+        self._table(self.conn.RESOURCE_INDEX_TABLE)._rows.clear()
+        self._table(self.conn.PROJECT_INDEX_TABLE)._rows.clear()
+        for data in self._table(self.conn.PROJECT_TABLE)._rows.values():
+            for k in [k for k in data if k.startswith('f:res_')]:
+                del data[k]
+        f = storage.EventFilter(resource='resource-id-alternate')
+        self.assertEqual(list(self.conn.get_samples(f)), [])
+
+        self.conn.upgrade()
+
+        self._forbid_meter_scan()
+        results = list(self.conn.get_samples(f))
+        self.assertEqual(len(results), 2)
+        for meter in results:
+            assert meter.as_dict() in [self.msg2, self.msg3]
+        f = storage.EventFilter(project='project-id',
+                                start=datetime.datetime(2012, 7, 2, 10, 41))
+        results = list(self.conn.get_samples(f))
+        self.assertEqual(len(results), 2)
+        for meter in results:
+            assert meter.as_dict() in [self.msg2, self.msg3]
+        results = list(self.conn.get_meters(project='project-id-2'))
+        self.assertEqual([m.resource_id for m in results], ['resource-id-2'])
+
+    def test_upgrade_backfills_once(self):
+        self.conn.upgrade()
+        self._forbid_meter_scan()
+        self.conn.upgrade()
+
+    def test_make_index_query(self):
+        start = datetime.datetime(2012, 7, 2, 10, 40)
+        end = datetime.datetime(2012, 7, 2, 10, 41)
+        q, start_row, stop_row = impl_hbase.make_index_query(
+            'res', resource='res', meter='instance', start=start, end=end)
+        self.assertEqual(start_row, 'res_%d' %
+                         (impl_hbase.reverse_timestamp(end) + 1))
+        self.assertEqual(stop_row, 'res_%d' %
+                         (impl_hbase.reverse_timestamp(start) + 1))
+        self.assertIn("'resource_id', =, 'binary:res'", q)
+        self.assertIn("'counter_name', =, 'binary:instance'", q)
+
+
+class WriteTest(HBaseEngineTestBase):
+
+    def _record(self, resource_id='resource-id-batch', volume=1):
+        c = counter.Counter(
+            'instance',
+            counter.TYPE_CUMULATIVE,
+            unit='',
+            volume=volume,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id=resource_id,
+            timestamp=datetime.datetime(2012, 7, 2, 11, volume),
+            resource_metadata={'display_name': 'test-server'},
+        )
+        msg = meter.meter_message_from_counter(c, cfg.CONF.metering_secret,
+                                               'test-batch')
+        self.conn.record_metering_data(msg)
+        return msg
+
+    def _count_puts(self, table):
+        calls = []
+        orig_put = table.put
+
+        def put(key, data):
+            calls.append(key)
+            return orig_put(key, data)
+        self.stubs.Set(table, 'put', put)
+        return calls
+
+    def test_record_does_not_read(self):
+        def forbidden(*args, **kwargs):
+            raise AssertionError('nothing should be read')
+        for name in [self.conn.USER_TABLE, self.conn.PROJECT_TABLE,
+                     self.conn.RESOURCE_TABLE, self.conn.METER_TABLE]:
+            table = self._table(name)
+            for method in ['row', 'rows', 'scan']:
+                self.stubs.Set(table, method, forbidden)
+        self._record()
+
+    def test_resource_meters_are_merged(self):
+        c = counter.Counter(
+            'cpu',
+            counter.TYPE_CUMULATIVE,
+            unit='ns',
+            volume=1,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id='resource-id',
+            timestamp=datetime.datetime(2012, 7, 2, 11, 0),
+            resource_metadata={'display_name': 'test-server'},
+        )
+        self.conn.record_metering_data(
+            meter.meter_message_from_counter(c, cfg.CONF.metering_secret,
+                                             'test-1'))
+        resource = list(self.conn.get_resources(resource='resource-id'))[0]
+        self.assertEqual(sorted(m.counter_name for m in resource.meter),
+                         ['cpu', 'instance'])
+
+    def test_writes_are_buffered(self):
+        self.conn.batch_size = 3
+        meter_table = self._table(self.conn.METER_TABLE)
+        self._record(volume=1)
+        self._record(volume=2)
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs))
+        self._record(volume=3)
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs) + 3)
+
+    def test_read_flushes_writes(self):
+        self.conn.batch_size = 10
+        msg = self._record()
+        results = list(self.conn.get_samples(
+            storage.EventFilter(resource='resource-id-batch')))
+        self.assertEqual([r.as_dict() for r in results], [msg])
+
+    def test_writes_are_flushed_on_time(self):
+        self.conn.batch_size = 10
+        self.conn.flush_interval = 0.01
+        meter_table = self._table(self.conn.METER_TABLE)
+        self._record()
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs))
+        eventlet.sleep(0.05)
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs) + 1)
+
+    def test_flush(self):
+        self.conn.batch_size = 10
+        meter_table = self._table(self.conn.METER_TABLE)
+        self._record()
+        self.conn.flush()
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs) + 1)
+
+    def test_writes_requeued_on_failure(self):
+        self.conn.batch_size = 2
+        meter_table = self._table(self.conn.METER_TABLE)
+        orig_put = meter_table.put
+
+        def put(key, data):
+            self.stubs.Set(meter_table, 'put', orig_put)
+            raise IOError('broken transport')
+        self.stubs.Set(meter_table, 'put', put)
+        self._record(volume=1)
+        self.assertRaises(IOError, self._record, volume=2)
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs))
+        self.conn.flush()
+        self.assertEqual(len(list(meter_table.scan())), len(self.msgs) + 2)
+
+    def test_shared_rows_written_once_per_batch(self):
+        self.conn.batch_size = 3
+        user_puts = self._count_puts(self._table(self.conn.USER_TABLE))
+        resource_puts = self._count_puts(
+            self._table(self.conn.RESOURCE_TABLE))
+        for volume in range(1, 4):
+            self._record(volume=volume)
+        self.assertEqual(user_puts, ['user-id'])
+        self.assertEqual(resource_puts, ['resource-id-batch'])
+
+
+class FilterEscapingTest(HBaseEngineTestBase):
+
+    def test_column_filter_escapes_quotes(self):
+        self.assertEqual(
+            impl_hbase._column_filter("r_it's", "it's"),
+            "SingleColumnValueFilter ('f', 'r_it''s', =, 'binary:it''s', "
+            "true, true)")
+
+    def test_metaquery_with_quotes(self):
+        name = "it's a server, AND more"
+        c = counter.Counter(
+            'instance',
+            counter.TYPE_GAUGE,
+            unit='',
+            volume=1,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id='resource-id-quoted',
+            timestamp=datetime.datetime(2012, 7, 2, 11, 0),
+            resource_metadata={'display_name': name},
+        )
+        self.conn.record_metering_data(meter.meter_message_from_counter(
+            c, cfg.CONF.metering_secret, 'test-quotes'))
+        self.conn._flush()
+        f = storage.EventFilter(meter='instance',
+                                metaquery={'metadata.display_name': name})
+        results = list(self.conn.get_samples(f))
+        self.assertEqual([r.resource_id for r in results],
+                         ['resource-id-quoted'])
+
+
+class SampleEncodingTest(test_base.TestCase):
+
+    def setUp(self):
+        super(SampleEncodingTest, self).setUp()
+        c = counter.Counter(
+            'cpu_util',
+            counter.TYPE_GAUGE,
+            unit='%',
+            volume=12.5,
+            user_id=None,
+            project_id='project-id',
+            resource_id=u'r\xe9source-id',
+            timestamp=datetime.datetime(2012, 7, 2, 10, 40, 1, 123456),
+            resource_metadata={'display_name': u'test-\xe9',
+                               'nested': {'flavor': 1}},
+        )
+        self.msg = meter.meter_message_from_counter(
+            c, cfg.CONF.metering_secret, 'test-1')
+
+    def test_round_trip(self):
+        row = {impl_hbase.SAMPLE_COLUMN: impl_hbase._encode_sample(self.msg)}
+        self.assertEqual(impl_hbase._decode_sample(row), self.msg)
+
+    def test_round_trip_volumes(self):
+        for volume in [0, -1, 2 ** 62, 2 ** 64, 0.1, '12']:
+            self.msg['counter_volume'] = volume
+            row = {impl_hbase.SAMPLE_COLUMN:
+                   impl_hbase._encode_sample(self.msg)}
+            decoded = impl_hbase._decode_sample(row)
+            self.assertEqual(decoded['counter_volume'], volume)
+
+    def test_smaller_than_json(self):
+        data = dict(self.msg)
+        data['timestamp'] = timeutils.strtime(data['timestamp'])
+        self.assertTrue(len(impl_hbase._encode_sample(self.msg)) <
+                        len(json.dumps(data)))
+
+    def test_decode_legacy_row(self):
+        data = dict(self.msg)
+        data['timestamp'] = timeutils.strtime(data['timestamp'])
+        row = {'f:message': json.dumps(data)}
+        self.assertEqual(impl_hbase._decode_sample(row), self.msg)
+
+    def test_decode_unknown_version(self):
+        value = impl_hbase._encode_sample(self.msg)
+        row = {impl_hbase.SAMPLE_COLUMN: '\xff' + value[1:]}
+        self.assertRaises(ValueError, impl_hbase._decode_sample, row)
+
+
+class LegacyRowTest(HBaseEngineTestBase):
+
+    def test_get_legacy_samples(self):
+        msg = dict(self.msg1)
+        msg['timestamp'] = timeutils.strtime(msg['timestamp'])
+        meter_table = self._table(self.conn.METER_TABLE)
+        for key, data in list(meter_table.scan()):
+            if data['f:resource_id'] == 'resource-id':
+                del data[impl_hbase.SAMPLE_COLUMN]
+                data['f:message'] = json.dumps(msg)
+                data['f:timestamp'] = msg['timestamp']
+                data['f:counter_volume'] = str(msg['counter_volume'])
+                meter_table._rows[key] = data
+        f = storage.EventFilter(meter='instance', resource='resource-id')
+        results = list(self.conn.get_samples(f))
+        self.assertEqual([r.as_dict() for r in results], [self.msg1])
+        results = list(self.conn.get_meter_statistics(f))
+        self.assertEqual(results[0].count, 1)
+
+
+class ConnectionPoolTest(test_base.TestCase):
+
+    def setUp(self):
+        super(ConnectionPoolTest, self).setUp()
+        self.connections = []
+
+        def get_connection(opts):
+            conn = impl_hbase.MConnection()
+            self.connections.append(conn)
+            return conn
+        self.stubs.Set(impl_hbase.Connection, '_get_connection',
+                       staticmethod(get_connection))
+        self.pool = impl_hbase.ConnectionPool({}, max_size=2)
+
+    def test_connection_reused(self):
+        with self.pool.item() as conn:
+            first = conn
+        with self.pool.item() as conn:
+            self.assertTrue(conn is first)
+        self.assertEqual(len(self.connections), 1)
+
+    def test_connection_per_green_thread(self):
+        with self.pool.item() as conn1:
+            with self.pool.item() as conn2:
+                self.assertFalse(conn1 is conn2)
+        self.assertEqual(len(self.connections), 2)
+
+    def test_connection_discarded_on_error(self):
+        def fail():
+            with self.pool.item():
+                raise IOError('broken transport')
+        self.assertRaises(IOError, fail)
+        with self.pool.item() as conn:
+            self.assertFalse(conn is self.connections[0])
+        self.assertEqual(len(self.connections), 2)
+        self.assertEqual(self.pool.current_size, 1)
+
 
 class UserTest(base.UserTest, HBaseEngineTestBase):
     pass
@@ -55,5 +420,10 @@ class StatisticsTest(base.StatisticsTest, HBaseEngineTestBase):
     pass
 
 
+class CumulativeStatisticsTest(base.CumulativeStatisticsTest,
+                               HBaseEngineTestBase):
+    pass
+
+
 class CounterDataTypeTest(base.CounterDataTypeTest, HBaseEngineTestBase):
     pass
@@ -49,10 +49,15 @@
 import copy
 import datetime
 
+import nose
+from oslo.config import cfg
+
 from tests.storage import base
 
 from ceilometer.collector import meter
 from ceilometer import counter
+from ceilometer import storage
+from ceilometer.storage import impl_mongodb
 from ceilometer.storage.impl_mongodb import require_map_reduce
 
 
@@ -62,12 +67,204 @@ class MongoDBEngineTestBase(base.DBTestBase):
 
 class IndexTest(MongoDBEngineTestBase):
 
+    # The query shapes of the driver, as event filters
+    QUERY_SHAPES = [
+        storage.EventFilter(meter='instance'),
+        storage.EventFilter(meter='instance',
+                            start=datetime.datetime(2012, 7, 2, 10, 41)),
+        storage.EventFilter(meter='instance', project='project-id',
+                            start=datetime.datetime(2012, 7, 2, 10, 41),
+                            end=datetime.datetime(2012, 7, 2, 10, 43)),
+        storage.EventFilter(meter='instance', resource='resource-id'),
+        storage.EventFilter(project='project-id'),
+        storage.EventFilter(user='user-id',
+                            start=datetime.datetime(2012, 7, 2, 10, 41)),
+        storage.EventFilter(resource='resource-id',
+                            end=datetime.datetime(2012, 7, 2, 10, 43)),
+    ]
+
     def test_indexes_exist(self):
         # ensure_index returns none if index already exists
-        assert not self.conn.db.resource.ensure_index('foo',
-                                                      name='resource_idx')
-        assert not self.conn.db.meter.ensure_index('foo',
-                                                   name='meter_idx')
+        for name, keys in self.conn.RESOURCE_INDEXES:
+            assert not self.conn.db.resource.ensure_index(keys, name=name)
+        for name, keys in self.conn.METER_INDEXES:
+            assert not self.conn.db.meter.ensure_index(keys, name=name)
+
+    def test_indexes_built_in_background(self):
+        indexes = self.conn.db.meter.index_information()
+        for name, keys in self.conn.METER_INDEXES:
+            self.assertTrue(indexes[name]['background'])
+
+    def test_indexes_created_by_upgrade(self):
+        for name, keys in self.conn.METER_INDEXES:
+            self.conn.db.meter.drop_index(name)
+        conn = storage.get_connection(cfg.CONF)
+        indexes = conn.db.meter.index_information()
+        for name, keys in self.conn.METER_INDEXES:
+            self.assertNotIn(name, indexes)
+        conn.upgrade()
+        indexes = conn.db.meter.index_information()
+        for name, keys in self.conn.METER_INDEXES:
+            self.assertIn(name, indexes)
+
+    def test_obsolete_indexes_dropped(self):
+        self.conn.db.meter.ensure_index('resource_id', name='meter_idx')
+        self.conn.upgrade()
+        self.assertNotIn('meter_idx', self.conn.db.meter.index_information())
+
+    def test_query_shapes_use_index(self):
+        leading_keys = set(keys[0][0]
+                           for name, keys in self.conn.METER_INDEXES)
+        for event_filter in self.QUERY_SHAPES:
+            q = impl_mongodb.make_query_from_filter(event_filter,
+                                                    require_meter=False)
+            self.assertTrue(leading_keys.intersection(q),
+                            'no index for the query %s' % q)
+
+    def test_explain_no_collection_scan(self):
+        if self.conn.conn is impl_mongodb.Connection._mim_instance:
+            raise nose.SkipTest('requires a MongoDB server')
+        self.conn.upgrade()
+        for event_filter in self.QUERY_SHAPES:
+            q = impl_mongodb.make_query_from_filter(event_filter,
+                                                    require_meter=False)
+            plan = self.conn.db.meter.find(q).explain()
+            if 'queryPlanner' in plan:
+                self.assertNotIn('COLLSCAN', str(plan['queryPlanner']))
+            else:
+                self.assertNotEqual(plan['cursor'], 'BasicCursor')
+
+
+class MongoDBPartitionedTestBase(MongoDBEngineTestBase):
+
+    def setUp(self):
+        cfg.CONF.register_opts(impl_mongodb.MongoDBStorage.OPTIONS)
+        cfg.CONF.set_override('mongodb_partition_period', 'day')
+        self.addCleanup(cfg.CONF.clear_override, 'mongodb_partition_period')
+        super(MongoDBPartitionedTestBase, self).setUp()
+
+
+class PartitionTest(MongoDBPartitionedTestBase):
+
+    def test_samples_are_partitioned(self):
+        self.assertEqual(self.conn.db.meter.find().count(), 0)
+        self.assertEqual(self.conn.db.meter_20120702.find().count(),
+                         len(self.msgs))
+        partitions = list(self.conn.db.meter_partition.find())
+        self.assertEqual(partitions,
+                         [{'_id': 'meter_20120702',
+                           'start': datetime.datetime(2012, 7, 2),
+                           'end': datetime.datetime(2012, 7, 3)}])
+
+    def test_query_routing(self):
+        names = [c.name for c in self.conn._meter_collections(
+            start=datetime.datetime(2012, 7, 2, 10, 42))]
+        self.assertEqual(names, ['meter', 'meter_20120702'])
+        names = [c.name for c in self.conn._meter_collections(
+            start=datetime.datetime(2012, 7, 3))]
+        self.assertEqual(names, ['meter'])
+        names = [c.name for c in self.conn._meter_collections(
+            end=datetime.datetime(2012, 7, 2))]
+        self.assertEqual(names, ['meter'])
+
+    def test_get_samples_outside_partitions(self):
+        f = storage.EventFilter(user='user-id',
+                                start=datetime.datetime(2012, 7, 3))
+        self.assertEqual(list(self.conn.get_samples(f)), [])
+
+    def test_partition_start(self):
+        ts = datetime.datetime(2012, 7, 4, 10, 40)
+        self.assertEqual(impl_mongodb.partition_start(ts, 'day'),
+                         datetime.datetime(2012, 7, 4))
+        self.assertEqual(impl_mongodb.partition_start(ts, 'week'),
+                         datetime.datetime(2012, 7, 2))
+
+    def test_expire_partitions(self):
+        self.conn.time_to_live = 3600
+        self.conn._expire_partitions()
+        self.assertEqual(list(self.conn.db.meter_partition.find()), [])
+        self.assertEqual(list(self.conn.get_samples(
+            storage.EventFilter(user='user-id'))), [])
+
+    def test_no_expiry_by_default(self):
+        self.conn._expire_partitions()
+        self.assertEqual(self.conn.db.meter_partition.find().count(), 1)
+
+    def test_ttl_index_on_meter(self):
+        cfg.CONF.set_override('time_to_live', 3600)
+        self.addCleanup(cfg.CONF.clear_override, 'time_to_live')
+        conn = storage.get_connection(cfg.CONF)
+        conn.upgrade()
+        index = conn.db.meter.index_information()['meter_ttl']
+        self.assertEqual(index['expireAfterSeconds'], 3600)
+        self.assertNotIn('meter_ttl',
+                         conn.db.meter_20120702.index_information())
+
+
+class TTLIndexTest(MongoDBEngineTestBase):
+
+    def test_ttl_index(self):
+        cfg.CONF.set_override('time_to_live', 3600)
+        self.addCleanup(cfg.CONF.clear_override, 'time_to_live')
+        conn = storage.get_connection(cfg.CONF)
+        conn.upgrade()
+        index = conn.db.meter.index_information()['meter_ttl']
+        self.assertEqual(index['expireAfterSeconds'], 3600)
+
+        cfg.CONF.clear_override('time_to_live')
+        conn = storage.get_connection(cfg.CONF)
+        conn.upgrade()
+        self.assertNotIn('meter_ttl', conn.db.meter.index_information())
+
+
+class ResourceTimestampTest(MongoDBEngineTestBase):
+
+    def test_sample_time_range(self):
+        c = counter.Counter(
+            'instance',
+            counter.TYPE_CUMULATIVE,
+            unit='',
+            volume=1,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id='resource-id-alternate',
+            timestamp=datetime.datetime(2012, 7, 2, 9, 0),
+            resource_metadata={},
+        )
+        self.conn.record_metering_data(
+            meter.meter_message_from_counter(c, 'not-so-secret', 'test'))
+        resource = self.conn.db.resource.find_one('resource-id-alternate')
+        self.assertEqual(resource['first_sample_timestamp'],
+                         datetime.datetime(2012, 7, 2, 9, 0))
+        self.assertEqual(resource['last_sample_timestamp'],
+                         datetime.datetime(2012, 7, 2, 10, 41))
+        self.assertEqual(sorted(resource['user_ids']),
+                         ['user-id', 'user-id-alternate'])
+
+    def test_get_resources_does_not_read_samples(self):
+        def find(*args, **kwargs):
+            raise AssertionError('samples should not be read')
+        self.stubs.Set(self.conn.db.meter, 'find', find)
+        resources = list(self.conn.get_resources(
+            project='project-id',
+            start_timestamp=datetime.datetime(2012, 7, 2, 10, 41)))
+        self.assertEqual([r.resource_id for r in resources],
+                         ['resource-id-alternate'])
+
+    def test_upgrade_adds_sample_time_range(self):
+        self.conn.db.resource.update(
+            {}, {'$unset': {'first_sample_timestamp': 1,
+                            'last_sample_timestamp': 1,
+                            'user_ids': 1}},
+            multi=True)
+        self.conn.upgrade()
+        resource = self.conn.db.resource.find_one('resource-id-alternate')
+        self.assertEqual(resource['first_sample_timestamp'],
+                         datetime.datetime(2012, 7, 2, 10, 41))
+        self.assertEqual(resource['last_sample_timestamp'],
+                         datetime.datetime(2012, 7, 2, 10, 41))
+        self.assertEqual(sorted(resource['user_ids']),
+                         ['user-id', 'user-id-alternate'])
 
 
 class UserTest(base.UserTest, MongoDBEngineTestBase):
@@ -97,6 +294,14 @@ class StatisticsTest(base.StatisticsTest, MongoDBEngineTestBase):
         require_map_reduce(self.conn)
 
 
+class CumulativeStatisticsTest(base.CumulativeStatisticsTest,
+                               MongoDBEngineTestBase):
+
+    def setUp(self):
+        super(CumulativeStatisticsTest, self).setUp()
+        require_map_reduce(self.conn)
+
+
 class CompatibilityTest(MongoDBEngineTestBase):
 
     def prepare_data(self):
@@ -170,3 +375,11 @@ class CompatibilityTest(MongoDBEngineTestBase):
 
 class CounterDataTypeTest(base.CounterDataTypeTest, MongoDBEngineTestBase):
     pass
+
+
+class PartitionedResourceTest(base.ResourceTest, MongoDBPartitionedTestBase):
+    pass
+
+
+class PartitionedRawEventTest(base.RawEventTest, MongoDBPartitionedTestBase):
+    pass
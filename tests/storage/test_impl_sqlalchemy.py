@@ -23,9 +23,15 @@
 
 """
 
+import datetime
+
 from oslo.config import cfg
 
 from tests.storage import base
+
+from ceilometer.collector import meter
+from ceilometer import counter
+from ceilometer import storage
 from ceilometer.storage.sqlalchemy.models import table_args
 
 
@@ -57,10 +63,58 @@ class StatisticsTest(base.StatisticsTest, SQLAlchemyEngineTestBase):
     pass
 
 
+class CumulativeStatisticsTest(base.CumulativeStatisticsTest,
+                               SQLAlchemyEngineTestBase):
+    pass
+
+
 class CounterDataTypeTest(base.CounterDataTypeTest, SQLAlchemyEngineTestBase):
     pass
 
 
+class MetaQueryTypeTest(SQLAlchemyEngineTestBase):
+
+    def prepare_data(self):
+        c = counter.Counter(
+            'instance',
+            counter.TYPE_GAUGE,
+            unit='instance',
+            volume=1,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id='resource-id-typed',
+            timestamp=datetime.datetime(2012, 7, 2, 10, 40),
+            resource_metadata={'display_name': 'typed-server',
+                               'size': 5,
+                               'ratio': 0.5,
+                               'public': True},
+        )
+        self.conn.record_metering_data(meter.meter_message_from_counter(
+            c, cfg.CONF.metering_secret, 'test-typed'))
+
+    def _resources(self, **metaquery):
+        f = storage.EventFilter(metaquery=dict(
+            ('metadata.%s' % k, v) for k, v in metaquery.iteritems()))
+        return [s.resource_id for s in self.conn.get_samples(f)]
+
+    def test_string_matches_typed_values(self):
+        for metaquery in [{'display_name': 'typed-server'},
+                          {'size': '5'},
+                          {'size': '5.0'},
+                          {'ratio': '0.5'},
+                          {'public': 'true'},
+                          {'size': 5}]:
+            self.assertEqual(self._resources(**metaquery),
+                             ['resource-id-typed'])
+
+    def test_string_no_match(self):
+        for metaquery in [{'size': '6'},
+                          {'size': 'five'},
+                          {'public': 'false'},
+                          {'display_name': '5'}]:
+            self.assertEqual(self._resources(**metaquery), [])
+
+
 def test_model_table_args():
     cfg.CONF.database_connection = 'mysql://localhost'
     assert table_args()
@@ -16,6 +16,8 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+import pickle
 import unittest
 
 from ceilometer.storage import models
@@ -51,3 +53,34 @@ class ModelTest(unittest.TestCase):
         self.assertEqual(d, {'arg1': 1,
                              'arg2': [{'arg1': 'a',
                                        'arg2': 'b'}]})
+
+
+class SampleTest(unittest.TestCase):
+
+    def setUp(self):
+        super(SampleTest, self).setUp()
+        self.sample = models.Sample('source', u'cpu_util', 'gauge', '%', 1.5,
+                                    'user', 'project', 'resource',
+                                    datetime.datetime(2013, 3, 1, 10, 0),
+                                    {'a': 1}, 'id', 'signature')
+
+    def test_slots(self):
+        self.assertFalse(hasattr(self.sample, '__dict__'))
+        self.assertRaises(AttributeError, setattr, self.sample, 'foo', 1)
+
+    def test_as_dict(self):
+        d = self.sample.as_dict()
+        self.assertEqual(sorted(d), sorted(models.Sample.fields))
+        self.assertEqual(d['counter_name'], 'cpu_util')
+
+    def test_interned(self):
+        other = models.Sample('source', u''.join(['cpu', '_util']), 'gauge',
+                              '%', 2, 'user', 'project', 'resource',
+                              None, {}, 'id2', 'signature')
+        self.assertTrue(other.counter_name is self.sample.counter_name)
+
+    def test_pickle(self):
+        for protocol in (0, pickle.HIGHEST_PROTOCOL):
+            self.assertEqual(
+                pickle.loads(pickle.dumps(self.sample, protocol)),
+                self.sample)
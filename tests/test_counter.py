@@ -0,0 +1,66 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/counter.py
+"""
+
+from ceilometer import counter
+from ceilometer.tests import base as tests_base
+
+
+class TestCounter(tests_base.TestCase):
+
+    @staticmethod
+    def _counter(name):
+        return counter.Counter(name=name,
+                               type=counter.TYPE_GAUGE,
+                               unit='B',
+                               volume=1,
+                               user_id='user',
+                               project_id='project',
+                               resource_id='resource',
+                               timestamp=None,
+                               resource_metadata={})
+
+    def test_no_instance_dict(self):
+        c = self._counter('a')
+        self.assertRaises(AttributeError, setattr, c, 'foo', 1)
+
+    def test_interned(self):
+        a = self._counter(''.join(['disk', '.read']))
+        b = self._counter(''.join(['disk.', 'read']))
+        self.assertTrue(a.name is b.name)
+
+    def test_replace(self):
+        c = self._counter('a')._replace(name=''.join(['b', 'c']))
+        self.assertTrue(isinstance(c, counter.Counter))
+        self.assertTrue(c.name is self._counter('bc').name)
+
+
+class TestInternString(tests_base.TestCase):
+
+    def test_type_preserved(self):
+        self.assertTrue(isinstance(counter.intern_string(u'unit-x'),
+                                   unicode))
+        self.assertTrue(isinstance(counter.intern_string('unit-x'), str))
+
+    def test_not_a_string(self):
+        self.assertEqual(counter.intern_string(None), None)
+
+    def test_bounded(self):
+        self.stubs.Set(counter, '_interned', {})
+        self.stubs.Set(counter, 'MAX_INTERNED', 1)
+        counter.intern_string('a')
+        b = ''.join(['b', 'b'])
+        self.assertTrue(counter.intern_string(b) is b)
+        self.assertEqual(len(counter._interned), 1)
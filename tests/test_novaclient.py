@@ -18,7 +18,10 @@
 # under the License.
 
 import mock
+from novaclient import exceptions as nova_exceptions
+from oslo.config import cfg
 
+from ceilometer.openstack.common import timeutils
 from ceilometer.tests import base
 from ceilometer import nova_client
 
@@ -28,16 +31,19 @@ class TestNovaClient(base.TestCase):
     def setUp(self):
         super(TestNovaClient, self).setUp()
         self.nv = nova_client.Client()
+        self.stubs.Set(nova_client.Client, 'flavor_cache',
+                       nova_client.FlavorCache())
+        self.flavors_get_calls = 0
 
-    @staticmethod
-    def fake_flavors_list():
+    def fake_flavors_get(self, fid):
+        self.flavors_get_calls += 1
+        flavors = {1: 'm1.tiny', 2: 'm1.large'}
+        if fid not in flavors:
+            raise nova_exceptions.NotFound(404)
         a = mock.MagicMock()
-        a.id = 1
-        a.name = 'm1.tiny'
-        b = mock.MagicMock()
-        b.id = 2
-        b.name = 'm1.large'
-        return [a, b]
+        a.id = fid
+        a.name = flavors[fid]
+        return a
 
     @staticmethod
     def fake_servers_list(*args, **kwargs):
@@ -47,8 +53,8 @@ class TestNovaClient(base.TestCase):
         return [a]
 
     def test_instance_get_all_by_host(self):
-        self.stubs.Set(self.nv.nova_client.flavors, 'list',
-                       self.fake_flavors_list)
+        self.stubs.Set(self.nv.nova_client.flavors, 'get',
+                       self.fake_flavors_get)
         self.stubs.Set(self.nv.nova_client.servers, 'list',
                        self.fake_servers_list)
 
@@ -64,11 +70,33 @@ class TestNovaClient(base.TestCase):
         return [a]
 
     def test_instance_get_all_by_host_unknown_flavor(self):
-        self.stubs.Set(self.nv.nova_client.flavors, 'list',
-                       self.fake_flavors_list)
+        self.stubs.Set(self.nv.nova_client.flavors, 'get',
+                       self.fake_flavors_get)
         self.stubs.Set(self.nv.nova_client.servers, 'list',
                        self.fake_servers_list_unknown_flavor)
 
         instances = self.nv.instance_get_all_by_host('foobar')
         self.assertEqual(len(instances), 1)
         self.assertEqual(instances[0].flavor['name'], 'unknown-id-666')
+
+    def test_flavor_cache(self):
+        self.stubs.Set(self.nv.nova_client.flavors, 'get',
+                       self.fake_flavors_get)
+        self.stubs.Set(self.nv.nova_client.servers, 'list',
+                       self.fake_servers_list)
+        timeutils.set_time_override()
+        self.addCleanup(timeutils.clear_time_override)
+
+        self.nv.instance_get_all_by_host('foobar')
+        instances = self.nv.instance_get_all_by_host('foobar')
+        self.assertEqual(instances[0].flavor['name'], 'm1.tiny')
+        self.assertEqual(self.flavors_get_calls, 1)
+        self.assertEqual(self.nv.flavor_cache.hit_rate, 0.5)
+
+        # The cache is shared by the clients.
+        nova_client.Client().flavor_cache.get(1, self.fake_flavors_get)
+        self.assertEqual(self.flavors_get_calls, 1)
+
+        timeutils.advance_time_seconds(cfg.CONF.nova_flavor_cache_ttl)
+        self.nv.instance_get_all_by_host('foobar')
+        self.assertEqual(self.flavors_get_calls, 2)
@@ -17,12 +17,15 @@
 # License for the specific language governing permissions and limitations
 # under the License.
 
+import datetime
+
 from stevedore import dispatch
 from stevedore import extension
 
 from ceilometer import counter
 from ceilometer import plugin
 from ceilometer.transformer import accumulator
+from ceilometer.transformer import rate
 from ceilometer.openstack.common import timeutils
 from ceilometer import pipeline
 from ceilometer.tests import base
@@ -43,7 +46,8 @@ class TestPipeline(base.TestCase):
             'update': self.TransformerClass,
             'except': self.TransformerClassException,
             'drop': self.TransformerClassDrop,
-            'cache': accumulator.TransformerAccumulator}
+            'cache': accumulator.TransformerAccumulator,
+            'rate': rate.RateOfChangeTransformer}
 
         if name in class_name_ext:
             return extension.Extension(name, None,
@@ -630,6 +634,32 @@ class TestPipeline(base.TestCase):
         self.assertTrue(getattr(self.publisher.counters[0], 'name')
                         == 'a_update')
 
+    def test_flush_pipeline_rate_of_change(self):
+        self.pipeline_cfg[0]['transformers'] = [
+            {
+                'name': 'rate',
+                'parameters': {}
+            },
+            {
+                'name': 'update',
+                'parameters': {}
+            }, ]
+        pipeline_manager = pipeline.PipelineManager(self.pipeline_cfg,
+                                                    self.publisher_manager)
+        start = datetime.datetime(2013, 3, 1, 10, 0)
+        for volume, seconds in ((10, 0), (70, 60)):
+            with pipeline_manager.publisher(None, None) as p:
+                p([self.test_counter._replace(
+                    type=counter.TYPE_CUMULATIVE,
+                    volume=volume,
+                    timestamp=timeutils.isotime(
+                        start + datetime.timedelta(seconds=seconds)))])
+
+        self.assertEqual(len(self.publisher.counters), 3)
+        self.assertEqual(getattr(self.publisher.counters[2], 'name'),
+                         'a.rate_update')
+        self.assertEqual(getattr(self.publisher.counters[2], 'volume'), 1)
+
     def test_variable_counter(self):
         self.pipeline_cfg = [{
             'name': "test_pipeline",
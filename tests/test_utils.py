@@ -0,0 +1,56 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/utils.py
+"""
+
+import copy
+
+from ceilometer.tests import base as tests_base
+from ceilometer import utils
+
+
+class TestUtils(tests_base.TestCase):
+
+    def test_dict_to_kv(self):
+        data = {'a': 'A',
+                'b': 'B',
+                'nested': {'a': 'A',
+                           'b': 'B',
+                           },
+                'nested2': [{'c': 'A'}, {'c': 'B'}]
+                }
+        pairs = list(utils.dict_to_keyval(data))
+        self.assertEqual(sorted(pairs),
+                         [('a', 'A'),
+                          ('b', 'B'),
+                          ('nested.a', 'A'),
+                          ('nested.b', 'B'),
+                          ('nested2[0].c', 'A'),
+                          ('nested2[1].c', 'B')])
+
+    def test_dict_to_kv_not_a_dict(self):
+        self.assertEqual(list(utils.dict_to_keyval('foo')), [])
+
+    def test_frozen_dict(self):
+        d = utils.FrozenDict(a=1)
+        self.assertEqual(d, {'a': 1})
+        self.assertRaises(TypeError, d.__setitem__, 'b', 2)
+        self.assertRaises(TypeError, d.update, b=2)
+        self.assertRaises(TypeError, d.pop, 'a')
+        self.assertEqual(d, {'a': 1})
+
+    def test_frozen_dict_copy(self):
+        d = copy.deepcopy(utils.FrozenDict(a={'b': 1}))
+        self.assertTrue(isinstance(d, utils.FrozenDict))
+        self.assertEqual(d, {'a': {'b': 1}})
@@ -0,0 +1,119 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/aggregator.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import aggregator
+
+
+class TestWindowAggregatorTransformer(base.TestCase):
+
+    def setUp(self):
+        super(TestWindowAggregatorTransformer, self).setUp()
+        timeutils.set_time_override(datetime.datetime(2013, 3, 1, 10, 0))
+        self.addCleanup(timeutils.clear_time_override)
+
+    @staticmethod
+    def _counter(volume, resource='resource-id'):
+        return counter.Counter(
+            name='cpu_util',
+            type=counter.TYPE_GAUGE,
+            unit='%',
+            volume=volume,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id=resource,
+            timestamp=timeutils.isotime(),
+            resource_metadata={},
+        )
+
+    def _aggregate(self, method, volumes=(10, 40, 20)):
+        t = aggregator.WindowAggregatorTransformer(window=60, method=method)
+        for v in volumes:
+            self.assertEqual(t.handle_sample(None, self._counter(v), None),
+                             None)
+            timeutils.advance_time_seconds(10)
+        self.assertEqual(t.flush(None, None), [])
+        timeutils.advance_time_seconds(30)
+        counters = t.flush(None, None)
+        self.assertEqual(len(counters), 1)
+        self.assertEqual(t.flush(None, None), [])
+        return counters[0]
+
+    def test_last(self):
+        c = self._aggregate('last')
+        self.assertEqual(c.volume, 20)
+        self.assertEqual(c.timestamp, '2013-03-01T10:00:20Z')
+
+    def test_mean(self):
+        self.assertAlmostEqual(self._aggregate('mean').volume, 70 / 3.0)
+
+    def test_max(self):
+        self.assertEqual(self._aggregate('max').volume, 40)
+
+    def test_sum(self):
+        self.assertEqual(self._aggregate('sum').volume, 70)
+
+    def test_per_resource(self):
+        t = aggregator.WindowAggregatorTransformer(window=60, method='sum')
+        t.handle_sample(None, self._counter(1, 'r1'), None)
+        t.handle_sample(None, self._counter(2, 'r2'), None)
+        t.handle_sample(None, self._counter(3, 'r1'), None)
+        timeutils.advance_time_seconds(60)
+        self.assertEqual([(c.resource_id, c.volume)
+                          for c in t.flush(None, None)],
+                         [('r1', 4), ('r2', 2)])
+
+    def test_next_window(self):
+        t = aggregator.WindowAggregatorTransformer(window=60, method='sum')
+        t.handle_sample(None, self._counter(1), None)
+        timeutils.advance_time_seconds(60)
+        t.flush(None, None)
+        t.handle_sample(None, self._counter(5), None)
+        self.assertEqual(t.flush(None, None), [])
+        timeutils.advance_time_seconds(60)
+        self.assertEqual([c.volume for c in t.flush(None, None)], [5])
+
+    def test_aligned_windows(self):
+        t = aggregator.WindowAggregatorTransformer(window=60, method='sum')
+        counters = []
+        timeutils.advance_time_seconds(5)
+        for i in range(18):
+            t.handle_sample(None, self._counter(1), None)
+            counters.extend(t.flush(None, None))
+            timeutils.advance_time_seconds(10)
+        counters.extend(t.flush(None, None))
+        self.assertEqual([(c.timestamp, c.volume) for c in counters],
+                         [('2013-03-01T10:00:55Z', 6),
+                          ('2013-03-01T10:01:55Z', 6),
+                          ('2013-03-01T10:02:55Z', 6)])
+
+    def test_window_of_counter_timestamp(self):
+        t = aggregator.WindowAggregatorTransformer(window=60, method='sum')
+        t.handle_sample(None, self._counter(1), None)
+        late = self._counter(2)._replace(timestamp='2013-03-01T09:59:50Z')
+        t.handle_sample(None, late, None)
+        self.assertEqual([c.volume for c in t.flush(None, None)], [2])
+        timeutils.advance_time_seconds(60)
+        self.assertEqual([c.volume for c in t.flush(None, None)], [1])
+
+    def test_invalid_method(self):
+        self.assertRaises(ValueError,
+                          aggregator.WindowAggregatorTransformer,
+                          method='median')
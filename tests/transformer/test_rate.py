@@ -0,0 +1,133 @@
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+"""Tests for ceilometer/transformer/rate.py
+"""
+
+import datetime
+
+from ceilometer import counter
+from ceilometer.openstack.common import timeutils
+from ceilometer.tests import base
+from ceilometer.transformer import rate
+
+
+class TestRateOfChangeTransformer(base.TestCase):
+
+    START = datetime.datetime(2013, 3, 1, 10, 0)
+
+    def setUp(self):
+        super(TestRateOfChangeTransformer, self).setUp()
+        timeutils.set_time_override(self.START)
+        self.addCleanup(timeutils.clear_time_override)
+
+    def _counter(self, volume, seconds, resource='resource-id',
+                 name='network.incoming.bytes',
+                 type=counter.TYPE_CUMULATIVE):
+        return counter.Counter(
+            name=name,
+            type=type,
+            unit='B',
+            volume=volume,
+            user_id='user-id',
+            project_id='project-id',
+            resource_id=resource,
+            timestamp=timeutils.isotime(
+                self.START + datetime.timedelta(seconds=seconds)),
+            resource_metadata={},
+        )
+
+    def _handle(self, transformer, *counters):
+        for c in counters:
+            self.assertEqual(transformer.handle_sample(None, c, None), c)
+        return transformer.flush(None, None)
+
+    def test_first_counter(self):
+        t = rate.RateOfChangeTransformer()
+        self.assertEqual(self._handle(t, self._counter(100, 0)), [])
+
+    def test_rate(self):
+        t = rate.RateOfChangeTransformer()
+        self._handle(t, self._counter(100, 0))
+        rates = self._handle(t, self._counter(700, 60))
+        self.assertEqual(len(rates), 1)
+        self.assertEqual(rates[0].name, 'network.incoming.bytes.rate')
+        self.assertEqual(rates[0].type, counter.TYPE_GAUGE)
+        self.assertEqual(rates[0].unit, 'B/s')
+        self.assertEqual(rates[0].volume, 10)
+        self.assertEqual(rates[0].resource_id, 'resource-id')
+        self.assertEqual(self._handle(t), [])
+
+    def test_not_cumulative(self):
+        t = rate.RateOfChangeTransformer()
+        for type in (counter.TYPE_GAUGE, counter.TYPE_DELTA):
+            self.assertEqual(self._handle(t, self._counter(100, 0, type=type),
+                                          self._counter(700, 60, type=type)),
+                             [])
+        self.assertEqual(len(t.previous), 0)
+
+    def test_target(self):
+        t = rate.RateOfChangeTransformer(target={'name': 'cpu_util',
+                                                 'unit': '%',
+                                                 'scale': 100.0 / 10 ** 9})
+        rates = self._handle(t,
+                             self._counter(0, 0, name='cpu'),
+                             self._counter(30 * 10 ** 9, 60, name='cpu'))
+        self.assertEqual(rates[0].name, 'cpu_util')
+        self.assertEqual(rates[0].unit, '%')
+        self.assertEqual(rates[0].volume, 50)
+
+    def test_reset(self):
+        t = rate.RateOfChangeTransformer()
+        rates = self._handle(t,
+                             self._counter(1000, 0),
+                             self._counter(120, 60))
+        self.assertEqual(rates[0].volume, 2)
+
+    def test_per_resource(self):
+        t = rate.RateOfChangeTransformer()
+        rates = self._handle(t,
+                             self._counter(100, 0, 'r1'),
+                             self._counter(500, 0, 'r2'),
+                             self._counter(160, 60, 'r1'),
+                             self._counter(500, 60, 'r2'))
+        self.assertEqual([(r.resource_id, r.volume) for r in rates],
+                         [('r1', 1), ('r2', 0)])
+
+    def test_out_of_order(self):
+        t = rate.RateOfChangeTransformer()
+        rates = self._handle(t,
+                             self._counter(100, 60),
+                             self._counter(50, 0))
+        self.assertEqual(rates, [])
+
+    def test_evict_least_recently_updated(self):
+        t = rate.RateOfChangeTransformer(size=2)
+        self._handle(t,
+                     self._counter(100, 0, 'r1'),
+                     self._counter(100, 0, 'r2'),
+                     self._counter(100, 0, 'r3'))
+        self.assertEqual(list(t.previous),
+                         [('network.incoming.bytes', 'r2'),
+                          ('network.incoming.bytes', 'r3')])
+
+    def test_evict_vanished(self):
+        t = rate.RateOfChangeTransformer(ttl=600)
+        self._handle(t, self._counter(100, 0, 'r1'))
+        timeutils.advance_time_seconds(300)
+        self._handle(t, self._counter(100, 300, 'r2'))
+        timeutils.advance_time_seconds(300)
+        self._handle(t, self._counter(100, 600, 'r3'))
+        self.assertEqual(list(t.previous),
+                         [('network.incoming.bytes', 'r2'),
+                          ('network.incoming.bytes', 'r3')])
@@ -0,0 +1,118 @@
+#!/usr/bin/env python
+# -*- encoding: utf-8 -*-
+#
+# Licensed under the Apache License, Version 2.0 (the "License"); you may
+# not use this file except in compliance with the License. You may obtain
+# a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+# WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+# License for the specific language governing permissions and limitations
+# under the License.
+
+"""Measure the memory used and the objects allocated by samples.
+
+The storage samples are compared with samples using a per instance
+dictionary, the way they were stored before. For each kind, the script
+builds the requested number of samples and reports the memory used by
+the sample objects themselves, the number of objects tracked by the
+garbage collector they allocated and the time taken to build them.
+"""
+
+import argparse
+import datetime
+import gc
+import sys
+import time
+
+from ceilometer import counter
+from ceilometer.storage import models
+
+
+class DictSample(models.Model):
+    """Sample keeping its attributes in a dictionary."""
+
+    def __init__(self, **kwds):
+        models.Model.__init__(self, **kwds)
+
+
+def _sample_args(i):
+    # Names, types and units are decoded from the storage as new strings
+    # for each sample.
+    return dict(source='openstack',
+                counter_name=u''.join([u'network.incoming', u'.bytes']),
+                counter_type=u''.join([u'cumu', u'lative']),
+                counter_unit=u''.join([u'B']),
+                counter_volume=i,
+                user_id=u'user-id',
+                project_id=u'project-id',
+                resource_id=u'resource-%d' % (i % 100),
+                timestamp=datetime.datetime(2013, 3, 1, 10, 0),
+                resource_metadata={},
+                message_id=u'message-%d' % i,
+                message_signature=u'signature')
+
+
+def _counter(i):
+    return counter.Counter(name=''.join(['network.incoming', '.bytes']),
+                           type=counter.TYPE_CUMULATIVE,
+                           unit='B',
+                           volume=i,
+                           user_id='user-id',
+                           project_id='project-id',
+                           resource_id='resource-%d' % (i % 100),
+                           timestamp='2013-03-01T10:00:00',
+                           resource_metadata={})
+
+
+def _object_size(obj, shared):
+    """Return the size of an object, its dictionary and string fields."""
+    size = sys.getsizeof(obj)
+    if isinstance(obj, tuple):
+        values = obj
+    else:
+        values = obj.as_dict().values()
+        # Slotted objects have no dictionary.
+        d = getattr(obj, '__dict__', None)
+        if d is not None:
+            size += sys.getsizeof(d) + sys.getsizeof(obj.fields)
+    for v in values:
+        if isinstance(v, basestring) and id(v) not in shared:
+            shared.add(id(v))
+            size += sys.getsizeof(v)
+    return size
+
+
+def measure(name, make, count):
+    gc.collect()
+    before = len(gc.get_objects())
+    start = time.time()
+    objects = [make(i) for i in xrange(count)]
+    elapsed = time.time() - start
+    allocated = len(gc.get_objects()) - before - 1
+    shared = set()
+    size = sum(_object_size(o, shared) for o in objects)
+    print '%-12s %10d bytes %8.1f bytes/sample %8d gc objects %8.3f s' % (
+        name, size, size / float(count), allocated, elapsed)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='measure the memory used by samples')
+    parser.add_argument('--count', type=int, default=100000,
+                        help='number of samples built')
+    args = parser.parse_args()
+
+    measure('dict sample', lambda i: DictSample(**_sample_args(i)),
+            args.count)
+    measure('sample', lambda i: models.Sample(**_sample_args(i)),
+            args.count)
+    measure('counter', _counter, args.count)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())